@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired outstanding and blacklisted refresh tokens in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            expired_ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by()
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not expired_ids:
+                break
+
+            # short transactions that only touch one batch of rows at a time
+            BlacklistedToken.objects.filter(token_id__in=expired_ids).delete()
+            OutstandingToken.objects.filter(id__in=expired_ids).delete()
+            deleted += len(expired_ids)
+
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired tokens'))
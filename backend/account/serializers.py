@@ -1,15 +1,25 @@
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer, TokenBlacklistSerializer
 from rest_framework.exceptions import ValidationError
 from .models import CustomUser, PaymentMethod, DriverLicence
+from .tokens import FilteredRefreshToken
 from datetime import date
 
+'''
+Read-only summary of a user for nested and list use.
+Tokens are only issued by the auth endpoints (auth/jwt/create/ and auth/jwt/refresh/).
+'''
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'username', 'first_name', 'last_name', 'email', 'profile_photo']
+        read_only_fields = fields
+
 class CustomUserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
-    token = serializers.SerializerMethodField()
     class Meta:
         model = CustomUser
-        fields = ['id', 'username', 'first_name', 'last_name', 'email', 'token', 'password', 'profile_photo', 'address', 'phone_number', 'gender', 'created_at', 'updated_at']
+        fields = ['id', 'username', 'first_name', 'last_name', 'email', 'password', 'profile_photo', 'address', 'phone_number', 'gender', 'created_at', 'updated_at']
 
     def create(self, validated_data):
         try:
@@ -21,16 +31,9 @@ class CustomUserSerializer(serializers.ModelSerializer):
             return user
         except Exception as e:
             raise ValidationError(f"failed to create user: {e}")
-    
-    def get_token(self, user):
-        refresh = RefreshToken.for_user(user)
-        return {
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-        }
 
 class PaymentMethodSerializer(serializers.ModelSerializer):
-    user = CustomUserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
 
     class Meta:
         model = PaymentMethod
@@ -53,7 +56,7 @@ class PaymentMethodSerializer(serializers.ModelSerializer):
         return data
 
 class DriverLicenceSerializer(serializers.ModelSerializer):
-    user = CustomUserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
 
     class Meta:
         model = DriverLicence
@@ -84,3 +87,13 @@ class DriverLicenceSerializer(serializers.ModelSerializer):
                     'date error': 'The expiring date cannot be before the issue date'
                 })
         return data
+
+
+'''
+Token refresh and blacklist (logout) backed by the in-memory revocation filter
+'''
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+class FilteredTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = FilteredRefreshToken
@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from utils.authentication import invalidate_cached_user
+from .models import CustomUser
+
+'''
+Drops the cached user used by the JWT authentication whenever the user changes,
+which covers profile edits, password changes and deactivation. It is dropped
+once the change is committed, so a request running meanwhile cannot cache the
+old user again under the new version.
+'''
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_authenticated_user_cache(sender, instance, **kwargs):
+    # the pk is read now, delete() clears it before the transaction commits
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
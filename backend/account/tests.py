@@ -1,3 +1,143 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from utils.authentication import auth_user_key, auth_version_key
+from .models import CustomUser
+from .tokens import RevocationFilter
 
-# Create your tests here.
+RESERVATIONS_URL = '/api/v1/reservation/'
+REFRESH_URL = '/api/v1/account/auth/jwt/refresh/'
+
+
+def user_queries(queries):
+    table = connection.ops.quote_name(CustomUser._meta.db_table)
+    return [query['sql'] for query in queries if table in query['sql']]
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_users_are_loaded_on_every_request_by_default(self):
+        self.client.get(RESERVATIONS_URL)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(RESERVATIONS_URL).status_code, 200)
+        self.assertEqual(len(user_queries(queries)), 1)
+        self.assertIsNone(cache.get(auth_user_key(self.user.pk)))
+
+    @override_settings(AUTH_USER_CACHE='default')
+    def test_cached_users_are_not_loaded_again(self):
+        self.assertEqual(self.client.get(RESERVATIONS_URL).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(RESERVATIONS_URL).status_code, 200)
+        self.assertEqual(user_queries(queries), [])
+
+    @override_settings(AUTH_USER_CACHE='default')
+    def test_deactivated_users_are_rejected_once_committed(self):
+        self.client.get(RESERVATIONS_URL)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            # still the cached user until the change is committed
+            self.assertEqual(self.client.get(RESERVATIONS_URL).status_code, 200)
+        self.assertEqual(self.client.get(RESERVATIONS_URL).status_code, 401)
+
+    @override_settings(AUTH_USER_CACHE='default')
+    def test_password_hash_is_not_cached(self):
+        self.client.get(RESERVATIONS_URL)
+        entry = cache.get(auth_user_key(self.user.pk))
+        self.assertIsNotNone(entry)
+        self.assertNotIn(self.user.password, repr(entry))
+
+    @override_settings(AUTH_USER_CACHE='default')
+    def test_deleting_a_user_bumps_its_version(self):
+        self.client.get(RESERVATIONS_URL)
+        user_id = self.user.pk
+        version = cache.get(auth_version_key(user_id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(cache.get(auth_version_key(user_id)), version + 1)
+        self.assertEqual(self.client.get(RESERVATIONS_URL).status_code, 401)
+
+
+class RefreshTokenRotationTests(TestCase):
+    def setUp(self):
+        # every test starts from an empty filter, as a new process would
+        self.revocation_filter = RevocationFilter()
+        patcher = mock.patch('account.tokens.revocation_filter', self.revocation_filter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.client = APIClient()
+
+    def refresh(self, token):
+        return self.client.post(REFRESH_URL, {'refresh': token}, format='json')
+
+    def test_refreshing_rotates_the_token(self):
+        old = str(RefreshToken.for_user(self.user))
+        response = self.refresh(old)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['refresh'], old)
+        self.assertEqual(self.refresh(response.json()['refresh']).status_code, 200)
+
+    def test_rotated_tokens_cannot_be_reused(self):
+        old = str(RefreshToken.for_user(self.user))
+        self.assertEqual(self.refresh(old).status_code, 200)
+        self.assertEqual(self.refresh(old).status_code, 401)
+
+    def test_rotated_tokens_missing_from_the_filter_are_still_rejected(self):
+        old = str(RefreshToken.for_user(self.user))
+        self.assertEqual(self.refresh(old).status_code, 200)
+        # another process that has not pulled the new blacklist row yet
+        self.revocation_filter.revoked.clear()
+        self.assertEqual(self.refresh(old).status_code, 401)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class PruneTokenBlacklistTests(TestCase):
+    def test_expired_tokens_are_deleted_in_batches(self):
+        user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        for token in [RefreshToken.for_user(user) for _ in range(3)]:
+            token.blacklist()
+        live = RefreshToken.for_user(user)
+        OutstandingToken.objects.exclude(jti=live['jti']).update(expires_at=timezone.now())
+
+        call_command('prune_token_blacklist', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class UserSerializationTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        for i in range(3):
+            CustomUser.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_user_list_does_not_issue_tokens(self):
+        response = self.client.get('/api/v1/account/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 4)
+        for user in response.json()['results']:
+            self.assertNotIn('token', user)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_user_detail_does_not_issue_tokens(self):
+        response = self.client.get(f'/api/v1/account/users/{self.admin.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('token', response.json())
+        self.assertEqual(response.json()['username'], 'admin')
+        self.assertFalse(OutstandingToken.objects.exists())
@@ -0,0 +1,71 @@
+import threading
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+'''
+In-memory set of the blacklisted refresh token ids (jti) of this process.
+New blacklist rows are pulled in at most every TOKEN_REVOCATION_FILTER_TTL
+with a single query on the blacklist id, and the whole set is reloaded (without
+expired tokens) every ten TTLs.
+'''
+class RevocationFilter:
+    full_reload_every = 10
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.revoked = {}
+        self.last_id = 0
+        self.refreshed_at = None
+        self.refreshes = 0
+
+    def load(self, now):
+        rows = BlacklistedToken.objects.values_list('id', 'token__jti', 'token__expires_at').order_by('id')
+        if self.refreshes % self.full_reload_every == 0:
+            self.revoked = {}
+            self.last_id = 0
+            rows = rows.filter(token__expires_at__gt=now)
+        for row_id, jti, expires_at in rows.filter(id__gt=self.last_id):
+            self.revoked[jti] = expires_at
+            self.last_id = max(self.last_id, row_id)
+        self.refreshed_at = now
+        self.refreshes += 1
+
+    def is_revoked(self, jti):
+        now = timezone.now()
+        with self.lock:
+            if self.refreshed_at is None or now - self.refreshed_at >= settings.TOKEN_REVOCATION_FILTER_TTL:
+                self.load(now)
+            return jti in self.revoked
+
+    def add(self, jti, expires_at):
+        with self.lock:
+            self.revoked[jti] = expires_at
+
+revocation_filter = RevocationFilter()
+
+'''
+Refresh token that checks the revocation filter instead of querying the
+blacklist on every refresh. A token missing from the filter is still safe:
+with rotation and blacklisting on, refreshing blacklists the old token with a
+unique insert, and a token that was already blacklisted is rejected there.
+'''
+class FilteredRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if revocation_filter.is_revoked(jti):
+            raise TokenError(_('Token is blacklisted'))
+        if not (api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION):
+            super().check_blacklist()
+
+    def blacklist(self):
+        blacklisted, created = super().blacklist()
+        revocation_filter.add(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp']))
+        if not created:
+            raise TokenError(_('Token is blacklisted'))
+        return blacklisted, created
@@ -4,7 +4,7 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from utils.permissions import IsAdminOrSelf
 from .models import CustomUser, PaymentMethod, DriverLicence
-from .serializers import CustomUserSerializer, PaymentMethodSerializer, DriverLicenceSerializer
+from .serializers import CustomUserSerializer, UserSummarySerializer, PaymentMethodSerializer, DriverLicenceSerializer
 from rest_framework.response import Response
 from rest_framework import status
     
@@ -24,12 +24,17 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         else:    
             return CustomUser.objects.filter(pk=user.pk)
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return UserSummarySerializer
+        return CustomUserSerializer
+
 
 '''
 Viewsets for the payment method
 '''
 class PaymentMethodViewSet(viewsets.ModelViewSet):
-    queryset = PaymentMethod.objects.all()
+    queryset = PaymentMethod.objects.select_related('user')
     serializer_class = PaymentMethodSerializer
     permission_classes = [IsAuthenticated, IsAdminOrSelf]
 
@@ -37,6 +42,6 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
 Viewsets for the drivers licence
 '''
 class DriverLicenceViewSet(viewsets.ModelViewSet):
-    queryset = DriverLicence.objects.all()
+    queryset = DriverLicence.objects.select_related('user')
     serializer_class = DriverLicenceSerializer
     permission_classes = [IsAuthenticated, IsAdminOrSelf]
\ No newline at end of file
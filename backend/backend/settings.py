@@ -49,11 +49,14 @@ INSTALLED_APPS = [
     'account',
     'car',
     'reservation.apps.ReservationConfig',
+    'notification',
+    'utils.apps.UtilsConfig',
     'drf_spectacular',
     'drf_spectacular_sidecar',
 ]
 
 MIDDLEWARE = [
+    'utils.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -106,6 +109,17 @@ DATABASES = {
     }
 }
 
+# The cache is shared by every worker process, so a catalog version bump or a
+# dropped user reaches all of them. The database cache works out of the box
+# (after `python manage.py createcachetable`), set CACHE_BACKEND and
+# CACHE_LOCATION to use Redis or Memcached instead
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'django_cache'),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -155,7 +169,7 @@ AUTH_USER_MODEL = 'account.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'utils.authentication.CachedJWTAuthentication',
     ),
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -164,14 +178,43 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Seconds a public car catalog response stays cached, entries are also
+# invalidated as soon as a car is saved or deleted
+CAR_CATALOG_CACHE_TIMEOUT = 60 * 5
+
+# Batch quotes are priced from daily rate tables covering this many days ahead,
+# cached for CAR_RATE_TABLE_CACHE_TIMEOUT seconds or until a car or rate changes
+CAR_QUOTE_HORIZON_DAYS = 365
+CAR_RATE_TABLE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Cache alias CachedJWTAuthentication keeps users in. It has to be a shared
+# in-memory cache (Redis or Memcached): with the database cache a hit would
+# cost more queries than loading the user. The user cache is off when unset.
+AUTH_USER_CACHE = os.environ.get('AUTH_USER_CACHE')
+
+# Seconds an authenticated user stays cached by CachedJWTAuthentication,
+# the entry is also dropped as soon as the user is saved or deleted
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# Requests running more SQL queries than this are logged as warnings by
+# RequestMetricsMiddleware, None turns the warning off
+REQUEST_QUERY_BUDGET = 50
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=20),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': False,
+    'TOKEN_REFRESH_SERIALIZER': 'account.serializers.FilteredTokenRefreshSerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'account.serializers.FilteredTokenBlacklistSerializer',
 }
 
+# How stale the in-memory refresh token revocation filter may get before it
+# pulls new blacklist rows, expired tokens are removed with
+# `python manage.py prune_token_blacklist`
+TOKEN_REVOCATION_FILTER_TTL = timedelta(seconds=30)
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_USE_TLS = True
@@ -182,6 +225,23 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Pending reservations still not confirmed this long after their start date
+# are marked no-show by `python manage.py advance_reservations --loop`
+RESERVATION_NO_SHOW_GRACE = timedelta(days=1)
+
+# Reservation emails are queued in the outbox and delivered by
+# `python manage.py send_outbox_emails --loop`
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': timedelta(minutes=1),
+    # status emails wait this long so quick successive changes send one email
+    'COALESCE_WINDOW': timedelta(seconds=60),
+    # how long a worker may take to send the batch it claimed before another
+    # worker takes it over
+    'LEASE': timedelta(minutes=5),
+}
+
 DJOSER = {
     'PASSWORD_RESET_CONFIRM_URL': 'api/v1/account/auth/users/reset_password_confirm?uid={uid}&token={token}',
     'SEND_ACTIVATION_EMAIL': True,
@@ -0,0 +1,31 @@
+"""
+Settings for the endpoint benchmarks (see benchmark/).
+
+The benchmarks run against a local SQLite database seeded with
+`manage.py seed_benchmark_data`, so their results can be compared between commits.
+"""
+
+from .settings import *
+
+SECRET_KEY = os.environ.get('SECRET_KEY') or 'benchmark-only-secret-key'
+
+INSTALLED_APPS = INSTALLED_APPS + ['benchmark']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCHMARK_DB', os.path.join(BASE_DIR, 'benchmark.sqlite3')),
+    }
+}
+
+# the benchmarks run in a single process, nothing needs to share the cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'benchmark_media')
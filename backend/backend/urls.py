@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from utils.metrics import MetricsAPIView
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
 urlpatterns = [
@@ -23,6 +24,7 @@ urlpatterns = [
     path('api/v1/account/', include('account.urls')),
     path('api/v1/car/', include('car.urls')),
     path('api/v1/reservation/', include('reservation.urls')),
+    path('api/v1/metrics/', MetricsAPIView.as_view(), name='metrics'),
 
     # API documentation
     path('api/v1/schema/', SpectacularAPIView.as_view(), name='schema'),
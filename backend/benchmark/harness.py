@@ -0,0 +1,327 @@
+import csv
+import io
+import platform
+import time
+import tracemalloc
+from datetime import date, timedelta
+import django
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.urls import URLPattern, URLResolver, get_resolver, resolve
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from account.models import CustomUser, PaymentMethod, DriverLicence
+from car.models import Car, CarRate
+from reservation.models import Reservation, BookedInterval
+from .seed import ADMIN_USERNAME, BENCHMARK_PASSWORD, BENCHMARK_PHOTO, benchmark_photo_bytes
+
+# routes that are not part of the API
+EXCLUDED_NAMESPACES = ('admin',)
+
+def car_upload(fixtures):
+    return {
+        'name': 'Toyota', 'model': 'Corolla', 'year': '2024', 'colour': 'white', 'car_type': 'sedan',
+        'price_per_day': 30000, 'pickup_location': 'Lagos', 'status': 'available', 'rules': 'None',
+        'seating_capacity': 5, 'luggage_capacity': 2, 'wheel_drive': '2-wheel', 'fuel_type': 'petrol',
+        'transmission': 'automatic', 'plate_number': 'BENCH-NEW-CAR',
+        'photo': SimpleUploadedFile('benchmark.jpg', fixtures['photo_bytes'], content_type='image/jpeg'),
+    }
+
+def fleet_upload(fixtures):
+    rows = io.StringIO()
+    writer = csv.writer(rows)
+    writer.writerow(['name', 'model', 'year', 'colour', 'car_type', 'price_per_day', 'pickup_location', 'status', 'rules', 'seating_capacity', 'luggage_capacity', 'wheel_drive', 'fuel_type', 'transmission', 'photo', 'plate_number'])
+    for i in range(20):
+        writer.writerow(['Kia', 'Rio', '2023', 'red', 'sedan', 20000, 'Abuja', 'available', 'None', 5, 2, '2-wheel', 'petrol', 'manual', BENCHMARK_PHOTO, f'BENCH-IMPORT-{i}'])
+    return {'file': SimpleUploadedFile('fleet.csv', rows.getvalue().encode('utf-8'), content_type='text/csv')}
+
+def reservation_body(fixtures, offset):
+    start_date = fixtures['today'] + timedelta(days=offset)
+    return {
+        'car': fixtures['car'], 'pickup_location': 'Lagos', 'dropoff_location': 'Lagos',
+        'start_date': str(start_date), 'end_date': str(start_date + timedelta(days=2)),
+    }
+
+'''
+One scenario per request shape. `path` and string `data` are formatted with the
+fixtures, `data` can also be a function of the fixtures, called for every request.
+Every request runs in a transaction that is rolled back, so scenarios that
+write leave the dataset as it was and every run sees the same data.
+'''
+SCENARIOS = [
+    # account
+    {'name': 'account_root', 'method': 'get', 'path': '/api/v1/account/', 'role': 'user'},
+    {'name': 'list_users', 'method': 'get', 'path': '/api/v1/account/users/', 'role': 'admin'},
+    {'name': 'create_user', 'method': 'post', 'path': '/api/v1/account/users/', 'role': 'admin', 'data': {
+        'username': 'bench-new-user', 'email': 'bench-new-user@example.com', 'password': 'Bench-new-pw-1',
+        'address': 'Lagos', 'phone_number': '+2340000000000', 'gender': 'female'}},
+    {'name': 'retrieve_user', 'method': 'get', 'path': '/api/v1/account/users/{user}/', 'role': 'user'},
+    {'name': 'update_user', 'method': 'patch', 'path': '/api/v1/account/users/{user}/', 'role': 'user', 'data': {'address': 'Abuja'}},
+    {'name': 'delete_user', 'method': 'delete', 'path': '/api/v1/account/users/{member}/', 'role': 'admin'},
+    {'name': 'list_payment_methods', 'method': 'get', 'path': '/api/v1/account/paymentmethod/', 'role': 'user'},
+    {'name': 'create_payment_method', 'method': 'post', 'path': '/api/v1/account/paymentmethod/', 'role': 'member', 'data': {
+        'name': 'Bench Member', 'card_number': '4000000000000001', 'security_code': '321', 'expiring_date': '2030-01-01'}},
+    {'name': 'retrieve_payment_method', 'method': 'get', 'path': '/api/v1/account/paymentmethod/{payment_method}/', 'role': 'user'},
+    {'name': 'list_driver_licences', 'method': 'get', 'path': '/api/v1/account/driverlicense/', 'role': 'user'},
+    {'name': 'create_driver_licence', 'method': 'post', 'path': '/api/v1/account/driverlicense/', 'role': 'member', 'data': {
+        'license_number': 'BENCH-LICENCE-1', 'issuing_authority': 'FRSC', 'issue_date': '2024-01-01', 'expiring_date': '2030-01-01'}},
+    {'name': 'retrieve_driver_licence', 'method': 'get', 'path': '/api/v1/account/driverlicense/{licence}/', 'role': 'user'},
+
+    # djoser
+    {'name': 'auth_root', 'method': 'get', 'path': '/api/v1/account/auth/', 'role': 'user'},
+    {'name': 'auth_list_users', 'method': 'get', 'path': '/api/v1/account/auth/users/', 'role': 'user'},
+    {'name': 'auth_register', 'method': 'post', 'path': '/api/v1/account/auth/users/', 'role': 'anon', 'data': {
+        'username': 'bench-signup', 'email': 'bench-signup@example.com', 'password': 'Rental-signup-pw-91'}},
+    {'name': 'auth_activation', 'method': 'post', 'path': '/api/v1/account/auth/users/activation/', 'role': 'anon', 'data': {'uid': 'invalid', 'token': 'invalid'}},
+    {'name': 'auth_me', 'method': 'get', 'path': '/api/v1/account/auth/users/me/', 'role': 'user'},
+    {'name': 'auth_resend_activation', 'method': 'post', 'path': '/api/v1/account/auth/users/resend_activation/', 'role': 'anon', 'data': {'email': '{user_email}'}},
+    {'name': 'auth_reset_password', 'method': 'post', 'path': '/api/v1/account/auth/users/reset_password/', 'role': 'anon', 'data': {'email': '{user_email}'}},
+    {'name': 'auth_reset_password_confirm', 'method': 'post', 'path': '/api/v1/account/auth/users/reset_password_confirm/', 'role': 'anon', 'data': {
+        'uid': 'invalid', 'token': 'invalid', 'new_password': 'Bench-reset-pw-1'}},
+    {'name': 'auth_reset_username', 'method': 'post', 'path': '/api/v1/account/auth/users/reset_username/', 'role': 'anon', 'data': {'email': '{user_email}'}},
+    {'name': 'auth_reset_username_confirm', 'method': 'post', 'path': '/api/v1/account/auth/users/reset_username_confirm/', 'role': 'anon', 'data': {
+        'uid': 'invalid', 'token': 'invalid', 'new_username': 'bench-renamed'}},
+    {'name': 'auth_set_password', 'method': 'post', 'path': '/api/v1/account/auth/users/set_password/', 'role': 'user', 'data': {
+        'current_password': BENCHMARK_PASSWORD, 'new_password': 'Bench-changed-pw-1'}},
+    {'name': 'auth_set_username', 'method': 'post', 'path': '/api/v1/account/auth/users/set_username/', 'role': 'user', 'data': {
+        'current_password': BENCHMARK_PASSWORD, 'new_username': 'bench-renamed'}},
+    {'name': 'auth_retrieve_user', 'method': 'get', 'path': '/api/v1/account/auth/users/{user}/', 'role': 'user'},
+    {'name': 'jwt_create', 'method': 'post', 'path': '/api/v1/account/auth/jwt/create/', 'role': 'anon', 'data': {
+        'username': '{username}', 'password': BENCHMARK_PASSWORD}},
+    # refresh tokens are rotated and revoked on use, so every request gets a new one
+    {'name': 'jwt_refresh', 'method': 'post', 'path': '/api/v1/account/auth/jwt/refresh/', 'role': 'anon', 'data': lambda fixtures: {
+        'refresh': str(RefreshToken.for_user(fixtures['user_obj']))}},
+    {'name': 'jwt_verify', 'method': 'post', 'path': '/api/v1/account/auth/jwt/verify/', 'role': 'anon', 'data': {'token': '{access_token}'}},
+
+    # car
+    {'name': 'create_car', 'method': 'post', 'path': '/api/v1/car/new/', 'role': 'admin', 'format': 'multipart', 'data': car_upload},
+    {'name': 'import_cars', 'method': 'post', 'path': '/api/v1/car/import/', 'role': 'admin', 'format': 'multipart', 'data': fleet_upload},
+    {'name': 'quote_cars', 'method': 'post', 'path': '/api/v1/car/quotes/', 'role': 'anon', 'data': lambda fixtures: {
+        'cars': fixtures['quote_cars'],
+        'ranges': [
+            {'start_date': str(fixtures['today'] + timedelta(days=start)), 'end_date': str(fixtures['today'] + timedelta(days=start + length))}
+            for start, length in ((1, 2), (7, 6), (30, 13))
+        ]}},
+    {'name': 'list_car_rates', 'method': 'get', 'path': '/api/v1/car/rates/', 'role': 'admin'},
+    {'name': 'create_car_rate', 'method': 'post', 'path': '/api/v1/car/rates/', 'role': 'admin', 'data': {'name': 'Bench rate', 'multiplier': '1.10'}},
+    {'name': 'retrieve_car_rate', 'method': 'get', 'path': '/api/v1/car/rates/{rate}/', 'role': 'admin'},
+    {'name': 'update_car_rate', 'method': 'patch', 'path': '/api/v1/car/rates/{rate}/', 'role': 'admin', 'data': {'multiplier': '1.25'}},
+    {'name': 'delete_car_rate', 'method': 'delete', 'path': '/api/v1/car/rates/{rate}/', 'role': 'admin'},
+    {'name': 'list_cars', 'method': 'get', 'path': '/api/v1/car/', 'role': 'anon'},
+    {'name': 'list_cars_sparse', 'method': 'get', 'path': '/api/v1/car/', 'role': 'anon', 'data': {'fields': 'id,name,price_per_day,photo_srcset'}},
+    {'name': 'list_cars_count', 'method': 'get', 'path': '/api/v1/car/', 'role': 'anon', 'data': {'count': 'true'}},
+    {'name': 'list_cars_search', 'method': 'get', 'path': '/api/v1/car/', 'role': 'anon', 'data': {'search': 'toyota suv'}},
+    {'name': 'list_cars_ordered', 'method': 'get', 'path': '/api/v1/car/', 'role': 'anon', 'data': {'ordering': 'name'}},
+    {'name': 'list_cars_available', 'method': 'get', 'path': '/api/v1/car/', 'role': 'user', 'data': lambda fixtures: {
+        'available_from': str(fixtures['today'] + timedelta(days=3)), 'available_to': str(fixtures['today'] + timedelta(days=6))}},
+    {'name': 'async_list_cars', 'method': 'get', 'path': '/api/v1/car/async/', 'role': 'anon'},
+    {'name': 'async_retrieve_car', 'method': 'get', 'path': '/api/v1/car/async/{car}/', 'role': 'anon'},
+    {'name': 'update_car', 'method': 'patch', 'path': '/api/v1/car/{car}/update/', 'role': 'admin', 'data': {'price_per_day': 25000}},
+    {'name': 'retrieve_car', 'method': 'get', 'path': '/api/v1/car/{car}/', 'role': 'anon'},
+    {'name': 'delete_car', 'method': 'delete', 'path': '/api/v1/car/{car}/delete/', 'role': 'admin'},
+
+    # reservation
+    {'name': 'create_reservation', 'method': 'post', 'path': '/api/v1/reservation/new/', 'role': 'user', 'data': lambda fixtures: reservation_body(fixtures, 600)},
+    {'name': 'create_guest_reservation', 'method': 'post', 'path': '/api/v1/reservation/new/', 'role': 'anon', 'data': lambda fixtures: dict(
+        reservation_body(fixtures, 600), guest_email='bench-guest@example.com')},
+    {'name': 'list_reservations', 'method': 'get', 'path': '/api/v1/reservation/', 'role': 'user'},
+    {'name': 'list_reservations_sparse', 'method': 'get', 'path': '/api/v1/reservation/', 'role': 'user', 'data': {'omit': 'pickup_location,dropoff_location'}},
+    {'name': 'list_all_reservations', 'method': 'get', 'path': '/api/v1/reservation/', 'role': 'admin'},
+    {'name': 'list_all_reservations_by_price', 'method': 'get', 'path': '/api/v1/reservation/', 'role': 'admin', 'data': {'ordering': '-total_price'}},
+    {'name': 'export_reservations', 'method': 'get', 'path': '/api/v1/reservation/export/', 'role': 'admin', 'data': lambda fixtures: {
+        'date_from': str(fixtures['today'] - timedelta(days=7)), 'date_to': str(fixtures['today'])}},
+    {'name': 'utilization_analytics', 'method': 'get', 'path': '/api/v1/reservation/analytics/utilization/', 'role': 'admin'},
+    {'name': 'utilization_analytics_by_car', 'method': 'get', 'path': '/api/v1/reservation/analytics/utilization/', 'role': 'admin', 'data': {'group_by': 'car'}},
+    {'name': 'async_retrieve_reservation', 'method': 'get', 'path': '/api/v1/reservation/async/{reservation}/', 'role': 'user'},
+    {'name': 'retrieve_reservation', 'method': 'get', 'path': '/api/v1/reservation/{reservation}/', 'role': 'user'},
+    {'name': 'update_reservation', 'method': 'patch', 'path': '/api/v1/reservation/{reservation}/update/', 'role': 'user', 'data': lambda fixtures: reservation_body(fixtures, 510)},
+    {'name': 'confirm_reservation', 'method': 'post', 'path': '/api/v1/reservation/{reservation}/confirm/', 'role': 'admin'},
+    {'name': 'cancel_reservation', 'method': 'post', 'path': '/api/v1/reservation/{reservation}/cancel/', 'role': 'user'},
+    {'name': 'bulk_confirm_reservations', 'method': 'post', 'path': '/api/v1/reservation/bulk/confirm/', 'role': 'admin', 'data': lambda fixtures: {'ids': [fixtures['reservation']]}},
+    {'name': 'bulk_cancel_reservations', 'method': 'post', 'path': '/api/v1/reservation/bulk/cancel/', 'role': 'user', 'data': {'filter': {'status': ['pending']}}},
+    {'name': 'delete_reservation', 'method': 'delete', 'path': '/api/v1/reservation/{reservation}/delete/', 'role': 'admin'},
+
+    # monitoring
+    {'name': 'metrics', 'method': 'get', 'path': '/api/v1/metrics/', 'role': 'admin'},
+
+    # documentation
+    {'name': 'schema', 'method': 'get', 'path': '/api/v1/schema/', 'role': 'anon'},
+    {'name': 'swagger_ui', 'method': 'get', 'path': '/api/v1/schema/swagger-ui/', 'role': 'anon'},
+    {'name': 'redoc', 'method': 'get', 'path': '/api/v1/schema/redoc/', 'role': 'anon'},
+]
+
+def load_fixtures():
+    user = CustomUser.objects.get(username='bench0')
+    reservation = Reservation.objects.filter(user=user, status='pending').order_by('-start_date').first()
+    return {
+        'today': date.today(),
+        'admin': CustomUser.objects.get(username=ADMIN_USERNAME),
+        'user_obj': user,
+        'member_obj': CustomUser.objects.get(username='bench1'),
+        'user': str(user.pk),
+        'username': user.username,
+        'user_email': user.email,
+        'member': str(CustomUser.objects.get(username='bench1').pk),
+        'reservation': str(reservation.pk),
+        'car': str(reservation.car_id),
+        'quote_cars': [str(pk) for pk in Car.objects.order_by('plate_number').values_list('pk', flat=True)[:50]],
+        'rate': str(CarRate.objects.get(name='Weekends').pk),
+        'payment_method': str(PaymentMethod.objects.get(user=user).pk),
+        'licence': str(DriverLicence.objects.get(user=user).pk),
+        'access_token': str(AccessToken.for_user(user)),
+        'photo_bytes': benchmark_photo_bytes(),
+    }
+
+def client_for(role, fixtures):
+    # the Django test client raises view exceptions by default, they are recorded as 500s instead
+    client = APIClient(raise_request_exception=False)
+    user = {'admin': fixtures['admin'], 'user': fixtures['user_obj'], 'member': fixtures['member_obj']}.get(role)
+    if user is not None:
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    return client
+
+def format_data(data, fixtures):
+    if callable(data):
+        return data(fixtures)
+    if isinstance(data, dict):
+        return {key: value.format(**fixtures) if isinstance(value, str) else value for key, value in data.items()}
+    return data
+
+'''
+Counts the SQL statements run through the connection, savepoints excluded.
+An execute wrapper is used rather than connection.queries, which is capped at
+9000 entries per process and would report 0 queries once full.
+'''
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not is_transaction_statement(sql):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+'''
+Sends one request and returns its status, response size and latency in ms.
+The request data is built inside the rolled back transaction but outside the
+measurements. A traced request also returns its queries and peak memory,
+tracing slows Python down so it is kept out of the latencies.
+'''
+def perform(client, scenario, fixtures, trace=False):
+    path = scenario['path'].format(**fixtures)
+    method = getattr(client, scenario['method'])
+    result = {}
+    with transaction.atomic():
+        data = format_data(scenario.get('data'), fixtures)
+        if trace:
+            tracemalloc.start()
+        try:
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                start = time.perf_counter()
+                if scenario['method'] == 'get':
+                    response = method(path, data=data)
+                else:
+                    response = method(path, data=data, format=scenario.get('format', 'json'))
+                # streamed responses are only produced when consumed
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+                result['elapsed'] = (time.perf_counter() - start) * 1000
+            if trace:
+                result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            if trace:
+                tracemalloc.stop()
+        transaction.set_rollback(True)
+
+    result['status'] = response.status_code
+    result['size'] = len(content)
+    result['queries'] = queries.count
+    return result
+
+# savepoints are not counted as queries
+def is_transaction_statement(sql):
+    return sql.split(' ', 1)[0].upper() in ('BEGIN', 'SAVEPOINT', 'RELEASE', 'ROLLBACK', 'COMMIT')
+
+def percentile(samples, percent):
+    ordered = sorted(samples)
+    rank = max(int(round(percent / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+'''
+Runs one scenario: `warmup` untimed requests, `iterations` timed ones, and a
+traced one for the peak memory
+'''
+def run_scenario(scenario, fixtures, iterations, warmup):
+    cache.clear()
+    client = client_for(scenario['role'], fixtures)
+    for _ in range(warmup):
+        perform(client, scenario, fixtures)
+
+    results = [perform(client, scenario, fixtures) for _ in range(iterations)]
+    traced = perform(client, scenario, fixtures, trace=True)
+    timings = [result['elapsed'] for result in results]
+    queries = [result['queries'] for result in results]
+
+    return {
+        'method': scenario['method'].upper(),
+        'path': scenario['path'],
+        'role': scenario['role'],
+        'route': resolve(scenario['path'].format(**fixtures)).route,
+        'statuses': sorted({result['status'] for result in results + [traced]}),
+        'latency_ms': {
+            'p50': round(percentile(timings, 50), 3),
+            'p95': round(percentile(timings, 95), 3),
+            'p99': round(percentile(timings, 99), 3),
+            'mean': round(sum(timings) / len(timings), 3),
+        },
+        'queries': {
+            'min': min(queries),
+            'max': max(queries),
+        },
+        'peak_memory_kb': round(traced['peak_memory'] / 1024, 1),
+        'response_bytes': traced['size'],
+    }
+
+def join_route(prefix, route):
+    return prefix + route.removeprefix('^') if prefix else route
+
+def api_routes(patterns=None, prefix='', namespace=None):
+    patterns = get_resolver().url_patterns if patterns is None else patterns
+    for pattern in patterns:
+        route = join_route(prefix, str(pattern.pattern))
+        if isinstance(pattern, URLResolver):
+            if (pattern.namespace or namespace) in EXCLUDED_NAMESPACES:
+                continue
+            yield from api_routes(pattern.url_patterns, route, pattern.namespace or namespace)
+        elif isinstance(pattern, URLPattern) and 'format' not in pattern.pattern.regex.groupindex:
+            yield route
+
+def run_benchmarks(iterations=50, warmup=5, only=None, log=None):
+    log = log or (lambda message: None)
+    fixtures = load_fixtures()
+    scenarios = [scenario for scenario in SCENARIOS if not only or any(name in scenario['name'] for name in only)]
+
+    endpoints = {}
+    for scenario in scenarios:
+        endpoints[scenario['name']] = run_scenario(scenario, fixtures, iterations, warmup)
+        log(f"{scenario['name']}: p50 {endpoints[scenario['name']]['latency_ms']['p50']} ms")
+
+    covered = {resolve(scenario['path'].format(**fixtures)).route for scenario in SCENARIOS}
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'warmup': warmup,
+        },
+        'dataset': {
+            'cars': Car.objects.count(),
+            'users': CustomUser.objects.count(),
+            'reservations': Reservation.objects.count(),
+            'booked_intervals': BookedInterval.objects.count(),
+        },
+        'endpoints': endpoints,
+        'uncovered_routes': sorted(set(api_routes()) - covered),
+    }
@@ -0,0 +1,31 @@
+import json
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_test_environment
+from benchmark.harness import run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks every API route against the seeded benchmark database and prints the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--only', nargs='*', help='Only run the scenarios whose name contains one of these')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        # lets the test client in (ALLOWED_HOSTS) and keeps emails in memory
+        setup_test_environment()
+        report = run_benchmarks(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            only=options['only'],
+            log=lambda message: self.stderr.write(message),
+        )
+        output = json.dumps(report, indent=2, sort_keys=True, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Wrote {len(report["endpoints"])} results to {options["output"]}'))
+        else:
+            self.stdout.write(output)
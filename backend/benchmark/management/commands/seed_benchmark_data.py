@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from account.models import CustomUser
+from benchmark.seed import BenchmarkSeeder
+
+
+class Command(BaseCommand):
+    help = 'Seeds a large reproducible dataset for the endpoint benchmarks (run with backend.settings_benchmark)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cars', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--reservations', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['cars'] < 1 or options['users'] < 2:
+            raise CommandError('At least one car and two users are needed.')
+        if CustomUser.objects.exists():
+            raise CommandError('The database is not empty, seed a fresh benchmark database.')
+
+        seeder = BenchmarkSeeder(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=lambda message: self.stdout.write(message),
+        )
+        with transaction.atomic():
+            seeder.run(options['cars'], options['users'], options['reservations'])
+        self.stdout.write(self.style.SUCCESS('Benchmark data seeded'))
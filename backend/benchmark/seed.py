@@ -0,0 +1,187 @@
+import io
+import random
+import uuid
+from datetime import date, timedelta
+from PIL import Image
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from account.models import CustomUser, PaymentMethod, DriverLicence
+from car.models import Car, CarRate
+from car.search import rebuild_search_index
+from reservation.models import Reservation, normalize_email
+from reservation.availability import rebuild_booked_intervals
+from reservation.utilization import rebuild_utilization
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+ADMIN_USERNAME = 'bench-admin'
+BENCHMARK_PHOTO = 'car_photos/benchmark.jpg'
+
+CAR_NAMES = [
+    ('Toyota', ['Corolla', 'Camry', 'RAV4', 'Hiace', 'Land Cruiser']),
+    ('Honda', ['Civic', 'Accord', 'CR-V', 'Odyssey']),
+    ('Mercedes', ['C300', 'E350', 'GLE', 'Sprinter']),
+    ('Lexus', ['RX350', 'ES350', 'LX570']),
+    ('Kia', ['Rio', 'Sorento', 'Carnival']),
+]
+COLOURS = ['black', 'white', 'silver', 'blue', 'red', 'grey']
+LOCATIONS = ['Lagos', 'Abuja', 'Port Harcourt', 'Ibadan', 'Kano', 'Enugu']
+
+def benchmark_photo_bytes(size=(640, 400)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (40, 90, 160)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+'''
+Seeds a large, reproducible dataset for the endpoint benchmarks.
+Everything is drawn from one seeded random generator, ids included, so two
+runs with the same arguments build the same rows. Rows are written with
+bulk_create, which skips the save signals, so the derived tables (search
+terms, booked intervals, utilization rollups) are rebuilt at the end.
+'''
+class BenchmarkSeeder:
+    def __init__(self, seed=0, batch_size=5000, today=None, log=None):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.today = today or date.today()
+        self.log = log or (lambda message: None)
+
+    def uuid(self):
+        return uuid.UUID(int=self.random.getrandbits(128), version=4)
+
+    def bulk_create(self, model, objects):
+        batch = []
+        created = 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+            created += len(batch)
+        self.log(f'{model.__name__}: {created} rows')
+        return created
+
+    def iter_cars(self, count):
+        for i in range(count):
+            make, models = self.random.choice(CAR_NAMES)
+            yield Car(
+                id=self.uuid(),
+                name=make,
+                model=self.random.choice(models),
+                year=str(self.random.randint(2012, 2025)),
+                colour=self.random.choice(COLOURS),
+                car_type=self.random.choice(Car.CARTYPE_CHOICES)[0],
+                price_per_day=float(self.random.randrange(15000, 150000, 500)),
+                pickup_location=self.random.choice(LOCATIONS),
+                status='unavailable' if self.random.random() < 0.05 else 'available',
+                rules='No smoking. Return with a full tank.',
+                seating_capacity=self.random.choice([4, 5, 7, 14]),
+                luggage_capacity=self.random.randint(1, 6),
+                plate_number=f'BENCH-{i:07d}',
+                wheel_drive=self.random.choice(Car.WHEELDRIVE_CHOICES)[0],
+                fuel_type=self.random.choice(Car.FUELTYPE_CHOICES)[0],
+                transmission=self.random.choice(Car.TRANSMISSION_CHOICES)[0],
+                photo=BENCHMARK_PHOTO,
+            )
+
+    def iter_users(self, count, password):
+        for i in range(count):
+            yield CustomUser(
+                id=self.uuid(),
+                username=f'bench{i}',
+                email=f'bench{i}@example.com',
+                password=password,
+                first_name=f'First{i}',
+                last_name=f'Last{i}',
+                address=self.random.choice(LOCATIONS),
+                phone_number=f'+234{self.random.randrange(10 ** 9, 10 ** 10)}',
+                gender=self.random.choice(CustomUser.CHOICES)[0],
+            )
+
+    '''
+    Every car gets a back to back history of reservations, from two years ago
+    into the next months, so firm bookings of a car never overlap
+    '''
+    def iter_reservations(self, count, car_ids, user_ids):
+        per_car, extra = divmod(count, len(car_ids))
+        start_of_history = self.today - timedelta(days=730)
+        for index, car_id in enumerate(car_ids):
+            day = start_of_history + timedelta(days=self.random.randint(0, 30))
+            for _ in range(per_car + (1 if index < extra else 0)):
+                start_date = day
+                end_date = start_date + timedelta(days=self.random.randint(0, 6))
+                day = end_date + timedelta(days=self.random.randint(1, 3))
+
+                guest = self.random.random() < 0.1
+                if end_date < self.today:
+                    status = self.random.choices(['completed', 'cancelled', 'no-show', 'dispute'], [85, 10, 4, 1])[0]
+                else:
+                    status = self.random.choices(['pending', 'confirmed', 'modified'], [40, 50, 10])[0]
+                guest_email = f'guest{self.random.randrange(count)}@example.com' if guest else None
+                yield Reservation(
+                    id=self.uuid(),
+                    user_id=None if guest else self.random.choice(user_ids),
+                    guest_email=guest_email,
+                    guest_email_normalized=normalize_email(guest_email),
+                    car_id=car_id,
+                    reservation_type='soft' if guest else 'firm',
+                    status=status,
+                    pickup_location=self.random.choice(LOCATIONS),
+                    dropoff_location=self.random.choice(LOCATIONS),
+                    start_date=start_date,
+                    end_date=end_date,
+                )
+
+    '''
+    The objects the benchmark scenarios act on: an admin, a user with a
+    payment method, a licence and a pending reservation far in the future,
+    and a few rates
+    '''
+    def create_fixtures(self, password):
+        admin = CustomUser.objects.create(
+            username=ADMIN_USERNAME, email='bench-admin@example.com', password=password,
+            is_staff=True, is_superuser=True,
+        )
+        user = CustomUser.objects.get(username='bench0')
+        PaymentMethod.objects.create(
+            user=user, name=user.get_full_name(), card_number='4000000000000000',
+            security_code='123', expiring_date=self.today + timedelta(days=3 * 365),
+        )
+        DriverLicence.objects.create(
+            user=user, name=user.get_full_name(), license_number='BENCH-LICENCE-0',
+            issuing_authority='FRSC', issue_date=self.today - timedelta(days=365),
+            expiring_date=self.today + timedelta(days=4 * 365),
+        )
+        car = Car.objects.order_by('plate_number').first()
+        start_date = self.today + timedelta(days=500)
+        Reservation.objects.create(
+            user=user, car=car, reservation_type='firm', status='pending',
+            pickup_location=car.pickup_location, dropoff_location=car.pickup_location,
+            start_date=start_date, end_date=start_date + timedelta(days=3),
+        )
+        CarRate.objects.create(name='Weekends', days='weekends', multiplier='1.20')
+        CarRate.objects.create(
+            name='Festive season', start_date=date(self.today.year, 12, 15),
+            end_date=date(self.today.year + 1, 1, 5), multiplier='1.50',
+        )
+        CarRate.objects.create(car=car, name='Launch offer', multiplier='0.90')
+        return admin
+
+    def run(self, cars, users, reservations):
+        password = make_password(BENCHMARK_PASSWORD)
+        if not default_storage.exists(BENCHMARK_PHOTO):
+            default_storage.save(BENCHMARK_PHOTO, ContentFile(benchmark_photo_bytes()))
+        self.bulk_create(Car, self.iter_cars(cars))
+        car_ids = list(Car.objects.order_by('plate_number').values_list('pk', flat=True))
+        self.bulk_create(CustomUser, self.iter_users(users, password))
+        user_ids = list(CustomUser.objects.order_by('username').values_list('pk', flat=True))
+        self.bulk_create(Reservation, self.iter_reservations(reservations, car_ids, user_ids))
+
+        self.create_fixtures(password)
+        self.log(f'CarSearchTerm: {rebuild_search_index(Car.objects.all(), batch_size=self.batch_size)} cars indexed')
+        self.log(f'BookedInterval: {rebuild_booked_intervals(batch_size=self.batch_size)} rows')
+        car_days, type_days = rebuild_utilization(batch_size=self.batch_size)
+        self.log(f'Utilization: {car_days} car days, {type_days} car type days')
@@ -0,0 +1,43 @@
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from account.models import CustomUser
+from .harness import SCENARIOS, QueryCounter, is_transaction_statement, perform
+
+
+class QueryCounterTests(TestCase):
+    def test_statements_are_counted_without_savepoints(self):
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries), CaptureQueriesContext(connection) as captured:
+            with transaction.atomic():
+                CustomUser.objects.count()
+                CustomUser.objects.exists()
+        self.assertEqual(queries.count, 2)
+        self.assertGreater(len(captured), 2)
+
+    def test_transaction_statements(self):
+        self.assertTrue(is_transaction_statement('SAVEPOINT "s1"'))
+        self.assertTrue(is_transaction_statement('release savepoint "s1"'))
+        self.assertFalse(is_transaction_statement('SELECT 1'))
+
+
+class PerformTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_requests_report_their_queries(self):
+        scenario = {'name': 'list_users', 'method': 'get', 'path': '/api/v1/account/users/'}
+        result = perform(self.client, scenario, {})
+        self.assertEqual(result['status'], 200)
+        self.assertGreater(result['queries'], 0)
+        self.assertGreater(result['size'], 0)
+
+    def test_writes_are_rolled_back(self):
+        scenario = next(scenario for scenario in SCENARIOS if scenario['name'] == 'create_user')
+        result = perform(self.client, scenario, {}, trace=True)
+        self.assertEqual(result['status'], 201)
+        self.assertGreater(result['peak_memory'], 0)
+        self.assertFalse(CustomUser.objects.filter(username=scenario['data']['username']).exists())
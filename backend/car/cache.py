@@ -0,0 +1,141 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_etags
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = 'car-catalog:version'
+RATES_VERSION_KEY = 'car-rates:version'
+
+'''
+Versions are bumped whenever what they cover changes, which makes every cached
+entry built from the old version stale at once without having to find them.
+They start from the current time so a flushed cache never reuses old versions.
+The catalog version covers the cars, the rates version the car rates.
+'''
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, timeout=None)
+        return version
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+def bump_catalog_version():
+    return bump_version(CATALOG_VERSION_KEY)
+
+def get_rates_version():
+    return get_version(RATES_VERSION_KEY)
+
+def bump_rates_version():
+    return bump_version(RATES_VERSION_KEY)
+
+def catalog_cache_key(request, version):
+    params = sorted(request.query_params.lists())
+    digest = hashlib.md5(repr((request.get_host(), request.path, params)).encode('utf-8')).hexdigest()
+    audience = 'user' if request.user.is_authenticated else 'anon'
+    return f'car-catalog:{version}:{audience}:{digest}'
+
+def last_modified_of(data):
+    rows = data.get('results', []) if 'results' in data else [data]
+    stamps = [parse_datetime(row['updated_at']) for row in rows if row.get('updated_at')]
+    stamps = [stamp for stamp in stamps if stamp is not None]
+    return max(stamps) if stamps else None
+
+'''
+A car's ETag only depends on its id, updated_at and the fields returned (see
+?fields=), a list's ETag also depends on the catalog version so that deleting
+a car changes it. A car returned without its id or updated_at is tagged like a list.
+'''
+def etag_of(data, key, last_modified):
+    if 'results' in data or 'id' not in data or last_modified is None:
+        basis = f'{key}:{last_modified.isoformat() if last_modified else ""}'
+    else:
+        basis = f'{data["id"]}:{last_modified.isoformat()}:{",".join(data)}'
+    return '"%s"' % hashlib.md5(basis.encode('utf-8')).hexdigest()
+
+async def aget_catalog_version():
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not await cache.aadd(CATALOG_VERSION_KEY, version, timeout=None):
+            version = await cache.aget(CATALOG_VERSION_KEY, version)
+    return version
+
+'''
+Caches the serialized responses of the public car catalog per query string and
+catalog version, and answers conditional GETs with a 304 straight from the cache.
+Availability searches depend on live bookings and are never cached.
+'''
+class BaseCatalogCache:
+    uncached_query_params = ('available_from', 'available_to')
+
+    def is_cacheable(self, request):
+        return not any(param in request.query_params for param in self.uncached_query_params)
+
+    def build_cache_entry(self, key, data):
+        last_modified = last_modified_of(data)
+        return {
+            'data': data,
+            'etag': etag_of(data, key, last_modified),
+            'last_modified': last_modified,
+        }
+
+    def cached_response(self, request, entry):
+        if entry['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        if entry['last_modified']:
+            response['Last-Modified'] = http_date(entry['last_modified'].timestamp())
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+class CatalogCacheMixin(BaseCatalogCache):
+    def get(self, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return super().get(request, *args, **kwargs)
+
+        key = catalog_cache_key(request, get_catalog_version())
+        entry = cache.get(key)
+        if entry is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = self.build_cache_entry(key, response.data)
+            cache.set(key, entry, settings.CAR_CATALOG_CACHE_TIMEOUT)
+        return self.cached_response(request, entry)
+
+'''
+The same catalog cache for the async views in utils/async_views.py
+'''
+class AsyncCatalogCacheMixin(BaseCatalogCache):
+    async def handle(self, view, request):
+        if not self.is_cacheable(request):
+            return await super().handle(view, request)
+
+        key = catalog_cache_key(request, await aget_catalog_version())
+        entry = await cache.aget(key)
+        if entry is None:
+            response = await super().handle(view, request)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = self.build_cache_entry(key, response.data)
+            await cache.aset(key, entry, settings.CAR_CATALOG_CACHE_TIMEOUT)
+        return self.cached_response(request, entry)
@@ -0,0 +1,78 @@
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from utils.query_params import parse_date_param
+from .search import search_cars
+
+'''
+Filters the car list down to the cars that can be booked between
+?available_from= and ?available_to= (YYYY-MM-DD, both inclusive)
+'''
+class AvailabilityFilter(filters.BaseFilterBackend):
+    from_param = 'available_from'
+    to_param = 'available_to'
+
+    def filter_queryset(self, request, queryset, view):
+        available_from = parse_date_param(request, self.from_param)
+        available_to = parse_date_param(request, self.to_param)
+        if not available_from and not available_to:
+            return queryset
+
+        available_from = available_from or available_to
+        available_to = available_to or available_from
+        if available_from > available_to:
+            raise ValidationError({
+                'date error': 'available_to cannot be before available_from'
+            })
+
+        # imported here as the reservation app depends on the car app
+        from reservation.availability import available_cars
+
+        # registered users override soft (guest) reservations when they book
+        include_soft = not request.user.is_authenticated
+        return available_cars(queryset, available_from, available_to, include_soft=include_soft)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.from_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Only return cars that are free from this date (YYYY-MM-DD)',
+                'schema': {'type': 'string', 'format': 'date'},
+            },
+            {
+                'name': self.to_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Only return cars that are free until this date (YYYY-MM-DD)',
+                'schema': {'type': 'string', 'format': 'date'},
+            },
+        ]
+
+'''
+Full-text search over the car inverted index (see car/search.py).
+Results are ranked by relevance unless an explicit ?ordering= is given.
+'''
+class CarSearchFilter(filters.BaseFilterBackend):
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+
+        queryset = search_cars(queryset, query)
+        if not request.query_params.get(filters.OrderingFilter.ordering_param):
+            queryset = queryset.order_by('-search_rank', 'pk')
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Search the cars by name, model, type, colour, location and specs',
+                'schema': {'type': 'string'},
+            },
+        ]
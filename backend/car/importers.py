@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+from pathlib import PurePosixPath
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from .models import Car, CarSearchTerm
+from .serializers import CarImportSerializer
+from .search import car_terms
+from .cache import bump_catalog_version
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+def guess_format(filename):
+    suffix = PurePosixPath(filename or '').suffix.lower()
+    if suffix in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    return 'csv'
+
+'''
+Yields (row number, row dict or None, parse error or None) from a binary
+CSV or NDJSON stream, one line at a time
+'''
+def iter_rows(stream, file_format):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, {key: value for key, value in row.items() if key}, None
+        return
+
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, {'row': [f'Invalid JSON: {e}']}
+            continue
+        if not isinstance(row, dict):
+            yield number, None, {'row': ['Each line must be a JSON object.']}
+            continue
+        yield number, row, None
+
+'''
+Imports a fleet file in batches: rows are validated with the CarSerializer
+rules, plate numbers are checked against the database once per batch and
+each batch is inserted with bulk_create. Invalid rows are reported and
+skipped without aborting the import.
+'''
+class FleetImporter:
+    def __init__(self, archive=None, batch_size=500, storage=default_storage):
+        self.archive = archive
+        self.archive_names = set(archive.namelist()) if archive else set()
+        self.batch_size = batch_size
+        self.storage = storage
+        self.created = 0
+        self.errors = []
+        self.seen_plates = set()
+        self.stored_photos = {}
+
+    def run(self, rows):
+        batch = []
+        for number, row, error in rows:
+            if error:
+                self.errors.append({'row': number, 'errors': error})
+                continue
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        if self.created:
+            transaction.on_commit(bump_catalog_version)
+        return {'created': self.created, 'failed': len(self.errors), 'errors': self.errors}
+
+    def validate_photo(self, name):
+        if self.archive is not None:
+            if name not in self.archive_names:
+                return 'Photo not found in the archive.'
+        elif not self.storage.exists(name):
+            return 'Photo not found.'
+        return None
+
+    # photos shared by several rows are only extracted once
+    def store_photo(self, name):
+        if self.archive is None:
+            return name
+        if name not in self.stored_photos:
+            filename = PurePosixPath(name).name
+            with self.archive.open(name) as photo:
+                self.stored_photos[name] = self.storage.save(
+                    f'car_photos/{filename}', File(photo, name=filename),
+                    max_length=Car._meta.get_field('photo').max_length,
+                )
+        return self.stored_photos[name]
+
+    def import_batch(self, batch):
+        valid = []
+        for number, row in batch:
+            serializer = CarImportSerializer(data=row)
+            if not serializer.is_valid():
+                self.errors.append({'row': number, 'errors': serializer.errors})
+                continue
+            data = serializer.validated_data
+            photo_error = self.validate_photo(data['photo'])
+            if photo_error:
+                self.errors.append({'row': number, 'errors': {'photo': [photo_error]}})
+                continue
+            if data['plate_number'] in self.seen_plates:
+                self.errors.append({'row': number, 'errors': {'plate_number': ['Duplicate plate number in the file.']}})
+                continue
+            self.seen_plates.add(data['plate_number'])
+            valid.append((number, data))
+
+        # one uniqueness query for the whole batch
+        existing = set(
+            Car.objects.filter(plate_number__in=[data['plate_number'] for number, data in valid])
+            .values_list('plate_number', flat=True)
+        )
+        stored_before = set(self.stored_photos)
+        try:
+            cars = []
+            for number, data in valid:
+                if data['plate_number'] in existing:
+                    self.errors.append({'row': number, 'errors': {'plate_number': ['car with this plate number already exists.']}})
+                    continue
+                data = dict(data, photo=self.store_photo(data['photo']))
+                cars.append(Car(**data))
+
+            if not cars:
+                return
+            with transaction.atomic():
+                Car.objects.bulk_create(cars)
+                # bulk_create does not send post_save, so the search index is filled here
+                CarSearchTerm.objects.bulk_create([
+                    CarSearchTerm(car=car, term=term, weight=weight)
+                    for car in cars
+                    for term, weight in car_terms(car).items()
+                ], batch_size=1000)
+        except Exception:
+            # the batch was rolled back, the photos extracted for it would be orphans
+            for name in set(self.stored_photos) - stored_before:
+                self.storage.delete(self.stored_photos.pop(name))
+            raise
+        self.created += len(cars)
@@ -0,0 +1,39 @@
+import json
+import zipfile
+from django.core.management.base import BaseCommand, CommandError
+from car.importers import FleetImporter, IMPORT_FORMATS, guess_format, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Imports cars in bulk from a CSV or NDJSON fleet file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON fleet file')
+        parser.add_argument('--photos', help='Zip archive holding the photos referenced by the photo column')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--errors', help='Write the per-row errors to this JSON file')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or guess_format(options['path'])
+        archive = None
+        try:
+            if options['photos']:
+                archive = zipfile.ZipFile(options['photos'])
+            with open(options['path'], 'rb') as stream:
+                importer = FleetImporter(archive=archive, batch_size=options['batch_size'])
+                report = importer.run(iter_rows(stream, file_format))
+        except (OSError, zipfile.BadZipFile) as e:
+            raise CommandError(str(e))
+        finally:
+            if archive is not None:
+                archive.close()
+
+        if options['errors']:
+            with open(options['errors'], 'w') as errors_file:
+                json.dump(report['errors'], errors_file, indent=2)
+        else:
+            for error in report['errors']:
+                self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {report['created']} cars, {report['failed']} rows failed"))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from car.photos import pending_photo_cars, process_car_photo
+
+
+class Command(BaseCommand):
+    help = 'Builds the thumbnail, card and hero variants of new or replaced car photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new photos until interrupted')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds to sleep when there is nothing to process')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            for car in pending_photo_cars().iterator():
+                if process_car_photo(car):
+                    processed += 1
+            if processed:
+                self.stdout.write(f'Built photo variants for {processed} cars')
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
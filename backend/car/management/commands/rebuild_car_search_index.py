@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from car.models import Car
+from car.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the inverted index used by the car search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = rebuild_search_index(Car.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} cars'))
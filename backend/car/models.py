@@ -53,6 +53,10 @@ class Car(models.Model):
     fuel_type = models.CharField(choices=FUELTYPE_CHOICES, max_length=20)
     transmission = models.CharField(choices=TRANSMISSION_CHOICES, max_length=20)
     photo = models.ImageField(upload_to='car_photos', blank=False, null=False)
+    # resized copies of the photo built by `manage.py process_car_photos`,
+    # photo_variants_source is the photo they were built from
+    photo_variants = models.JSONField(default=dict, blank=True, editable=False)
+    photo_variants_source = models.CharField(max_length=255, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -63,4 +67,64 @@ class Car(models.Model):
             models.Index(fields=['year']),
             models.Index(fields=['colour']),
             models.Index(fields=['car_type']),
+            models.Index(fields=['created_at', 'id']),
         ]
+
+
+'''
+Inverted index over the searchable car fields, one row per (car, term).
+Terms are the lowercased words of each field plus their prefixes, so a search
+for "toy" finds a Toyota with an indexed equality lookup instead of a table scan.
+'''
+class CarSearchTerm(models.Model):
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=50)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('car', 'term')
+        indexes = [
+            models.Index(fields=['term', 'car']),
+        ]
+
+'''
+Seasonal and weekend pricing. Every rate that covers a day multiplies the
+car's price_per_day for that day, so a summer rate and a weekend rate add up
+on summer weekends. Rates without a car apply to the whole fleet, rates
+without dates apply all year round.
+'''
+class CarRate(models.Model):
+    DAYS_CHOICES = (
+        ('all', 'All days'),
+        ('weekdays', 'Weekdays'),
+        ('weekends', 'Weekends'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='rates', null=True, blank=True)
+    name = models.CharField(max_length=100)
+    days = models.CharField(choices=DAYS_CHOICES, max_length=20, default='all')
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    multiplier = models.DecimalField(max_digits=5, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['car', 'start_date', 'end_date']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def applies_on(self, day):
+        if self.start_date and day < self.start_date:
+            return False
+        if self.end_date and day > self.end_date:
+            return False
+        if self.days == 'weekends':
+            return day.weekday() >= 5
+        if self.days == 'weekdays':
+            return day.weekday() < 5
+        return True
@@ -0,0 +1,99 @@
+import logging
+from io import BytesIO
+from pathlib import PurePosixPath
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps
+from .models import Car
+from .cache import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+# variant -> (width, height)
+VARIANT_SIZES = {
+    'thumbnail': (160, 120),
+    'card': (480, 320),
+    'hero': (1280, 720),
+}
+
+# (extension, Pillow format, save options)
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+def variant_path(car, variant, extension):
+    stem = PurePosixPath(car.photo.name).stem
+    return f'car_photos/variants/{car.pk}/{stem}-{variant}.{extension}'
+
+def render_variants(car, storage=default_storage):
+    with car.photo.open('rb') as photo:
+        image = Image.open(photo)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+
+    variants = {}
+    for variant, size in VARIANT_SIZES.items():
+        resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        variants[variant] = {'width': size[0], 'height': size[1]}
+        for extension, image_format, options in VARIANT_FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            path = variant_path(car, variant, extension)
+            # same source, same path: re-running overwrites instead of piling up copies
+            if storage.exists(path):
+                storage.delete(path)
+            variants[variant][extension] = storage.save(path, ContentFile(buffer.getvalue()))
+    return variants
+
+def variant_files(variants):
+    return {
+        path
+        for variant in variants.values()
+        for extension, path in variant.items()
+        if extension not in ('width', 'height')
+    }
+
+'''
+Builds the photo variants of a car unless they are already up to date.
+Returns True when new variants were stored.
+'''
+def process_car_photo(car, storage=default_storage):
+    if not car.photo:
+        return False
+    if car.photo_variants_source == car.photo.name and car.photo_variants:
+        return False
+
+    try:
+        variants = render_variants(car, storage=storage)
+    except Exception:
+        # an unreadable upload is recorded as processed so the worker does not retry it forever
+        logger.exception('Could not build photo variants for car %s', car.pk)
+        variants = {}
+
+    # only store the result if the photo was not replaced in the meantime,
+    # updated_at moves so the detail ETag and Last-Modified change with it
+    updated_at = timezone.now()
+    updated = Car.objects.filter(pk=car.pk, photo=car.photo.name).update(
+        photo_variants=variants,
+        photo_variants_source=car.photo.name,
+        updated_at=updated_at,
+    )
+    if not updated:
+        for path in variant_files(variants):
+            storage.delete(path)
+        return False
+
+    for path in variant_files(car.photo_variants) - variant_files(variants):
+        storage.delete(path)
+    car.photo_variants = variants
+    car.photo_variants_source = car.photo.name
+    car.updated_at = updated_at
+    transaction.on_commit(bump_catalog_version)
+    return bool(variants)
+
+def pending_photo_cars():
+    return Car.objects.exclude(photo='').exclude(photo_variants_source=F('photo'))
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from itertools import accumulate
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from .cache import get_catalog_version, get_rates_version
+from .models import Car, CarRate
+
+'''
+Daily rate tables used to quote many cars over many date ranges at once.
+A car's table holds the running total of its daily prices, in cents, for
+CAR_QUOTE_HORIZON_DAYS days from today, so quoting any date range is one
+subtraction however long the range is. Tables are cached per catalog and rates
+version, so they are rebuilt as soon as a car or a rate changes.
+'''
+def rate_table_key(car_id, start, catalog_version, rates_version):
+    return f'car-rates:{catalog_version}:{rates_version}:{start.isoformat()}:{car_id}'
+
+def daily_multipliers(rates, start, days):
+    multipliers = [1.0] * days
+    end = start + timedelta(days=days - 1)
+    for rate in rates:
+        first = max(rate.start_date or start, start)
+        last = min(rate.end_date or end, end)
+        factor = float(rate.multiplier)
+        for offset in range((first - start).days, (last - start).days + 1):
+            if rate.applies_on(start + timedelta(days=offset)):
+                multipliers[offset] *= factor
+    return multipliers
+
+def build_rate_tables(cars, start, days):
+    if not cars:
+        return {}
+    end = start + timedelta(days=days - 1)
+    rates = list(
+        CarRate.objects.filter(Q(car__in=cars) | Q(car__isnull=True))
+        .filter(Q(start_date__isnull=True) | Q(start_date__lte=end))
+        .filter(Q(end_date__isnull=True) | Q(end_date__gte=start))
+    )
+    fleet = daily_multipliers([rate for rate in rates if rate.car_id is None], start, days)
+
+    tables = {}
+    for car in cars:
+        own = daily_multipliers([rate for rate in rates if rate.car_id == car.pk], start, days)
+        base = car.price_per_day * 100
+        tables[car.pk] = [0] + list(accumulate(
+            round(base * fleet_factor * own_factor)
+            for fleet_factor, own_factor in zip(fleet, own)
+        ))
+    return tables
+
+'''
+Returns the rate table of each car starting on `start` (today), building
+and caching the ones that are not cached yet with two queries. Cars that do
+not exist are cached as None, creating a car bumps the catalog version anyway.
+'''
+def get_rate_tables(car_ids, start):
+    catalog_version = get_catalog_version()
+    rates_version = get_rates_version()
+    keys = {car_id: rate_table_key(car_id, start, catalog_version, rates_version) for car_id in car_ids}
+
+    cached = cache.get_many(keys.values())
+    tables = {car_id: cached[key] for car_id, key in keys.items() if key in cached}
+    missing = [car_id for car_id in car_ids if car_id not in tables]
+    if missing:
+        built = build_rate_tables(list(Car.objects.filter(pk__in=missing)), start, settings.CAR_QUOTE_HORIZON_DAYS)
+        tables.update({car_id: built.get(car_id) for car_id in missing})
+        cache.set_many({keys[car_id]: tables[car_id] for car_id in missing}, settings.CAR_RATE_TABLE_CACHE_TIMEOUT)
+    return tables
+
+def quote_from_table(table, table_start, start_date, end_date):
+    first = (start_date - table_start).days
+    last = (end_date - table_start).days + 1
+    # a negative index would silently read from the end of the table
+    if first < 0 or last >= len(table):
+        raise ValueError(f'{start_date} to {end_date} is outside the rate table starting on {table_start}')
+    return (table[last] - table[first]) / 100
+
+'''
+Total price of booking a car between two dates (both inclusive), built with the
+same rates and per-day rounding as the quotes so a booking costs what it was
+quoted, whatever the dates
+'''
+def price_booking(car, start_date, end_date):
+    days = (end_date - start_date).days + 1
+    return build_rate_tables([car], start_date, days)[car.pk][-1] / 100
+
+'''
+Prices every car over every date range, cars that do not exist are left out.
+`today` is the day the ranges were validated against, so a request running
+across midnight still reads its own table.
+'''
+def quote_cars(car_ids, ranges, today):
+    car_ids = list(dict.fromkeys(car_ids))
+    table_start = today
+    tables = get_rate_tables(car_ids, table_start)
+    return [
+        {
+            'car': car_id,
+            'quotes': [
+                {
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'duration': (end_date - start_date).days + 1,
+                    'total_price': quote_from_table(tables[car_id], table_start, start_date, end_date),
+                }
+                for start_date, end_date in ranges
+            ],
+        }
+        for car_id in car_ids
+        if tables[car_id] is not None
+    ]
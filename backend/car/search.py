@@ -0,0 +1,87 @@
+import re
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from .models import CarSearchTerm
+
+# field -> weight of a match in that field
+SEARCH_FIELD_WEIGHTS = {
+    'name': 5,
+    'model': 5,
+    'car_type': 3,
+    'year': 2,
+    'colour': 2,
+    'pickup_location': 1,
+    'status': 1,
+    'seating_capacity': 1,
+    'luggage_capacity': 1,
+    'fuel_type': 1,
+    'transmission': 1,
+}
+
+MIN_PREFIX_LENGTH = 1
+MAX_TERM_LENGTH = CarSearchTerm._meta.get_field('term').max_length
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(str(text).lower())]
+
+'''
+Returns {term: weight} for a car. A whole word counts double compared to one of
+its prefixes so exact matches rank above partial ones.
+'''
+def car_terms(car):
+    terms = {}
+    for field, weight in SEARCH_FIELD_WEIGHTS.items():
+        for token in tokenize(getattr(car, field)):
+            terms[token] = terms.get(token, 0) + weight * 2
+            for length in range(MIN_PREFIX_LENGTH, len(token)):
+                prefix = token[:length]
+                terms[prefix] = terms.get(prefix, 0) + weight
+    return terms
+
+def index_car(car):
+    CarSearchTerm.objects.filter(car=car).delete()
+    CarSearchTerm.objects.bulk_create([
+        CarSearchTerm(car=car, term=term, weight=weight)
+        for term, weight in car_terms(car).items()
+    ])
+
+def rebuild_search_index(cars, batch_size=1000):
+    CarSearchTerm.objects.all().delete()
+    batch = []
+    indexed = 0
+    for car in cars.iterator(chunk_size=batch_size):
+        batch.extend(
+            CarSearchTerm(car_id=car.pk, term=term, weight=weight)
+            for term, weight in car_terms(car).items()
+        )
+        indexed += 1
+        if len(batch) >= batch_size:
+            CarSearchTerm.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        CarSearchTerm.objects.bulk_create(batch)
+    return indexed
+
+'''
+Keeps the cars that match every word of the query, annotated with a
+search_rank (sum of the weights of the matched terms). Words only match
+the start of the car's words, a word found in the middle of another one does
+not match.
+'''
+def search_cars(queryset, query):
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return queryset
+
+    matches = CarSearchTerm.objects.filter(term__in=terms)
+    matching_cars = matches.values('car').annotate(matched=Count('term')).filter(matched=len(terms)).values('car')
+    rank = (
+        matches.filter(car=OuterRef('pk'))
+        .values('car')
+        .annotate(rank=Sum('weight'))
+        .values('rank')
+    )
+    return queryset.filter(pk__in=matching_cars).annotate(
+        search_rank=Subquery(rank, output_field=IntegerField())
+    )
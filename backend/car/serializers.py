@@ -1,7 +1,115 @@
+from datetime import date, timedelta
 from rest_framework import serializers
-from .models import Car
+from django.conf import settings
+from django.core.files.storage import default_storage
+from utils.sparse_fields import SparseFieldsSerializerMixin
+from .models import Car, CarRate
+from .photos import VARIANT_FORMATS
+
+class CarSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    photo_variants = serializers.SerializerMethodField()
+    photo_srcset = serializers.SerializerMethodField()
+
+    sparse_field_sources = {
+        'photo_variants': ['photo', 'photo_variants', 'photo_variants_source'],
+        'photo_srcset': ['photo', 'photo_variants', 'photo_variants_source'],
+    }
 
-class CarSerializer(serializers.ModelSerializer):
     class Meta:
         model = Car
-        fields = ['id', 'name', 'model', 'year', 'colour', 'car_type', 'price_per_day', 'pickup_location', 'status', 'rules', 'seating_capacity', 'luggage_capacity', 'wheel_drive', 'fuel_type', 'transmission', 'photo', 'plate_number', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'name', 'model', 'year', 'colour', 'car_type', 'price_per_day', 'pickup_location', 'status', 'rules', 'seating_capacity', 'luggage_capacity', 'wheel_drive', 'fuel_type', 'transmission', 'photo', 'photo_variants', 'photo_srcset', 'plate_number', 'created_at', 'updated_at']
+
+    def variant_url(self, path):
+        url = default_storage.url(path)
+        request = self.context.get('request', None)
+        if request:
+            return request.build_absolute_uri(url)
+        return url
+
+    # variants built from an older photo are not exposed, clients fall back to `photo`
+    def current_variants(self, car):
+        if car.photo and car.photo_variants_source == car.photo.name:
+            return car.photo_variants
+        return {}
+
+    def get_photo_variants(self, car):
+        return {
+            variant: {
+                key: value if key in ('width', 'height') else self.variant_url(value)
+                for key, value in files.items()
+            }
+            for variant, files in self.current_variants(car).items()
+        }
+
+    def get_photo_srcset(self, car):
+        variants = self.current_variants(car)
+        return {
+            extension: ', '.join(
+                f"{self.variant_url(files[extension])} {files['width']}w"
+                for files in sorted(variants.values(), key=lambda files: files['width'])
+                if extension in files
+            )
+            for extension, image_format, options in VARIANT_FORMATS
+        } if variants else {}
+
+'''
+Validates one row of a fleet import with the CarSerializer field rules.
+plate_number uniqueness is checked once per batch by the importer, and photo
+is the name of a file in the photo archive (or already in media storage).
+'''
+class CarImportSerializer(serializers.ModelSerializer):
+    photo = serializers.CharField(max_length=Car._meta.get_field('photo').max_length)
+
+    class Meta:
+        model = Car
+        fields = ['name', 'model', 'year', 'colour', 'car_type', 'price_per_day', 'pickup_location', 'status', 'rules', 'seating_capacity', 'luggage_capacity', 'wheel_drive', 'fuel_type', 'transmission', 'photo', 'plate_number']
+        extra_kwargs = {
+            'plate_number': {'validators': []},
+        }
+
+class CarRateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CarRate
+        fields = ['id', 'car', 'name', 'days', 'start_date', 'end_date', 'multiplier', 'created_at', 'updated_at']
+
+    def validate_multiplier(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('The multiplier must be greater than zero')
+        return value
+
+    def validate(self, data):
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and start_date > end_date:
+            raise serializers.ValidationError({
+                'date error': 'The end date cannot be before the start date'
+            })
+        return data
+
+class QuoteRangeSerializer(serializers.Serializer):
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+
+    def validate(self, data):
+        # the quote view validates and prices against the same day
+        today = self.context.get('today') or date.today()
+        if data['start_date'] < today:
+            raise serializers.ValidationError({
+                'date error': 'The start date must be a current or future date'
+            })
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError({
+                'date error': 'The end date cannot be before the start date'
+            })
+        if data['end_date'] >= today + timedelta(days=settings.CAR_QUOTE_HORIZON_DAYS):
+            raise serializers.ValidationError({
+                'date error': f'Quotes are only available for the next {settings.CAR_QUOTE_HORIZON_DAYS} days'
+            })
+        return data
+
+'''
+A batch quote prices every car in `cars` over every range in `ranges`
+'''
+class QuoteRequestSerializer(serializers.Serializer):
+    cars = serializers.ListField(child=serializers.UUIDField(), min_length=1, max_length=100)
+    ranges = serializers.ListField(child=QuoteRangeSerializer(), min_length=1, max_length=20)
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Car, CarRate
+from .search import index_car
+from .cache import bump_catalog_version, bump_rates_version
+
+'''
+Keeps the search index of a car in sync, its terms are removed by cascade on delete
+'''
+@receiver(post_save, sender=Car)
+def update_car_search_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_car(instance)
+
+'''
+Invalidates every cached catalog response once the change is committed, a
+bump before that would let a concurrent request cache the old rows again
+under the new version
+'''
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def invalidate_car_catalog_cache(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(bump_catalog_version)
+
+'''
+Invalidates every cached rate table once the change is committed
+'''
+@receiver(post_save, sender=CarRate)
+@receiver(post_delete, sender=CarRate)
+def invalidate_car_rate_tables(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(bump_rates_version)
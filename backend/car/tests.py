@@ -1,3 +1,539 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from asgiref.sync import sync_to_async
+from base64 import b64encode
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+from account.models import CustomUser
+from reservation.models import Reservation
+from .importers import FleetImporter
+from .models import Car, CarRate, CarSearchTerm
+from .photos import VARIANT_FORMATS, VARIANT_SIZES, pending_photo_cars, process_car_photo
 
-# Create your tests here.
+LIST_URL = '/api/v1/car/'
+ASYNC_LIST_URL = '/api/v1/car/async/'
+QUOTES_URL = '/api/v1/car/quotes/'
+RATES_URL = '/api/v1/car/rates/'
+
+
+def create_car(plate_number, **fields):
+    data = {
+        'name': 'Corolla', 'model': 'LE', 'year': '2022', 'colour': 'white', 'car_type': 'sedan',
+        'price_per_day': 100.0, 'pickup_location': 'Lagos', 'status': 'available', 'rules': 'No smoking',
+        'seating_capacity': 5, 'luggage_capacity': 2, 'wheel_drive': '2-wheel', 'fuel_type': 'petrol',
+        'transmission': 'automatic', 'photo': 'car_photos/corolla.jpg', 'plate_number': plate_number,
+    }
+    data.update(fields)
+    return Car.objects.create(**data)
+
+def result_ids(response):
+    return [car['id'] for car in response.json()['results']]
+
+# uploaded files go to a temporary MEDIA_ROOT, removed after the test
+class TemporaryMediaMixin:
+    def use_temporary_media(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class CarAvailabilityFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = date.today()
+        self.booked = create_car('LAG-001')
+        self.free = create_car('LAG-002')
+        self.reservation = Reservation.objects.create(
+            car=self.booked, guest_email='guest@example.com', reservation_type='soft', pickup_location='Lagos',
+            dropoff_location='Abuja', start_date=self.today, end_date=self.today + timedelta(days=2),
+        )
+        self.client = APIClient()
+
+    def test_cars_booked_in_the_range_are_left_out(self):
+        response = self.client.get(LIST_URL, {'available_from': str(self.today + timedelta(days=1)), 'available_to': str(self.today + timedelta(days=5))})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(result_ids(response), [str(self.free.pk)])
+
+    def test_range_after_the_booking_includes_the_car(self):
+        response = self.client.get(LIST_URL, {'available_from': str(self.today + timedelta(days=3))})
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_registered_users_see_cars_with_soft_bookings(self):
+        self.client.force_authenticate(CustomUser.objects.create_user(username='user', email='user@example.com', password='password'))
+        response = self.client.get(LIST_URL, {'available_from': str(self.today)})
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_cancelled_reservation_frees_the_car(self):
+        self.reservation.status = 'cancelled'
+        self.reservation.save()
+        response = self.client.get(LIST_URL, {'available_from': str(self.today), 'available_to': str(self.today)})
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_invalid_dates_are_rejected(self):
+        self.assertEqual(self.client.get(LIST_URL, {'available_from': 'tomorrow'}).status_code, 400)
+        response = self.client.get(LIST_URL, {'available_from': str(self.today + timedelta(days=1)), 'available_to': str(self.today)})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date error', response.json())
+
+
+class CarSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.toyota = create_car('LAG-001', name='Toyota', model='Corolla', colour='Blue')
+        self.honda = create_car('LAG-002', name='Honda', model='Civic', colour='blue')
+        self.client = APIClient()
+
+    def search(self, query, **params):
+        return result_ids(self.client.get(LIST_URL, {'search': query, **params}))
+
+    def test_word_prefixes_match(self):
+        self.assertEqual(self.search('toy'), [str(self.toyota.pk)])
+        self.assertEqual(self.search('h'), [str(self.honda.pk)])
+
+    def test_every_word_has_to_match(self):
+        self.assertEqual(self.search('blue civ'), [str(self.honda.pk)])
+
+    def test_name_matches_rank_above_colour_matches(self):
+        create_car('LAG-003', name='Blue', model='Bird', colour='red')
+        self.assertEqual(self.client.get(LIST_URL, {'search': 'blue'}).json()['results'][0]['name'], 'Blue')
+
+    def test_explicit_ordering_replaces_the_ranking(self):
+        response = self.client.get(LIST_URL, {'search': 'blue', 'ordering': 'name'})
+        self.assertEqual([car['name'] for car in response.json()['results']], ['Honda', 'Toyota'])
+
+    def test_misses_return_nothing_without_scanning_the_cars(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search('ivic'), [])
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries))
+
+    def test_index_follows_car_changes(self):
+        self.honda.name = 'Mazda'
+        self.honda.save()
+        self.assertEqual(self.search('honda'), [])
+        self.assertEqual(self.search('mazda'), [str(self.honda.pk)])
+
+    def test_rebuild_command_reindexes_every_car(self):
+        CarSearchTerm.objects.all().delete()
+        call_command('rebuild_car_search_index', stdout=StringIO())
+        self.assertEqual(self.search('corolla'), [str(self.toyota.pk)])
+
+
+class CarListPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cars = [create_car(f'LAG-{i:03}') for i in range(45)]
+        self.client = APIClient()
+
+    def walk(self, url, params):
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            body = response.json()
+            pages.append([car['id'] for car in body['results']])
+            if not body['next']:
+                return pages, body
+            response = self.client.get(body['next'])
+
+    def test_page_numbers_are_the_default(self):
+        body = self.client.get(LIST_URL, {'page': 3}).json()
+        self.assertEqual(body['count'], 45)
+        self.assertEqual(len(body['results']), 5)
+
+    def test_cursor_pages_cover_every_car_once_newest_first(self):
+        pages, last = self.walk(LIST_URL, {'pagination': 'cursor'})
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        ids = [car_id for page in pages for car_id in page]
+        self.assertEqual(ids, [str(car.pk) for car in sorted(self.cars, key=lambda car: (car.created_at, car.pk), reverse=True)])
+        self.assertNotIn('count', last)
+
+    def test_previous_links_walk_back(self):
+        pages, last = self.walk(LIST_URL, {'pagination': 'cursor'})
+        body = self.client.get(last['previous']).json()
+        self.assertEqual([car['id'] for car in body['results']], pages[1])
+        body = self.client.get(body['previous']).json()
+        self.assertEqual([car['id'] for car in body['results']], pages[0])
+        self.assertIsNone(body['previous'])
+
+    def test_cursor_pages_are_a_single_query(self):
+        first = self.client.get(LIST_URL, {'pagination': 'cursor'}).json()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first['next'])
+        car_table = connection.ops.quote_name(Car._meta.db_table)
+        self.assertEqual(len([query for query in queries if car_table in query['sql']]), 1)
+
+    def test_count_is_only_run_on_request(self):
+        self.assertEqual(self.client.get(LIST_URL, {'pagination': 'cursor', 'count': 'true'}).json()['count'], 45)
+
+    def test_cursors_only_follow_created_at(self):
+        oldest = self.client.get(LIST_URL, {'pagination': 'cursor', 'ordering': 'created_at'}).json()['results'][0]
+        self.assertEqual(oldest['id'], str(min(self.cars, key=lambda car: (car.created_at, car.pk)).pk))
+        self.assertEqual(self.client.get(LIST_URL, {'pagination': 'cursor', 'ordering': 'name'}).status_code, 400)
+        self.assertEqual(self.client.get(LIST_URL, {'pagination': 'cursor', 'search': 'corolla'}).status_code, 400)
+
+    def test_invalid_cursors_are_not_found(self):
+        tampered = b64encode(json.dumps({'c': '2024-01-01T00:00:00+00:00', 'i': 'nope'}).encode()).decode()
+        for cursor in ('garbage', tampered):
+            self.assertEqual(self.client.get(LIST_URL, {'cursor': cursor}).status_code, 404)
+        self.assertEqual(self.client.get(LIST_URL, {'pagination': 'offset'}).status_code, 400)
+
+
+class CarCatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.car = create_car('LAG-001')
+        self.client = APIClient()
+
+    def car_queries(self, queries):
+        car_table = connection.ops.quote_name(Car._meta.db_table)
+        return [query for query in queries if car_table in query['sql']]
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        first = self.client.get(LIST_URL)
+        self.client.get(f'{LIST_URL}{self.car.pk}/')
+        with CaptureQueriesContext(connection) as queries:
+            again = self.client.get(LIST_URL)
+            detail = self.client.get(f'{LIST_URL}{self.car.pk}/')
+        self.assertEqual(self.car_queries(queries), [])
+        self.assertEqual(again.json(), first.json())
+        self.assertIn('Last-Modified', detail)
+
+    def test_unchanged_catalog_answers_304(self):
+        etag = self.client.get(LIST_URL)['ETag']
+        response = self.client.get(LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_saved_car_is_served_once_committed(self):
+        etag = self.client.get(LIST_URL)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.name = 'Camry'
+            self.car.save()
+            # the cache only moves on once the change is committed
+            self.assertEqual(self.client.get(LIST_URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(LIST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['name'], 'Camry')
+
+    def test_deleted_car_leaves_the_list(self):
+        detail_url = f'{LIST_URL}{self.car.pk}/'
+        self.client.get(LIST_URL)
+        self.client.get(detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.delete()
+        self.assertEqual(self.client.get(LIST_URL).json()['results'], [])
+        self.assertEqual(self.client.get(detail_url).status_code, 404)
+
+    def test_availability_searches_are_not_cached(self):
+        today = str(date.today())
+        self.client.get(LIST_URL, {'available_from': today})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(LIST_URL, {'available_from': today})
+        self.assertNotEqual(self.car_queries(queries), [])
+
+
+class CarPhotoVariantTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.use_temporary_media()
+        photo = BytesIO()
+        Image.new('RGB', (2000, 1500), 'red').save(photo, 'JPEG')
+        self.car = create_car('LAG-001', photo=SimpleUploadedFile('corolla.jpg', photo.getvalue(), content_type='image/jpeg'))
+        self.client = APIClient()
+
+    def process_photos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_car_photos', stdout=StringIO())
+
+    def test_variants_are_built_in_every_size_and_format(self):
+        self.process_photos()
+        variants_dir = os.path.join(self.media_root, 'car_photos', 'variants', str(self.car.pk))
+        self.assertEqual(len(os.listdir(variants_dir)), len(VARIANT_SIZES) * len(VARIANT_FORMATS))
+
+        body = self.client.get(f'{LIST_URL}{self.car.pk}/').json()
+        self.assertEqual(set(body['photo_variants']), set(VARIANT_SIZES))
+        self.assertIn('160w', body['photo_srcset']['webp'])
+        self.assertIn('1280w', body['photo_srcset']['jpeg'])
+
+    def test_processed_photo_changes_the_etag(self):
+        first = self.client.get(f'{LIST_URL}{self.car.pk}/')
+        self.assertEqual(first.json()['photo_variants'], {})
+        self.process_photos()
+
+        response = self.client.get(f'{LIST_URL}{self.car.pk}/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['photo_variants'], {})
+
+    def test_processed_photos_are_not_processed_again(self):
+        self.process_photos()
+        self.car.refresh_from_db()
+        self.assertEqual(pending_photo_cars().count(), 0)
+        self.assertFalse(process_car_photo(self.car))
+
+
+class FleetImportTests(TemporaryMediaMixin, TestCase):
+    HEADER = 'name,model,year,colour,car_type,price_per_day,pickup_location,status,rules,seating_capacity,luggage_capacity,wheel_drive,fuel_type,transmission,photo,plate_number\n'
+
+    def setUp(self):
+        cache.clear()
+        self.use_temporary_media()
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def csv_row(self, plate_number, car_type='suv', photo='photos/car.jpg', name='Prado'):
+        return f'{name},TX,2021,black,{car_type},150.5,Lagos,available,None,7,3,4-wheel,diesel,automatic,{photo},{plate_number}\n'
+
+    def archive(self, *names):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name in names:
+                archive.writestr(name, b'photo')
+        return SimpleUploadedFile('photos.zip', buffer.getvalue())
+
+    def upload(self, rows, archive=None, filename='fleet.csv'):
+        data = {'file': SimpleUploadedFile(filename, (self.HEADER + ''.join(rows)).encode())}
+        if archive is not None:
+            data['archive'] = archive
+        return self.client.post('/api/v1/car/import/', data, format='multipart')
+
+    def test_valid_rows_are_imported_and_invalid_ones_reported(self):
+        create_car('EXISTING')
+        rows = [self.csv_row(f'IMP-{i}', name=f'Prado{i}') for i in range(5)] + [
+            self.csv_row('BAD-TYPE', car_type='spaceship'),
+            self.csv_row('IMP-1'),
+            self.csv_row('EXISTING'),
+            self.csv_row('NO-PHOTO', photo='photos/missing.jpg'),
+        ]
+        response = self.upload(rows, archive=self.archive('photos/car.jpg'))
+        self.assertEqual(response.status_code, 200, response.content)
+
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (5, 4))
+        self.assertEqual(sorted(error['row'] for error in body['errors']), [6, 7, 8, 9])
+        self.assertEqual(Car.objects.filter(plate_number__startswith='IMP-').count(), 5)
+        # the archive photo is stored once for all the rows using it
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'car_photos'))), 1)
+
+    def test_imported_cars_are_searchable(self):
+        self.upload([self.csv_row('IMP-1')], archive=self.archive('photos/car.jpg'))
+        self.assertEqual(len(result_ids(self.client.get(LIST_URL, {'search': 'prado'}))), 1)
+
+    def test_bad_uploads_are_rejected(self):
+        response = self.client.post('/api/v1/car/import/', {'file': SimpleUploadedFile('fleet.csv', b''), 'format': 'xml'}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        response = self.upload([self.csv_row('IMP-1')], archive=SimpleUploadedFile('photos.zip', b'not a zip'))
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(CustomUser.objects.create_user(username='user', email='user@example.com', password='password'))
+        self.assertEqual(self.upload([self.csv_row('IMP-1')]).status_code, 403)
+
+    def test_command_imports_ndjson(self):
+        os.makedirs(os.path.join(self.media_root, 'car_photos'))
+        open(os.path.join(self.media_root, 'car_photos', 'prado.jpg'), 'wb').close()
+        row = {
+            'name': 'Prado', 'model': 'TX', 'year': '2021', 'colour': 'black', 'car_type': 'suv', 'price_per_day': 150.5,
+            'pickup_location': 'Lagos', 'status': 'available', 'rules': 'None', 'seating_capacity': 7, 'luggage_capacity': 3,
+            'wheel_drive': '4-wheel', 'fuel_type': 'diesel', 'transmission': 'automatic', 'photo': 'car_photos/prado.jpg',
+            'plate_number': 'NDJ-1',
+        }
+        path = os.path.join(self.media_root, 'fleet.ndjson')
+        with open(path, 'w') as fleet:
+            fleet.write(json.dumps(row) + '\n{not json\n')
+
+        call_command('import_fleet', path, stdout=StringIO())
+        self.assertTrue(Car.objects.filter(plate_number='NDJ-1').exists())
+
+    def test_failed_batch_removes_the_photos_it_stored(self):
+        row = {
+            'name': 'Prado', 'model': 'TX', 'year': '2021', 'colour': 'black', 'car_type': 'suv', 'price_per_day': 150.5,
+            'pickup_location': 'Lagos', 'status': 'available', 'rules': 'None', 'seating_capacity': 7, 'luggage_capacity': 3,
+            'wheel_drive': '4-wheel', 'fuel_type': 'diesel', 'transmission': 'automatic', 'photo': 'photos/car.jpg',
+            'plate_number': 'IMP-1',
+        }
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('photos/car.jpg', b'photo')
+        importer = FleetImporter(archive=zipfile.ZipFile(buffer))
+        with mock.patch('car.importers.CarSearchTerm.objects.bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                importer.run([(1, row, None)])
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'car_photos')), [])
+        self.assertFalse(Car.objects.filter(plate_number='IMP-1').exists())
+
+
+class CarQuoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        today = date.today()
+        # the next Saturday, so the quoted range covers Saturday, Sunday and Monday
+        self.saturday = today + timedelta(days=(5 - today.weekday()) % 7 or 7)
+        self.car = create_car('LAG-001', price_per_day=100.0)
+        self.other = create_car('LAG-002', price_per_day=50.0)
+        CarRate.objects.create(name='Weekends', days='weekends', multiplier='1.5')
+        CarRate.objects.create(car=self.other, name='Season', start_date=self.saturday, end_date=self.saturday, multiplier='2')
+        self.client = APIClient()
+
+    def quote(self, cars, start_date, end_date):
+        body = {'cars': [str(car.pk) for car in cars], 'ranges': [{'start_date': str(start_date), 'end_date': str(end_date)}]}
+        return self.client.post(QUOTES_URL, body, format='json')
+
+    def total_prices(self, response):
+        return [result['quotes'][0]['total_price'] for result in response.json()['results']]
+
+    def car_queries(self, queries):
+        tables = [connection.ops.quote_name(model._meta.db_table) for model in (Car, CarRate)]
+        return [query for query in queries if any(table in query['sql'] for table in tables)]
+
+    def test_rates_apply_per_day(self):
+        response = self.quote([self.car, self.other], self.saturday, self.saturday + timedelta(days=2))
+        self.assertEqual(response.status_code, 200)
+        # the multipliers of every rate covering a day are combined
+        self.assertEqual(self.total_prices(response), [150 + 150 + 100, 150 + 75 + 50])
+
+    def test_unknown_cars_are_left_out(self):
+        response = self.client.post(QUOTES_URL, {
+            'cars': [str(self.car.pk), '00000000-0000-0000-0000-000000000000'],
+            'ranges': [{'start_date': str(self.saturday), 'end_date': str(self.saturday)}],
+        }, format='json')
+        self.assertEqual([result['car'] for result in response.json()['results']], [str(self.car.pk)])
+
+    def test_repeated_quotes_are_served_from_the_cache(self):
+        self.quote([self.car, self.other], self.saturday, self.saturday + timedelta(days=2))
+        with CaptureQueriesContext(connection) as queries:
+            self.quote([self.car, self.other], self.saturday, self.saturday + timedelta(days=2))
+        self.assertEqual(self.car_queries(queries), [])
+
+    def test_price_and_rate_changes_are_quoted_once_committed(self):
+        monday = self.saturday + timedelta(days=2)
+        self.assertEqual(self.total_prices(self.quote([self.car], monday, monday)), [100])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.price_per_day = 10.0
+            self.car.save()
+        self.assertEqual(self.total_prices(self.quote([self.car], monday, monday)), [10])
+        with self.captureOnCommitCallbacks(execute=True):
+            CarRate.objects.create(name='All days', multiplier='2')
+        self.assertEqual(self.total_prices(self.quote([self.car], monday, monday)), [20])
+
+    def test_ranges_longer_than_a_year_are_rejected(self):
+        response = self.quote([self.car], self.saturday, self.saturday + timedelta(days=400))
+        self.assertEqual(response.status_code, 400)
+
+    def test_rates_are_validated(self):
+        admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.client.post(RATES_URL, {'name': 'Free', 'multiplier': '0'}, format='json').status_code, 400)
+        response = self.client.post(RATES_URL, {
+            'name': 'Backwards', 'multiplier': '2', 'start_date': str(self.saturday), 'end_date': str(self.saturday - timedelta(days=1)),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rates_are_managed_by_admins_only(self):
+        user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.post(RATES_URL, {'name': 'All days', 'multiplier': '2'}, format='json').status_code, 403)
+
+    def test_bookings_cost_what_was_quoted(self):
+        start_date, end_date = self.saturday - timedelta(days=2), self.saturday + timedelta(days=4)
+        quoted = self.total_prices(self.quote([self.car], start_date, end_date))[0]
+        user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/v1/reservation/new/', {
+            'car': str(self.car.pk), 'pickup_location': 'Lagos', 'dropoff_location': 'Abuja',
+            'start_date': str(start_date), 'end_date': str(end_date),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_price'], quoted)
+        self.assertEqual(quoted, 5 * 100 + 2 * 150)
+
+
+class CarSparseFieldTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cars = [create_car(f'LAG-{i:03}', name=f'Corolla {i}') for i in range(2)]
+        self.client = APIClient()
+
+    def test_only_the_requested_fields_are_returned(self):
+        response = self.client.get(LIST_URL, {'fields': 'id,name,price_per_day,photo_srcset', 'ordering': 'name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'name', 'price_per_day', 'photo_srcset'])
+
+    def test_only_the_needed_columns_are_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(LIST_URL, {'fields': 'id,name,photo_srcset'})
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn(connection.ops.quote_name('rules'), sql)
+        # photo_srcset is built from the variants
+        self.assertIn(connection.ops.quote_name('photo_variants_source'), sql)
+
+    def test_omitted_fields_are_left_out(self):
+        full = self.client.get(LIST_URL).json()['results'][0]
+        sparse = self.client.get(LIST_URL, {'omit': 'rules,pickup_location'}).json()['results'][0]
+        self.assertEqual(set(full) - set(sparse), {'rules', 'pickup_location'})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(LIST_URL, {'fields': 'name,engine'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sparse_responses_have_their_own_etag(self):
+        url = f'{LIST_URL}{self.cars[0].pk}/'
+        full, sparse = self.client.get(url), self.client.get(url, {'fields': 'name'})
+        self.assertEqual(sparse.json(), {'name': 'Corolla 0'})
+        self.assertNotEqual(full['ETag'], sparse['ETag'])
+        self.assertNotEqual(sparse['ETag'], self.client.get(f'{LIST_URL}{self.cars[1].pk}/', {'fields': 'name'})['ETag'])
+
+    async def test_async_list_takes_sparse_fields(self):
+        response = await AsyncClient().get(ASYNC_LIST_URL, {'fields': 'name'})
+        self.assertEqual([list(car) for car in response.json()['results']], [['name'], ['name']])
+
+
+class AsyncCarViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = AsyncClient()
+
+    async def test_list_matches_the_sync_list(self):
+        for i in range(3):
+            await sync_to_async(create_car)(f'LAG-{i:03}')
+        response = await self.client.get(ASYNC_LIST_URL, {'ordering': 'plate_number'})
+        self.assertEqual(response.status_code, 200)
+        sync_response = await sync_to_async(APIClient().get)(LIST_URL, {'ordering': 'plate_number'})
+        self.assertEqual(response.json()['results'], sync_response.json()['results'])
+
+    async def test_list_answers_conditional_requests(self):
+        await sync_to_async(create_car)('LAG-001')
+        response = await self.client.get(ASYNC_LIST_URL)
+        response = await self.client.get(ASYNC_LIST_URL, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_list_filters_and_searches(self):
+        toyota = await sync_to_async(create_car)('LAG-001', name='Toyota')
+        await sync_to_async(create_car)('LAG-002', name='Honda')
+        self.assertEqual(result_ids(await self.client.get(ASYNC_LIST_URL, {'search': 'toy'})), [str(toyota.pk)])
+        self.assertEqual(result_ids(await self.client.get(ASYNC_LIST_URL, {'search': 'zzz'})), [])
+        response = await self.client.get(ASYNC_LIST_URL, {'available_from': 'tomorrow'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_detail_returns_the_car(self):
+        car = await sync_to_async(create_car)('LAG-001')
+        response = await self.client.get(f'{ASYNC_LIST_URL}{car.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['plate_number'], 'LAG-001')
+
+    async def test_detail_of_a_missing_car_is_404(self):
+        response = await self.client.get(f'{ASYNC_LIST_URL}missing/')
+        self.assertEqual(response.status_code, 404)
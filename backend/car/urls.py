@@ -1,9 +1,15 @@
 from django.urls import path
-from .views import CarCreateAPIView, CarListAPIView, CarRetrieveAPIView, CarUpdateAPIView, CarDestroyAPIView
+from .views import CarCreateAPIView, CarListAPIView, CarRetrieveAPIView, CarUpdateAPIView, CarDestroyAPIView, CarImportAPIView, AsyncCarListAPIView, AsyncCarRetrieveAPIView, CarRateListCreateAPIView, CarRateDetailAPIView, CarQuoteAPIView
 
 urlpatterns = [
     path('new/', CarCreateAPIView.as_view(), name='create_car'),
+    path('import/', CarImportAPIView.as_view(), name='import_cars'),
+    path('quotes/', CarQuoteAPIView.as_view(), name='quote_cars'),
+    path('rates/', CarRateListCreateAPIView.as_view(), name='list_create_car_rates'),
+    path('rates/<str:pk>/', CarRateDetailAPIView.as_view(), name='car_rate_detail'),
     path('', CarListAPIView.as_view(), name='list_cars'),
+    path('async/', AsyncCarListAPIView.as_view(), name='async_list_cars'),
+    path('async/<str:pk>/', AsyncCarRetrieveAPIView.as_view(), name='async_retrieve_car'),
     path('<str:pk>/update/', CarUpdateAPIView.as_view(), name='update_car'),
     path('<str:pk>/', CarRetrieveAPIView.as_view(), name='retrieve_car'),
     path('<str:pk>/delete/', CarDestroyAPIView.as_view(), name='delete_car'),
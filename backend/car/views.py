@@ -1,8 +1,21 @@
-from rest_framework import generics
+import zipfile
+from datetime import date
+from rest_framework import generics, status
 from rest_framework import filters
+from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
-from .serializers import CarSerializer
-from .models import Car
+from utils.pagination import KeysetPagination
+from utils.async_views import AsyncListAPIView, AsyncRetrieveAPIView
+from utils.sparse_fields import SparseFieldsFilter
+from utils.query_params import unsupported_choice_response
+from .serializers import CarSerializer, CarRateSerializer, QuoteRequestSerializer
+from .filters import AvailabilityFilter, CarSearchFilter
+from .cache import CatalogCacheMixin, AsyncCatalogCacheMixin
+from .importers import FleetImporter, IMPORT_FORMATS, guess_format, iter_rows
+from .pricing import quote_cars
+from .models import Car, CarRate
 
 '''
 CRUD operation for Car
@@ -13,19 +26,31 @@ class CarCreateAPIView(generics.CreateAPIView):
     serializer_class = CarSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-class CarListAPIView(generics.ListAPIView):
+class CarListAPIView(CatalogCacheMixin, generics.ListAPIView):
     queryset = Car.objects.all()
     serializer_class = CarSerializer
     permission_classes = [AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['name', 'model', 'year', 'colour', 'pickup_location', 'car_type', 'status', 'seating_capacity', 'luggage_capacity', 'fuel_type', 'transmission']
+    pagination_class = KeysetPagination
+    filter_backends = [AvailabilityFilter, CarSearchFilter, filters.OrderingFilter, SparseFieldsFilter]
     ordering_fields = ['name', 'status', 'year', 'created_at']
+    # the keyset pagination cursor is built from created_at
+    sparse_required_fields = ['created_at']
 
 # Returns a particular user
-class CarRetrieveAPIView(generics.RetrieveAPIView):
+class CarRetrieveAPIView(CatalogCacheMixin, generics.RetrieveAPIView):
     queryset = Car.objects.all()
     serializer_class = CarSerializer
     permission_classes = [AllowAny]
+    filter_backends = [SparseFieldsFilter]
+
+'''
+Async versions of the car list and detail for ASGI deployments
+'''
+class AsyncCarListAPIView(AsyncCatalogCacheMixin, AsyncListAPIView):
+    view_class = CarListAPIView
+
+class AsyncCarRetrieveAPIView(AsyncCatalogCacheMixin, AsyncRetrieveAPIView):
+    view_class = CarRetrieveAPIView
 
 class CarUpdateAPIView(generics.UpdateAPIView):
     queryset = Car.objects.all()
@@ -36,3 +61,56 @@ class CarDestroyAPIView(generics.DestroyAPIView):
     queryset = Car.objects.all()
     serializer_class = CarSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
+
+'''
+Bulk fleet import from a CSV or NDJSON file, with the photos in a zip archive
+'''
+class CarImportAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'A fleet file is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.data.get('format') or guess_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            return unsupported_choice_response('Unsupported format', IMPORT_FORMATS)
+
+        archive = None
+        if 'archive' in request.FILES:
+            try:
+                archive = zipfile.ZipFile(request.FILES['archive'])
+            except zipfile.BadZipFile:
+                return Response({'detail': 'The photo archive must be a zip file.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = FleetImporter(archive=archive).run(iter_rows(upload, file_format))
+        return Response(report, status=status.HTTP_200_OK)
+
+'''
+Seasonal and weekend rates, managed by admins
+'''
+class CarRateListCreateAPIView(generics.ListCreateAPIView):
+    queryset = CarRate.objects.all().order_by('-created_at')
+    serializer_class = CarRateSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+class CarRateDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+    queryset = CarRate.objects.all()
+    serializer_class = CarRateSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+'''
+Quotes many cars over many date ranges in one call, priced with the car rates
+'''
+class CarQuoteAPIView(APIView):
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        today = date.today()
+        serializer = QuoteRequestSerializer(data=request.data, context={'today': today})
+        serializer.is_valid(raise_exception=True)
+        ranges = [(item['start_date'], item['end_date']) for item in serializer.validated_data['ranges']]
+        results = quote_cars(serializer.validated_data['cars'], ranges, today)
+        return Response({'results': results}, status=status.HTTP_200_OK)
@@ -0,0 +1,48 @@
+from operator import attrgetter
+from string import Formatter
+
+'''
+An email whose subject and message are str.format style templates
+("{car.year} {car.name}"). Both are parsed once, when the template is
+defined, into literal text and field lookups, so rendering is only
+attribute lookups and one join.
+'''
+class EmailTemplate:
+    def __init__(self, subject, message):
+        self.subject = compile_template(subject)
+        self.message = compile_template(message)
+
+    def render(self, **context):
+        return render_template(self.subject, context), render_template(self.message, context)
+
+def compile_template(text):
+    parts = []
+    for literal, field, format_spec, conversion in Formatter().parse(text):
+        if literal:
+            if parts and isinstance(parts[-1], str):
+                parts[-1] += literal
+            else:
+                parts.append(literal)
+        if field is not None:
+            name, _, path = field.partition('.')
+            parts.append((name, attrgetter(path) if path else None, conversion, format_spec))
+    return parts
+
+def render_template(parts, context):
+    rendered = []
+    for part in parts:
+        if isinstance(part, str):
+            rendered.append(part)
+            continue
+        name, getter, conversion, format_spec = part
+        value = context[name]
+        if getter is not None:
+            value = getter(value)
+        if conversion == 'r':
+            value = repr(value)
+        elif conversion == 's':
+            value = str(value)
+        elif conversion == 'a':
+            value = ascii(value)
+        rendered.append(format(value, format_spec))
+    return ''.join(rendered)
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from notification.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued outbox emails in batches over a single SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox until interrupted')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep when the outbox is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_pending(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} emails, {failed} failed')
+
+            if sent or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
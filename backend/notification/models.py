@@ -0,0 +1,45 @@
+from django.db import models
+from django.utils import timezone
+import uuid
+
+# Create your models here.
+
+'''
+Emails waiting to be delivered by the send_outbox_emails worker.
+Rows are written in the same transaction as the change that triggers them,
+so an email is never sent for a change that was rolled back nor lost when
+the SMTP server is down.
+'''
+class OutboxEmail(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        # claimed by a worker, next_attempt_at is when its lease runs out
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True, null=True)
+    recipients = models.JSONField()
+    status = models.CharField(choices=STATUS_CHOICES, max_length=20, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # a waiting email is replaced by the next one queued with the same key,
+    # see enqueue_coalesced_emails
+    coalesce_key = models.CharField(max_length=255, blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['coalesce_key', 'status']),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.recipients)} ({self.status})'
@@ -0,0 +1,177 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboxEmail
+
+DEFAULT_OUTBOX_SETTINGS = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': timedelta(minutes=1),
+    'COALESCE_WINDOW': timedelta(seconds=60),
+    'LEASE': timedelta(minutes=5),
+}
+
+def outbox_setting(name):
+    return getattr(settings, 'EMAIL_OUTBOX', {}).get(name, DEFAULT_OUTBOX_SETTINGS[name])
+
+'''
+Queues a single email, takes the same arguments as django's send_mail
+'''
+def enqueue_email(subject, message, from_email, recipient_list):
+    return OutboxEmail.objects.create(
+        subject=subject,
+        message=message,
+        from_email=from_email,
+        recipients=list(recipient_list),
+    )
+
+'''
+Queues many emails with one insert, takes the same datatuple as send_mass_mail
+'''
+def enqueue_emails(datatuple):
+    emails = [
+        OutboxEmail(subject=subject, message=message, from_email=from_email, recipients=list(recipient_list))
+        for subject, message, from_email, recipient_list in datatuple
+    ]
+    return OutboxEmail.objects.bulk_create(emails)
+
+'''
+Queues emails that may be superseded, the datatuple items also carry a
+coalesce key (send_mass_mail's tuple followed by the key). Each email waits
+COALESCE_WINDOW before it is sent, an email queued meanwhile with the same key
+replaces its subject, message and recipients instead of being queued as well,
+so only the last state goes out. Waiting emails to the same recipients that
+are delivered together are merged into one digest by deliver_pending.
+'''
+def enqueue_coalesced_emails(datatuple):
+    datatuple = list(datatuple)
+    send_at = timezone.now() + outbox_setting('COALESCE_WINDOW')
+
+    with transaction.atomic():
+        # only emails that are not due yet can be replaced, the worker may be
+        # sending the due ones. Those a worker is claiming are skipped rather
+        # than waited for, the new state is then queued as an email of its own.
+        waiting = {
+            email.coalesce_key: email
+            for email in OutboxEmail.objects.select_for_update(skip_locked=True).filter(
+                coalesce_key__in={item[4] for item in datatuple}, status='pending', attempts=0,
+                next_attempt_at__gt=timezone.now(),
+            )
+        }
+        created, replaced = {}, {}
+        for subject, message, from_email, recipient_list, coalesce_key in datatuple:
+            if coalesce_key in waiting:
+                email = replaced[coalesce_key] = waiting[coalesce_key]
+                email.updated_at = timezone.now()
+            else:
+                email = created.setdefault(coalesce_key, OutboxEmail(next_attempt_at=send_at, coalesce_key=coalesce_key))
+            email.subject = subject
+            email.message = message
+            email.from_email = from_email
+            email.recipients = list(recipient_list)
+
+        if replaced:
+            OutboxEmail.objects.bulk_update(replaced.values(), ['subject', 'message', 'from_email', 'recipients', 'updated_at'])
+        if created:
+            OutboxEmail.objects.bulk_create(created.values())
+    return len(created), len(replaced)
+
+'''
+Splits a batch into deliveries, coalescable emails to the same recipients
+are sent together as one digest, the others one by one
+'''
+def group_deliveries(batch):
+    deliveries = {}
+    for email in batch:
+        key = (email.from_email, tuple(email.recipients)) if email.coalesce_key else email.pk
+        deliveries.setdefault(key, []).append(email)
+    return list(deliveries.values())
+
+def build_message(emails, connection):
+    if len(emails) == 1:
+        subject, body = emails[0].subject, emails[0].message
+    else:
+        subject = f'You have {len(emails)} updates from {settings.SITE_NAME}'
+        body = f'\n\n{"-" * 40}\n\n'.join(f'{email.subject}\n\n{email.message}' for email in emails)
+    return EmailMessage(
+        subject=subject,
+        body=body,
+        from_email=emails[0].from_email or settings.DEFAULT_FROM_EMAIL,
+        to=emails[0].recipients,
+        connection=connection,
+    )
+
+'''
+Claims up to batch_size due emails in a short transaction. Claimed emails are
+marked sending and leased for LEASE, a worker that dies while sending leaves
+them to be claimed again once the lease runs out (its emails may then go out
+twice). Expired leases are found like due emails, through next_attempt_at.
+'''
+def claim_due_emails(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked lets several workers claim side by side
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=['pending', 'sending'], next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if batch:
+            OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                status='sending', next_attempt_at=now + outbox_setting('LEASE'), updated_at=now,
+            )
+    return batch
+
+'''
+Delivers one batch of due emails over a single connection, coalesced emails
+to the same recipients in one digest. No transaction is held while sending,
+each delivery is recorded as soon as it is sent.
+Failed emails are retried with an exponential backoff until MAX_ATTEMPTS,
+after which they are marked failed. Returns the (sent, failed) counts.
+'''
+def deliver_pending(batch_size=None, connection=None):
+    batch = claim_due_emails(batch_size or outbox_setting('BATCH_SIZE'))
+    if not batch:
+        return 0, 0
+
+    max_attempts = outbox_setting('MAX_ATTEMPTS')
+    backoff = outbox_setting('RETRY_BACKOFF')
+    connection = connection or get_connection(fail_silently=False)
+    sent = failed = 0
+    try:
+        connection.open()
+    except Exception as e:
+        batch_error = e
+    else:
+        batch_error = None
+
+    for emails in group_deliveries(batch):
+        error = batch_error
+        if error is None:
+            try:
+                build_message(emails, connection).send()
+            except Exception as e:
+                error = e
+
+        now = timezone.now()
+        if error is None:
+            sent += len(emails)
+            OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(status='sent', sent_at=now, updated_at=now)
+            continue
+
+        for email in emails:
+            failed += 1
+            email.attempts += 1
+            email.last_error = str(error)
+            if email.attempts >= max_attempts:
+                email.status = 'failed'
+            else:
+                email.status = 'pending'
+                email.next_attempt_at = now + backoff * (2 ** (email.attempts - 1))
+            email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'updated_at'])
+
+    if batch_error is None:
+        connection.close()
+    return sent, failed
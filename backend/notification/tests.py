@@ -0,0 +1,132 @@
+from datetime import timedelta
+from io import StringIO
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from car.tests import create_car
+from reservation.models import Reservation
+from reservation.services import override_soft_reservations
+from .models import OutboxEmail
+from .outbox import claim_due_emails, deliver_pending, enqueue_coalesced_emails, enqueue_email, enqueue_emails
+
+
+class BrokenConnection:
+    def open(self):
+        raise OSError('SMTP server is down')
+
+    def close(self):
+        pass
+
+
+class OutboxDeliveryTests(TestCase):
+    def test_due_emails_are_sent_and_marked_sent(self):
+        enqueue_emails([
+            ('First', 'Hello', 'team@example.com', ['first@example.com']),
+            ('Second', 'Hello', 'team@example.com', ['second@example.com']),
+        ])
+        self.assertEqual(deliver_pending(), (2, 0))
+
+        self.assertEqual(sorted(message.subject for message in mail.outbox), ['First', 'Second'])
+        self.assertEqual(set(OutboxEmail.objects.values_list('status', flat=True)), {'sent'})
+        self.assertFalse(OutboxEmail.objects.filter(sent_at__isnull=True).exists())
+        # nothing is left to send
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    def test_emails_are_not_sent_before_they_are_due(self):
+        email = enqueue_email('Later', 'Hello', None, ['user@example.com'])
+        OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(deliver_pending(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(EMAIL_OUTBOX={'MAX_ATTEMPTS': 2, 'RETRY_BACKOFF': timedelta(minutes=1)})
+    def test_failed_emails_are_retried_with_backoff_then_given_up(self):
+        email = enqueue_email('Hello', 'Hello', None, ['user@example.com'])
+        self.assertEqual(deliver_pending(connection=BrokenConnection()), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertIn('SMTP server is down', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(connection=BrokenConnection()), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 2))
+
+    def test_claimed_emails_are_leased_to_one_worker(self):
+        enqueue_email('Hello', 'Hello', None, ['user@example.com'])
+        self.assertEqual(len(claim_due_emails(10)), 1)
+        self.assertEqual(OutboxEmail.objects.get().status, 'sending')
+
+        # another worker finds nothing while the lease runs
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        # the first worker died, its emails are claimed again once the lease is over
+        OutboxEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual(OutboxEmail.objects.get().status, 'sent')
+
+    def test_worker_command_drains_the_outbox(self):
+        enqueue_emails([('Hello', 'Hello', None, [f'user{i}@example.com']) for i in range(3)])
+        call_command('send_outbox_emails', batch_size=2, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+
+    @override_settings(EMAIL_OUTBOX={'COALESCE_WINDOW': timedelta(0)})
+    def test_reservation_emails_wait_in_the_outbox(self):
+        today = timezone.localdate()
+        car = create_car('LAG-001')
+        Reservation.objects.create(
+            car=car, guest_email='guest@example.com', reservation_type='soft', pickup_location='Lagos',
+            dropoff_location='Abuja', start_date=today, end_date=today + timedelta(days=2),
+        )
+        override_soft_reservations(car, today, today + timedelta(days=1))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['guest@example.com'])
+        self.assertIn('overridden', mail.outbox[0].subject)
+
+
+class CoalescedEmailTests(TestCase):
+    def test_emails_waiting_with_the_same_key_are_replaced(self):
+        self.assertEqual(enqueue_coalesced_emails([('First', 'Hello', None, ['user@example.com'], 'reservation:1')]), (1, 0))
+        self.assertEqual(enqueue_coalesced_emails([('Second', 'Hello', None, ['user@example.com'], 'reservation:1')]), (0, 1))
+        self.assertEqual(list(OutboxEmail.objects.values_list('subject', flat=True)), ['Second'])
+
+    def test_emails_that_are_due_are_not_replaced(self):
+        enqueue_coalesced_emails([('First', 'Hello', None, ['user@example.com'], 'reservation:1')])
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        # the worker may already be sending it
+        self.assertEqual(enqueue_coalesced_emails([('Second', 'Hello', None, ['user@example.com'], 'reservation:1')]), (1, 0))
+        self.assertEqual(sorted(OutboxEmail.objects.values_list('subject', flat=True)), ['First', 'Second'])
+
+    @override_settings(EMAIL_OUTBOX={'COALESCE_WINDOW': timedelta(0)})
+    def test_emails_to_the_same_recipients_are_sent_as_one_digest(self):
+        enqueue_coalesced_emails([
+            (f'Update {i}', f'Message {i}', None, ['user@example.com'], f'reservation:{i}') for i in range(3)
+        ] + [('Other', 'Message', None, ['other@example.com'], 'reservation:3')])
+        self.assertEqual(deliver_pending(), (4, 0))
+
+        self.assertEqual(sorted(message.to for message in mail.outbox), [['other@example.com'], ['user@example.com']])
+        digest = next(message for message in mail.outbox if message.to == ['user@example.com'])
+        self.assertIn('3 updates', digest.subject)
+        self.assertEqual([digest.body.count(f'Message {i}') for i in range(3)], [1, 1, 1])
+        self.assertEqual(set(OutboxEmail.objects.values_list('status', flat=True)), {'sent'})
+
+    @override_settings(EMAIL_OUTBOX={'COALESCE_WINDOW': timedelta(0)})
+    def test_overridden_guest_reservations_are_sent_as_one_digest(self):
+        today = timezone.localdate()
+        cars = [create_car(f'LAG-{i:03}') for i in range(3)]
+        for car in cars:
+            Reservation.objects.create(
+                car=car, guest_email='guest@example.com', reservation_type='soft', pickup_location='Lagos',
+                dropoff_location='Abuja', start_date=today, end_date=today + timedelta(days=3),
+            )
+        for car in cars:
+            override_soft_reservations(car, today, today + timedelta(days=1))
+
+        self.assertEqual(deliver_pending(), (3, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].body.count('overridden by a registered user'), 3)
@@ -0,0 +1,104 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from .models import Reservation, BookedInterval, BLOCKING_STATUSES
+from .utilization import add_booked_interval, remove_booked_interval, retype_booked_interval
+
+'''
+The price the reservation was booked at, or its days at the car's price for
+reservations made before booked prices were kept
+'''
+def booked_total(reservation, car):
+    if reservation.booked_price is not None:
+        return reservation.booked_price
+    return ((reservation.end_date - reservation.start_date).days + 1) * car.price_per_day
+
+'''
+Keeps the booked-interval index of a single reservation, and the utilization
+rollups built from it, up to date
+'''
+def sync_booked_interval(reservation):
+    with transaction.atomic():
+        old = BookedInterval.objects.select_for_update().select_related('car').filter(reservation_id=reservation.pk).first()
+        if reservation.status not in BLOCKING_STATUSES:
+            if old is not None:
+                old.delete()
+                remove_booked_interval(old, old.car.car_type)
+            return
+
+        car = reservation.car
+        booked_price = booked_total(reservation, car)
+        if old is not None:
+            if (old.car_id, old.start_date, old.end_date, old.booked_price) == (car.pk, reservation.start_date, reservation.end_date, booked_price):
+                if old.reservation_type != reservation.reservation_type:
+                    old_type = old.reservation_type
+                    old.reservation_type = reservation.reservation_type
+                    old.save(update_fields=['reservation_type'])
+                    retype_booked_interval(old, old.car.car_type, old_type)
+                return
+            remove_booked_interval(old, old.car.car_type)
+
+        interval = BookedInterval(
+            reservation_id=reservation.pk,
+            car_id=car.pk,
+            reservation_type=reservation.reservation_type,
+            start_date=reservation.start_date,
+            end_date=reservation.end_date,
+            booked_price=booked_price,
+        )
+        interval.save(force_update=old is not None)
+        add_booked_interval(interval, car.car_type)
+
+'''
+Drops the intervals of reservations that were moved out of a blocking status
+with a queryset update (which does not fire save signals)
+'''
+def release_booked_intervals(reservation_ids):
+    with transaction.atomic():
+        intervals = list(BookedInterval.objects.select_for_update().select_related('car').filter(reservation_id__in=list(reservation_ids)))
+        BookedInterval.objects.filter(pk__in=[interval.pk for interval in intervals]).delete()
+        for interval in intervals:
+            remove_booked_interval(interval, interval.car.car_type)
+
+'''
+Rebuilds the whole index from the Reservation table, the utilization rollups
+have to be rebuilt after it
+'''
+def rebuild_booked_intervals(batch_size=1000):
+    BookedInterval.objects.all().delete()
+    reservations = Reservation.objects.with_pricing().filter(status__in=BLOCKING_STATUSES).values_list(
+        'pk', 'car_id', 'reservation_type', 'start_date', 'end_date', 'total_price'
+    )
+    batch = []
+    created = 0
+    for pk, car_id, reservation_type, start_date, end_date, booked_price in reservations.iterator(chunk_size=batch_size):
+        batch.append(BookedInterval(
+            reservation_id=pk,
+            car_id=car_id,
+            reservation_type=reservation_type,
+            start_date=start_date,
+            end_date=end_date,
+            booked_price=booked_price,
+        ))
+        if len(batch) >= batch_size:
+            BookedInterval.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        BookedInterval.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+'''
+Filters a Car queryset down to the cars that are free for the whole date range
+(both dates inclusive). Soft reservations are ignored when the person booking
+can override them.
+'''
+def available_cars(queryset, available_from, available_to, include_soft=True):
+    booked = BookedInterval.objects.filter(
+        car=OuterRef('pk'),
+        start_date__lte=available_to,
+        end_date__gte=available_from,
+    )
+    if not include_soft:
+        booked = booked.exclude(reservation_type='soft')
+    return queryset.exclude(status='unavailable').filter(~Exists(booked))
@@ -0,0 +1,92 @@
+import csv
+import json
+from datetime import date
+from django.db.models import Q
+from .models import Reservation
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+# output column -> queryset field
+EXPORT_COLUMNS = {
+    'id': 'id',
+    'user': 'user_id',
+    'user_email': 'user__email',
+    'guest_email': 'guest_email',
+    'car': 'car_id',
+    'car_name': 'car__name',
+    'car_model': 'car__model',
+    'car_plate_number': 'car__plate_number',
+    'reservation_type': 'reservation_type',
+    'status': 'status',
+    'pickup_location': 'pickup_location',
+    'dropoff_location': 'dropoff_location',
+    'start_date': 'start_date',
+    'end_date': 'end_date',
+    'duration': 'duration',
+    'price_per_day': 'price_per_day',
+    'total_price': 'total_price',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+'''
+Reservations overlapping [date_from, date_to] in one of the given statuses
+'''
+def export_queryset(date_from=None, date_to=None, statuses=None):
+    queryset = Reservation.objects.with_pricing()
+    if date_from:
+        queryset = queryset.filter(end_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(start_date__lte=date_to)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset.values(*EXPORT_COLUMNS.values())
+
+'''
+Walks a values() queryset in (created_at, id) order, chunk_size rows per query.
+MySQL drivers buffer the whole result of a query, even with .iterator(), so
+keyset chunks on the (created_at, id) index are what keeps memory flat.
+'''
+def iter_in_chunks(queryset, chunk_size=2000):
+    queryset = queryset.order_by('created_at', 'id')
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(
+                Q(created_at__gt=last['created_at']) |
+                Q(created_at=last['created_at'], id__gt=last['id'])
+            )
+        rows = list(chunk[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1]
+
+def export_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+def export_rows(rows):
+    for row in rows:
+        yield {column: export_value(row[field]) for column, field in EXPORT_COLUMNS.items()}
+
+'''
+File-like object that hands back what csv.writer writes to it
+'''
+class Echo:
+    def write(self, value):
+        return value
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS.keys())
+    for row in export_rows(rows):
+        yield writer.writerow(row.values())
+
+def stream_ndjson(rows):
+    for row in export_rows(rows):
+        yield json.dumps(row) + '\n'
@@ -0,0 +1,33 @@
+from rest_framework import filters
+from utils.query_params import parse_number_param
+
+'''
+Filters a with_pricing() reservation queryset on ?min_total_price= and ?max_total_price=
+'''
+class TotalPriceFilter(filters.BaseFilterBackend):
+    min_param = 'min_total_price'
+    max_param = 'max_total_price'
+
+    def filter_queryset(self, request, queryset, view):
+        min_price = parse_number_param(request, self.min_param)
+        max_price = parse_number_param(request, self.max_param)
+        if min_price is not None:
+            queryset = queryset.filter(total_price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(total_price__lte=max_price)
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': param,
+                'required': False,
+                'in': 'query',
+                'description': description,
+                'schema': {'type': 'number'},
+            }
+            for param, description in (
+                (self.min_param, 'Only return reservations costing at least this much'),
+                (self.max_param, 'Only return reservations costing at most this much'),
+            )
+        ]
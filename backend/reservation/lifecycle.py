@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Reservation
+from .services import set_status_in_bulk
+
+'''
+Date driven status changes, applied by `python manage.py advance_reservations`:
+confirmed reservations become active on their start date, active ones are
+completed the day after their end date, and pending or modified ones that
+were never confirmed become no-shows RESERVATION_NO_SHOW_GRACE after their start date.
+Each is (new status, statuses it moves from, due filter) and they run in
+this order, so a confirmed reservation that was missed for a while is
+activated and completed in the same tick.
+'''
+def lifecycle_transitions(today):
+    return [
+        ('active', ['confirmed'], {'start_date__lte': today}),
+        ('completed', ['active'], {'end_date__lt': today}),
+        ('no-show', ['pending', 'modified'], {'start_date__lte': today - settings.RESERVATION_NO_SHOW_GRACE}),
+    ]
+
+'''
+Moves every due reservation to new_status the same way override_soft_reservations
+does: the due rows are found on the (status, date) indexes and locked, then
+set_status_in_bulk flips them with one UPDATE and announces them with one
+bulk_status_changed, so their notifications are queued as one batch.
+'''
+def advance_reservations(new_status, from_statuses, due):
+    with transaction.atomic():
+        due_ids = list(
+            Reservation.objects.select_for_update()
+            .filter(status__in=from_statuses, **due)
+            .values_list('pk', flat=True)
+        )
+        if due_ids:
+            set_status_in_bulk(due_ids, new_status)
+    return due_ids
+
+'''
+Runs one scheduler tick, returns the number of reservations moved to each status
+'''
+def run_lifecycle_tick(today=None):
+    today = today or timezone.localdate()
+    return {
+        new_status: len(advance_reservations(new_status, from_statuses, due))
+        for new_status, from_statuses, due in lifecycle_transitions(today)
+    }
@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from reservation.lifecycle import run_lifecycle_tick
+
+
+class Command(BaseCommand):
+    help = 'Moves due reservations to active, completed or no-show with one bulk update per status'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running a tick every --interval seconds until interrupted')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between two ticks')
+
+    def handle(self, *args, **options):
+        while True:
+            moved = run_lifecycle_tick()
+            if any(moved.values()):
+                self.stdout.write(', '.join(f'{count} {status}' for status, count in moved.items()))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Lower, Trim
+from reservation.models import Reservation
+
+
+class Command(BaseCommand):
+    help = 'Fills guest_email_normalized for reservations saved before the column existed'
+
+    def handle(self, *args, **options):
+        updated = Reservation.objects.filter(
+            guest_email__isnull=False,
+            guest_email_normalized__isnull=True,
+        ).update(guest_email_normalized=Lower(Trim('guest_email')))
+        self.stdout.write(self.style.SUCCESS(f'Normalized {updated} guest emails'))
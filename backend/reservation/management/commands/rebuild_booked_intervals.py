@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reservation.availability import rebuild_booked_intervals
+from reservation.utilization import rebuild_utilization
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-car booked-interval index used by the availability search, and the utilization rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = rebuild_booked_intervals(batch_size=options['batch_size'])
+            rebuild_utilization(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {created} booked intervals'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reservation.utilization import rebuild_utilization
+
+
+class Command(BaseCommand):
+    help = 'Backfills the daily per-car and per-car-type utilization rollups from the booked intervals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            car_days, type_days = rebuild_utilization(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Built {car_days} car days and {type_days} car type days'))
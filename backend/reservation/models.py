@@ -1,11 +1,72 @@
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from car.models import Car
 from django.utils import timezone
 import uuid
 
 # Create your models here.
 
+def normalize_email(email):
+    return email.strip().lower() if email else None
+
+'''
+Number of days between two date expressions (end - start)
+'''
+class DaysBetween(models.Func):
+    arity = 2
+    output_field = models.IntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='(%(expressions)s)', arg_joiner=' - ', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='DATEDIFF', arg_joiner=', ', **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+
+'''
+with_pricing() joins the car and computes duration, price_per_day and total_price
+in SQL, so they can be filtered and ordered on and serializing needs no extra query.
+total_price is the price the booking was made at (with the car rates) when known.
+'''
+class ReservationQuerySet(models.QuerySet):
+    def with_pricing(self):
+        return self.select_related('car').annotate(
+            duration=DaysBetween('end_date', 'start_date') + 1,
+            price_per_day=models.F('car__price_per_day'),
+        ).annotate(
+            total_price=Coalesce(
+                models.F('booked_price'),
+                models.ExpressionWrapper(
+                    models.F('duration') * models.F('car__price_per_day'),
+                    output_field=models.FloatField()
+                ),
+                output_field=models.FloatField()
+            )
+        )
+
+'''
+Sent after a reservation saved with Reservation.save() changed status,
+with the old_status and new_status as arguments
+'''
+status_changed = Signal()
+
+'''
+Sent after a queryset update moved many reservations to new_status,
+with the reservation_ids and new_status as arguments
+'''
+bulk_status_changed = Signal()
+
 class Reservation(models.Model):
     RESERVATION_CHOICES = (
         ('firm', 'Firm'),
@@ -17,15 +78,31 @@ class Reservation(models.Model):
         ('confirmed', 'Confirmed'),
         ('modified', 'Modified'),
         ('active', 'Active'),
+        ('completed', 'Completed'),
         ('no-show', 'No-Show'),
         ('dispute', 'Dispute'),
         ('cancelled', 'Cancelled'),
         ('overridden', 'Overridden'),
     )
 
+    # status -> statuses it can move to, moving to the same status is always allowed
+    ALLOWED_TRANSITIONS = {
+        'pending': {'confirmed', 'modified', 'active', 'no-show', 'dispute', 'cancelled', 'overridden'},
+        'confirmed': {'modified', 'active', 'no-show', 'dispute', 'cancelled', 'overridden'},
+        'modified': {'confirmed', 'active', 'no-show', 'dispute', 'cancelled', 'overridden'},
+        'active': {'completed', 'dispute'},
+        'completed': {'dispute'},
+        'no-show': {'dispute', 'cancelled'},
+        'dispute': {'confirmed', 'active', 'completed', 'cancelled'},
+        'cancelled': set(),
+        'overridden': set(),
+    }
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, unique=False, blank=True, null=True)
     guest_email = models.EmailField(blank=True, null=True, unique=False)
+    # lowercased guest_email, indexed so guest reservations can be found on signup
+    guest_email_normalized = models.EmailField(blank=True, null=True, editable=False)
     car = models.ForeignKey(Car, on_delete=models.CASCADE, unique=False)
     reservation_type = models.CharField(choices=RESERVATION_CHOICES, max_length=20)
     status = models.CharField(choices=STATUS_CHOICES, max_length=20, default='pending')
@@ -33,33 +110,168 @@ class Reservation(models.Model):
     dropoff_location = models.TextField()
     start_date = models.DateField()
     end_date = models.DateField()
+    # total price with the car rates (see car/pricing.py price_booking), set when
+    # the reservation is booked or modified, None falls back to the flat price
+    booked_price = models.FloatField(blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ReservationQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=['id']),
             models.Index(fields=['user']),
             models.Index(fields=['car']),
             models.Index(fields=['reservation_type']),
-            models.Index(fields=['status']),
+            # the lifecycle scheduler finds due reservations by status and date
+            models.Index(fields=['status', 'start_date']),
+            models.Index(fields=['status', 'end_date']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['user', 'created_at', 'id']),
+            models.Index(fields=['car', 'start_date', 'end_date', 'status']),
+            models.Index(fields=['guest_email_normalized', 'reservation_type']),
         ]
 
+    # the pricing properties return the values annotated by with_pricing() when present
+
     @property
     def duration(self):
+        if '_duration' in self.__dict__:
+            return self._duration
         if self.start_date and self.end_date:
             delta = self.end_date - self.start_date
             return delta.days + 1 # +1 to include both start and end date
 
+    @duration.setter
+    def duration(self, value):
+        self._duration = value
+
     @property
     def price_per_day(self):
+        if '_price_per_day' in self.__dict__:
+            return self._price_per_day
         if self.car:
             return self.car.price_per_day
-        
+
+    @price_per_day.setter
+    def price_per_day(self, value):
+        self._price_per_day = value
+
     @property
     def total_price(self):
+        if '_total_price' in self.__dict__:
+            return self._total_price
+        if self.booked_price is not None:
+            return self.booked_price
         return self.duration * self.car.price_per_day
+
+    @total_price.setter
+    def total_price(self, value):
+        self._total_price = value
     
     def is_active(self):
-        today = timezone.now().today()
+        today = timezone.localdate()
         return self.start_date <= today <= self.end_date
+
+    # status as loaded from the database, None for new reservations
+    _loaded_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in instance.__dict__:
+            instance._loaded_status = instance.status
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        if 'status' in self.__dict__:
+            self._loaded_status = self.status
+
+    @classmethod
+    def statuses_leading_to(cls, status):
+        return [old for old, allowed in cls.ALLOWED_TRANSITIONS.items() if status in allowed]
+
+    def can_transition_to(self, status):
+        if self._loaded_status is None or status == self._loaded_status:
+            return True
+        return status in self.ALLOWED_TRANSITIONS.get(self._loaded_status, set())
+
+    def save(self, *args, **kwargs):
+        self.guest_email_normalized = normalize_email(self.guest_email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'guest_email' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'guest_email_normalized'}
+
+        old_status = self._loaded_status
+        # ReservationSerializer turns it into a 400 API error
+        if not self.can_transition_to(self.status):
+            raise ValidationError({'status error': f'A {old_status} reservation cannot be {self.status}'})
+
+        super().save(*args, **kwargs)
+
+        self._loaded_status = self.status
+        if old_status is not None and old_status != self.status:
+            status_changed.send(sender=self.__class__, instance=self, old_status=old_status, new_status=self.status)
+
+
+'''
+Statuses that keep a car booked for the reservation's dates. Completed
+reservations keep their interval so the utilization history stays intact.
+'''
+BLOCKING_STATUSES = ('pending', 'confirmed', 'modified', 'active', 'completed', 'dispute')
+
+
+'''
+Per-car index of booked date ranges, kept in sync with Reservation by signals.
+Only reservations in a blocking status have a row, so availability lookups
+never have to look at cancelled or overridden history.
+'''
+class BookedInterval(models.Model):
+    reservation = models.OneToOneField(Reservation, on_delete=models.CASCADE, primary_key=True, related_name='booked_interval')
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='booked_intervals')
+    reservation_type = models.CharField(choices=Reservation.RESERVATION_CHOICES, max_length=20)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    # the reservation's total price when the interval was booked, so the utilization
+    # rollups take back exactly what they were given when the interval is released
+    booked_price = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['car', 'start_date', 'end_date']),
+        ]
+
+
+'''
+Daily utilization rollups, maintained incrementally from the booked intervals
+(see reservation/utilization.py) so dashboards never scan reservations.
+CarUtilization has one row per car and booked day, with the number of
+blocking reservations covering the day and the revenue of the firm one.
+CarTypeUtilization has one row per car type and day, with the number of
+booked cars of that type and their firm revenue.
+'''
+class CarUtilization(models.Model):
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='utilization')
+    day = models.DateField()
+    reservations = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('car', 'day')
+        indexes = [
+            models.Index(fields=['day', 'car']),
+        ]
+
+class CarTypeUtilization(models.Model):
+    car_type = models.CharField(choices=Car.CARTYPE_CHOICES, max_length=20)
+    day = models.DateField()
+    booked_cars = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('car_type', 'day')
+        indexes = [
+            models.Index(fields=['day', 'car_type']),
+        ]
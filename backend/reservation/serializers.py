@@ -1,16 +1,18 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
+from utils.sparse_fields import SparseFieldsSerializerMixin
 from .models import Reservation
 from datetime import date
 
 
-class ReservationSerializer(serializers.ModelSerializer):
+class ReservationSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     duration = serializers.IntegerField(read_only=True)
     price_per_day = serializers.DecimalField(max_digits=10, decimal_places=2, read_only= True)
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only= True)
 
     class Meta:
         model = Reservation
-        fields = '__all__'
+        exclude = ['guest_email_normalized', 'booked_price']
         read_only_fields = [
             'duration',
             'price_per_day',
@@ -19,29 +21,42 @@ class ReservationSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['duration'] = instance.duration
-        data['price_per_day'] = float(instance.price_per_day)
-        data['total_price'] = float(instance.total_price)
+        # fields left out with ?fields= or ?omit= are not added back
+        if 'duration' in data:
+            data['duration'] = instance.duration
+        if 'price_per_day' in data:
+            data['price_per_day'] = float(instance.price_per_day)
+        if 'total_price' in data:
+            data['total_price'] = float(instance.total_price)
         return data
 
     def get_fields(self):
         fields = super().get_fields()
         request = self.context.get('request', None)
         if request:
+            # sparse reads (?fields=, ?omit=) may have left out any of these
             if not request.user.is_staff:
-                fields['reservation_type'].read_only = True
-                fields['status'].read_only = True
+                for name in ('reservation_type', 'status'):
+                    if name in fields:
+                        fields[name].read_only = True
 
             if request.user.is_authenticated:
                 # Hide guest_email for authenticated users
                 fields.pop('guest_email', None)
-                fields['user'].required = False  # Will be set automatically
+                if 'user' in fields:
+                    fields['user'].required = False  # Will be set automatically
             else:
                 # Hide user for guest users
                 fields.pop('user', None)
-                fields['guest_email'].required = True
+                if 'guest_email' in fields:
+                    fields['guest_email'].required = True
         return fields
 
+    def validate_status(self, value):
+        if self.instance is not None and not self.instance.can_transition_to(value):
+            raise serializers.ValidationError(f'A {self.instance.status} reservation cannot be {value}')
+        return value
+
     def validate(self, data):
         request = self.context.get('request', None)
         if request:
@@ -68,4 +83,44 @@ class ReservationSerializer(serializers.ModelSerializer):
         request = self.context.get('request', None)
         if request and request.user.is_authenticated:
             validated_data['user'] = request.user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+    # a forbidden status transition refused by Reservation.save answers 400
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(serializers.as_serializer_error(e))
+
+'''
+Selects the reservations of a bulk action by their attributes
+'''
+class BulkReservationFilterSerializer(serializers.Serializer):
+    status = serializers.ListField(child=serializers.ChoiceField(choices=Reservation.STATUS_CHOICES), required=False)
+    car = serializers.UUIDField(required=False)
+    start_date_from = serializers.DateField(required=False)
+    start_date_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError('Give at least one filter.')
+        if 'start_date_from' in data and 'start_date_to' in data and data['start_date_from'] > data['start_date_to']:
+            raise serializers.ValidationError({
+                'date error': 'start_date_to cannot be before start_date_from'
+            })
+        return data
+
+'''
+A bulk action targets either the reservations listed in `ids` or the ones
+matching `filter`
+'''
+class BulkReservationActionSerializer(serializers.Serializer):
+    MAX_RESERVATIONS = 1000
+
+    ids = serializers.ListField(child=serializers.UUIDField(), min_length=1, max_length=MAX_RESERVATIONS, required=False)
+    filter = BulkReservationFilterSerializer(required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError('Give either ids or filter.')
+        return data
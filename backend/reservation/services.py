@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from car.models import Car
+from .models import Reservation, BookedInterval, BLOCKING_STATUSES, bulk_status_changed, normalize_email
+from .availability import release_booked_intervals
+from .utilization import retype_booked_interval
+
+'''
+Moves reservations to new_status with a single UPDATE. Queryset updates skip
+save(), so the booked intervals are released here when the status no longer
+blocks the car, and one bulk_status_changed announces the whole batch.
+The rows must be locked by the surrounding transaction.
+'''
+def set_status_in_bulk(reservation_ids, new_status):
+    Reservation.objects.filter(pk__in=reservation_ids).update(status=new_status, updated_at=timezone.now())
+    if new_status not in BLOCKING_STATUSES:
+        release_booked_intervals(reservation_ids)
+    bulk_status_changed.send(sender=Reservation, reservation_ids=reservation_ids, new_status=new_status)
+
+'''
+Overrides the soft (guest) reservations that overlap a firm booking in one
+set-based step. MySQL has no UPDATE ... RETURNING, so the affected rows are
+locked and their ids read in the same transaction, then flipped with a single
+UPDATE. The guests' emails are queued in the outbox with one insert.
+'''
+def override_soft_reservations(car, start_date, end_date, exclude=None):
+    with transaction.atomic():
+        overlaps = Reservation.objects.select_for_update().filter(
+            car=car,
+            reservation_type='soft',
+            status__in=Reservation.statuses_leading_to('overridden'),
+            start_date__lt=end_date,
+            end_date__gt=start_date
+        )
+        if exclude is not None:
+            overlaps = overlaps.exclude(pk=exclude)
+
+        overridden_ids = list(overlaps.values_list('pk', flat=True))
+        if overridden_ids:
+            set_status_in_bulk(overridden_ids, 'overridden')
+    return overridden_ids
+
+'''
+Serializes bookings per car: the car row is locked (SELECT ... FOR UPDATE) until
+the surrounding transaction ends, so two requests for the same car run one after
+the other while bookings of different cars never wait on each other. A firm
+reservation holding any of the dates rejects the booking.
+Must be called inside transaction.atomic().
+'''
+def lock_car_for_booking(car, start_date, end_date, exclude=None):
+    car_id = getattr(car, 'pk', car)
+    list(Car.objects.select_for_update().filter(pk=car_id).values_list('pk', flat=True))
+
+    conflicts = Reservation.objects.filter(
+        car_id=car_id,
+        start_date__lte=end_date,
+        end_date__gte=start_date,
+        status__in=BLOCKING_STATUSES,
+        reservation_type='firm',
+    )
+    if exclude is not None:
+        conflicts = conflicts.exclude(pk=exclude)
+    if conflicts.exists():
+        raise ValidationError({
+            'date error': 'The car is already booked for some of these dates'
+        })
+
+'''
+Hands all soft reservations made with a guest email over to the user who signed
+up with it, with one indexed lookup and one UPDATE. Returns the converted
+reservations with their pricing, for the digest email.
+'''
+def convert_guest_reservations_to_firm(user):
+    email = normalize_email(user.email)
+    if not email:
+        return []
+
+    with transaction.atomic():
+        converted_ids = list(
+            Reservation.objects.select_for_update().filter(
+                guest_email_normalized=email,
+                user__isnull=True,
+                reservation_type='soft',
+            ).values_list('pk', flat=True)
+        )
+        if not converted_ids:
+            return []
+
+        Reservation.objects.filter(pk__in=converted_ids).update(user=user, reservation_type='firm', updated_at=timezone.now())
+        intervals = list(BookedInterval.objects.select_for_update().select_related('car').filter(reservation_id__in=converted_ids))
+        BookedInterval.objects.filter(reservation_id__in=converted_ids).update(reservation_type='firm')
+        # the converted bookings now count as revenue
+        for interval in intervals:
+            interval.reservation_type = 'firm'
+            retype_booked_interval(interval, interval.car.car_type, 'soft')
+        return list(Reservation.objects.with_pricing().filter(pk__in=converted_ids).order_by('start_date'))
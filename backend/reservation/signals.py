@@ -1,234 +1,308 @@
-from django.db.models.signals import pre_save, post_save
+import logging
+from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
 from django.conf import settings
-from .models import Reservation
+from django.db import transaction
+from .models import Reservation, status_changed, bulk_status_changed
+from .availability import sync_booked_interval, release_booked_intervals
+from .services import convert_guest_reservations_to_firm
 from account.models import CustomUser
+from notification.emails import EmailTemplate, compile_template, render_template
+from notification.outbox import enqueue_email, enqueue_coalesced_emails
 
-NOTIFY_STATUSES = {"pending", "confirmed", "modified", "cancelled", "overridden"}
+audit_logger = logging.getLogger('reservation.audit')
+
+NOTIFY_STATUSES = {"pending", "confirmed", "modified", "active", "completed", "no-show", "cancelled", "overridden"}
+
+'''
+Details of the reservation shared by all status emails
+'''
+RESERVATION_FIELDS = (
+    "Reservation ID: {reservation.id} \n"
+    "Start Date: {reservation.start_date}\n"
+    "End Date: {reservation.end_date}\n"
+    "Pickup Location: {reservation.pickup_location}\n"
+    "Dropoff Location: {reservation.dropoff_location}\n"
+    "Duration: {reservation.duration}\n"
+    "Price per day: {reservation.price_per_day}\n"
+    "Total Price: {reservation.total_price}\n"
+    "Status: {reservation.status}\n \n"
+)
+RESERVATION_DETAILS = "Reservation Details:\n" + RESERVATION_FIELDS
 
 '''
-Email status for registered Users
+Email status for registered Users, rendered with car, reservation and user
 '''
 REGISTERED_STATUS_EMAILS = {
-    'confirmed': {
-        'subject': lambda car: f'Your reservation for {car.year} {car.name} {car.model} has been confirmed',
-        'message': lambda car, reservation, user: (
-            f"Congratulations! {user.first_name} \n\n"
-            f"Your reservation for {car.year} {car.name} {car.model} has been confirmed.\n \n"
-            f"Your reservation for {car.year} {car.name} {car.model} has been confirmed.\n \n"
-            f"Reservation Details:\n"
-            f"Reservation ID: {reservation.id} \n"
-            f"Start Date: {reservation.start_date}\n"
-            f"End Date: {reservation.end_date}\n"
-            f"Pickup Location: {reservation.pickup_location}\n"
-            f"Dropoff Location: {reservation.dropoff_location}\n"
-            f"Duration: {reservation.duration}\n"
-            f"Price per day: {reservation.price_per_day}\n"
-            f"Total Price: {reservation.total_price}\n"
-            f"Status: {reservation.status}\n \n"
+    'confirmed': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been confirmed',
+        message=(
+            "Congratulations! {user.first_name} \n\n"
+            "Your reservation for {car.year} {car.name} {car.model} has been confirmed.\n \n"
+            "Your reservation for {car.year} {car.name} {car.model} has been confirmed.\n \n"
+            + RESERVATION_DETAILS +
             "Thank you for choosing Drive Easy!"
-        )
-    },
-    'modified': {
-        'subject': lambda car: f'Your reservation for {car.year} {car.name} {car.model} has been modified',
-        'message': lambda car, reservation, user: (
-            f"Dear {user.first_name}, \n\n"
-            f"Your reservation for {car.year} {car.name} {car.model} has been modified.\n \n"
-            f"Reservation Details:\n"
-            f"Reservation ID: {reservation.id} \n"
-            f"Start Date: {reservation.start_date}\n"
-            f"End Date: {reservation.end_date}\n"
-            f"Pickup Location: {reservation.pickup_location}\n"
-            f"Dropoff Location: {reservation.dropoff_location}\n"
-            f"Duration: {reservation.duration}\n"
-            f"Price per day: {reservation.price_per_day}\n"
-            f"Total Price: {reservation.total_price}\n"
-            f"Status: {reservation.status}\n \n"
-            f"You'll get an email once your reservation is confirmed"
+        ),
+    ),
+    'modified': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been modified',
+        message=(
+            "Dear {user.first_name}, \n\n"
+            "Your reservation for {car.year} {car.name} {car.model} has been modified.\n \n"
+            + RESERVATION_DETAILS +
+            "You'll get an email once your reservation is confirmed"
             "Thank you for choosing Drive Easy!"
-        )
-    },
-    'cancelled': {
-        'subject': lambda car: f'Your reservation for {car.year} {car.name} {car.model} has been cancelled',
-        'message': lambda car, reservation, user: (
-            f"Dear {user.first_name}, \n\n"
-            f"Your reservation for {car.year} {car.name} {car.model} has been cancelled.\n \n"
-            f"Reservation Details:\n"
-            f"Reservation ID: {reservation.id} \n"
-            f"Start Date: {reservation.start_date}\n"
-            f"End Date: {reservation.end_date}\n"
-            f"Pickup Location: {reservation.pickup_location}\n"
-            f"Dropoff Location: {reservation.dropoff_location}\n"
-            f"Duration: {reservation.duration}\n"
-            f"Price per day: {reservation.price_per_day}\n"
-            f"Total Price: {reservation.total_price}\n"
-            f"Status: {reservation.status}\n \n"
+        ),
+    ),
+    'cancelled': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been cancelled',
+        message=(
+            "Dear {user.first_name}, \n\n"
+            "Your reservation for {car.year} {car.name} {car.model} has been cancelled.\n \n"
+            + RESERVATION_DETAILS +
             "Visit our site now to make another reservation \n"
-            f"https://drive-a.netlify.app \n"
+            "https://drive-a.netlify.app \n"
+            "Thank you for choosing Drive Easy!"
+        ),
+    ),
+    'active': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has started',
+        message=(
+            "Dear {user.first_name}, \n\n"
+            "Your reservation for {car.year} {car.name} {car.model} has started, enjoy your trip.\n \n"
+            + RESERVATION_DETAILS +
+            "Thank you for choosing Drive Easy!"
+        ),
+    ),
+    'completed': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been completed',
+        message=(
+            "Dear {user.first_name}, \n\n"
+            "Your reservation for {car.year} {car.name} {car.model} has been completed.\n \n"
+            + RESERVATION_DETAILS +
+            "We hope you enjoyed your trip. Visit our site now to make another reservation \n"
+            "https://drive-a.netlify.app \n"
             "Thank you for choosing Drive Easy!"
-        )
-    }
+        ),
+    ),
+    'no-show': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been marked as a no-show',
+        message=(
+            "Dear {user.first_name}, \n\n"
+            "Your reservation for {car.year} {car.name} {car.model} was never confirmed and the car was not picked up, so it has been marked as a no-show.\n \n"
+            + RESERVATION_DETAILS +
+            "Visit our site now to make another reservation \n"
+            "https://drive-a.netlify.app \n"
+            "Thank you for choosing Drive Easy!"
+        ),
+    ),
 }
 
 '''
-Email status for guest Users
+Email status for guest Users, rendered with car and reservation
 '''
 GUEST_STATUS_EMAILS = {
-    'confirmed': {
-        'subject': lambda car: f'Your reservation for {car.year} {car.name} {car.model} has been confirmed',
-        'message': lambda car, reservation: (
-            f"Congratulations! Your reservation for {car.year} {car.name} {car.model} has been confirmed.\n \n"
-            f"Reservation Details:\n"
-            f"Reservation ID: {reservation.id} \n"
-            f"Start Date: {reservation.start_date}\n"
-            f"End Date: {reservation.end_date}\n"
-            f"Pickup Location: {reservation.pickup_location}\n"
-            f"Dropoff Location: {reservation.dropoff_location}\n"
-            f"Duration: {reservation.duration}\n"
-            f"Price per day: {reservation.price_per_day}\n"
-            f"Total Price: {reservation.total_price}\n"
-            f"Status: {reservation.status}\n \n"
-            f"You'll get an email once your reservation is confirmed \n\n"
-            f"Please note that this is a soft reservation and can be overriden by a registered user. Create an account now to secure your reservation"
+    'confirmed': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been confirmed',
+        message=(
+            "Congratulations! Your reservation for {car.year} {car.name} {car.model} has been confirmed.\n \n"
+            + RESERVATION_DETAILS +
+            "You'll get an email once your reservation is confirmed \n\n"
+            "Please note that this is a soft reservation and can be overriden by a registered user. Create an account now to secure your reservation"
             "Thank you for choosing Drive Easy!"
-        )
-    },
-    'modified': {
-        'subject': lambda car: f'Your reservation for {car.year} {car.name} {car.model} has been modified',
-        'message': lambda car, reservation: (
-            f"Your reservation for {car.year} {car.name} {car.model} has been modified.\n \n"
-            f"Reservation Details:\n"
-            f"Reservation ID: {reservation.id} \n"
-            f"Start Date: {reservation.start_date}\n"
-            f"End Date: {reservation.end_date}\n"
-            f"Pickup Location: {reservation.pickup_location}\n"
-            f"Dropoff Location: {reservation.dropoff_location}\n"
-            f"Duration: {reservation.duration}\n"
-            f"Price per day: {reservation.price_per_day}\n"
-            f"Total Price: {reservation.total_price}\n"
-            f"Status: {reservation.status}\n \n"
-            f"You'll get an email once your reservation is confirmed \n\n"
-            f"Please note that this is a soft reservation and can be overriden by a registered user. Create an account now to secure your reservation. \n"
-            f"https://drive-a.netlify.app/login/ \n"
+        ),
+    ),
+    'modified': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been modified',
+        message=(
+            "Your reservation for {car.year} {car.name} {car.model} has been modified.\n \n"
+            + RESERVATION_DETAILS +
+            "You'll get an email once your reservation is confirmed \n\n"
+            "Please note that this is a soft reservation and can be overriden by a registered user. Create an account now to secure your reservation. \n"
+            "https://drive-a.netlify.app/login/ \n"
             "Thank you for choosing Drive Easy!"
-        )
-    },
-    'cancelled': {
-        'subject': lambda car: f'Your reservation for {car.year} {car.name} {car.model} has been cancelled',
-        'message': lambda car, reservation: (
-            f"Your soft reservation for {car.year} {car.name} {car.model} has been cancelled.\n \n"
-            f"Reservation Details:\n"
-            f"Reservation ID: {reservation.id} \n"
-            f"Start Date: {reservation.start_date}\n"
-            f"End Date: {reservation.end_date}\n"
-            f"Pickup Location: {reservation.pickup_location}\n"
-            f"Dropoff Location: {reservation.dropoff_location}\n"
-            f"Duration: {reservation.duration}\n"
-            f"Price per day: {reservation.price_per_day}\n"
-            f"Total Price: {reservation.total_price}\n"
-            f"Status: {reservation.status}\n \n"
+        ),
+    ),
+    'cancelled': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been cancelled',
+        message=(
+            "Your soft reservation for {car.year} {car.name} {car.model} has been cancelled.\n \n"
+            + RESERVATION_DETAILS +
             "Visit our site now to make another reservation \n"
-            f"https://drive-a.netlify.app/ \n"
+            "https://drive-a.netlify.app/ \n"
             "Thank you for choosing Drive Easy!"
-        )
-    },
-    'overridden': {
-        'subject': lambda car: f'Your reservation for {car.year} {car.name} {car.model} has been overridden',
-        'message': lambda car, reservation: (
-            f"Your reservation for {car.year} {car.name} {car.model} has been overridden by a registered user. The car is no longer reserved for you.\n \n"
-            f"Reservation Details:\n"
-            f"Reservation ID: {reservation.id} \n"
-            f"Start Date: {reservation.start_date}\n"
-            f"End Date: {reservation.end_date}\n"
-            f"Pickup Location: {reservation.pickup_location}\n"
-            f"Dropoff Location: {reservation.dropoff_location}\n"
-            f"Duration: {reservation.duration}\n"
-            f"Price per day: {reservation.price_per_day}\n"
-            f"Total Price: {reservation.total_price}\n"
-            f"Status: {reservation.status}\n \n"
+        ),
+    ),
+    'overridden': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been overridden',
+        message=(
+            "Your reservation for {car.year} {car.name} {car.model} has been overridden by a registered user. The car is no longer reserved for you.\n \n"
+            + RESERVATION_DETAILS +
             "Create an account now to ensure your reservations are secure when next you reserve a car \n"
-            f"https://drive-a.netlify.app \n"
+            "https://drive-a.netlify.app \n"
+            "Thank you for choosing Drive Easy!"
+        ),
+    ),
+    'active': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has started',
+        message=(
+            "Your reservation for {car.year} {car.name} {car.model} has started, enjoy your trip.\n \n"
+            + RESERVATION_DETAILS +
+            "Thank you for choosing Drive Easy!"
+        ),
+    ),
+    'completed': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been completed',
+        message=(
+            "Your reservation for {car.year} {car.name} {car.model} has been completed.\n \n"
+            + RESERVATION_DETAILS +
+            "Create an account now to secure your reservation when next you reserve a car \n"
+            "https://drive-a.netlify.app/login/ \n"
+            "Thank you for choosing Drive Easy!"
+        ),
+    ),
+    'no-show': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} has been marked as a no-show',
+        message=(
+            "Your reservation for {car.year} {car.name} {car.model} was never confirmed and the car was not picked up, so it has been marked as a no-show.\n \n"
+            + RESERVATION_DETAILS +
+            "Visit our site now to make another reservation \n"
+            "https://drive-a.netlify.app/ \n"
             "Thank you for choosing Drive Easy!"
-        )
-    },
+        ),
+    ),
 }
 
 
-@receiver(pre_save, sender=Reservation)
-def send_reservation_status_email(sender, instance, **kwargs):
-    if not instance.pk:
+'''
+Builds the (subject, message, from_email, recipient_list) tuple of a status email,
+or None when there is nobody to notify or no email for the status
+'''
+def build_status_email(reservation):
+    recipient = reservation.user.email if reservation.user else reservation.guest_email
+    car = reservation.car
+    if not recipient or not car:
+        return None
+    if reservation.user and reservation.status in REGISTERED_STATUS_EMAILS:
+        subject, message = REGISTERED_STATUS_EMAILS[reservation.status].render(car=car, reservation=reservation, user=reservation.user)
+    elif reservation.status in GUEST_STATUS_EMAILS:
+        subject, message = GUEST_STATUS_EMAILS[reservation.status].render(car=car, reservation=reservation)
+    else:
+        return None
+    return (subject, message, settings.DEFAULT_FROM_EMAIL, [recipient])
+
+'''
+Queues the status emails of many reservations in one go. A reservation has at
+most one status email waiting in the outbox, a newer status replaces it, and
+the waiting emails of one recipient are sent as a single digest.
+'''
+def send_status_emails(reservations):
+    messages = []
+    for reservation in reservations:
+        email = build_status_email(reservation)
+        if email:
+            messages.append((*email, f'reservation-status:{reservation.pk}'))
+    if messages:
+        enqueue_coalesced_emails(messages)
+    return len(messages)
+
+'''
+Reservations changed with a queryset update do not fire pre_save, so their
+emails are queued in one batch, in the same transaction as the update
+'''
+def notify_status_change(reservation_ids):
+    reservation_ids = list(reservation_ids)
+    if not reservation_ids:
         return
-    try:
-        old = sender.objects.get(pk=instance.pk)
-    except sender.DoesNotExist:
+    reservations = Reservation.objects.filter(pk__in=reservation_ids).select_related('car', 'user')
+    send_status_emails(reservations)
+
+
+'''
+Status emails subscribe to the transition events sent by Reservation.save()
+and by the set-based updates, so no extra query is needed to find the old status
+'''
+@receiver(status_changed, sender=Reservation)
+def send_reservation_status_email(sender, instance, old_status, new_status, **kwargs):
+    if new_status in NOTIFY_STATUSES:
+        send_status_emails([instance])
+
+@receiver(bulk_status_changed, sender=Reservation)
+def send_bulk_status_emails(sender, reservation_ids, new_status, **kwargs):
+    if new_status in NOTIFY_STATUSES:
+        notify_status_change(reservation_ids)
+
+'''
+Audit trail of reservation status transitions
+'''
+@receiver(status_changed, sender=Reservation)
+def log_status_change(sender, instance, old_status, new_status, **kwargs):
+    audit_logger.info('Reservation %s moved from %s to %s', instance.pk, old_status, new_status)
+
+@receiver(bulk_status_changed, sender=Reservation)
+def log_bulk_status_change(sender, reservation_ids, new_status, **kwargs):
+    for reservation_id in reservation_ids:
+        audit_logger.info('Reservation %s moved to %s', reservation_id, new_status)
+
+'''
+Keeps the booked-interval index used by the car availability search in sync
+'''
+@receiver(post_save, sender=Reservation)
+def update_booked_interval(sender, instance, raw=False, **kwargs):
+    if raw:
         return
-    if old.status != instance.status and instance.status in NOTIFY_STATUSES:
-        recipient = instance.user.email if instance.user else instance.guest_email
-        car = instance.car
-        if recipient and car:
-            if instance.user and instance.status in REGISTERED_STATUS_EMAILS:
-                subject = REGISTERED_STATUS_EMAILS[instance.status]['subject'](car)
-                message = REGISTERED_STATUS_EMAILS[instance.status]['message'](car, instance, instance.user)
-            if instance.status in GUEST_STATUS_EMAILS:
-                subject = GUEST_STATUS_EMAILS[instance.status]['subject'](car)
-                message = GUEST_STATUS_EMAILS[instance.status]['message'](car, instance)
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[recipient],
-                fail_silently=True,
-            )
+    sync_booked_interval(instance)
+
+'''
+A deleted reservation's interval would go with it by cascade, it is released
+first so the utilization rollups give back its days
+'''
+@receiver(pre_delete, sender=Reservation)
+def release_deleted_booked_interval(sender, instance, **kwargs):
+    release_booked_intervals([instance.pk])
 
 '''
 Convert soft reservations to firm reservations when guest user creates account.
 '''
 @receiver(post_save, sender=CustomUser)
-def convert_guest_reservations(sender, instance, created, **kwargs):
-    if created:
-        soft_reservations = Reservation.objects.filter(
-            user__isnull = True,
-            guest_email__iexact = instance.email,
-            reservation_type = 'soft'
-        )
-
-        if soft_reservations:
-            for reservation in soft_reservations:
-                reservation.user = instance
-                reservation.reservation_type = 'firm'
-                reservation.save()
-
-                send_reservation_conversion_email(instance, reservation.car, reservation)
-
-'''
-Sends email notification about converted reservations 
-'''
-def send_reservation_conversion_email(user, car, reservation):
-    try:
-        subject = f"Your reservation for {car.year} {car.name} {car.model} is now a firm reservation"
-        message = (
-            f"Your soft reservation for {car.year} {car.name} {car.model} is now a firm reservation \n \n"
-            f"Reservation Details:\n"
-            f"Reservation ID: {reservation.id} \n"
-            f"Start Date: {reservation.start_date}\n"
-            f"End Date: {reservation.end_date}\n"
-            f"Pickup Location: {reservation.pickup_location}\n"
-            f"Dropoff Location: {reservation.dropoff_location}\n"
-            f"Duration: {reservation.duration}\n"
-            f"Price per day: {reservation.price_per_day}\n"
-            f"Total Price: {reservation.total_price}\n"
-            f"Status: {reservation.status}\n \n"
-            "Thank you for choosing Drive Easy!"
-        )
-
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=True
-        )
-
-    except Exception:
-        return
\ No newline at end of file
+def convert_guest_reservations(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        with transaction.atomic():
+            converted = convert_guest_reservations_to_firm(instance)
+            if converted:
+                send_reservation_conversion_digest(instance, converted)
+
+'''
+Email listing the reservations converted when a guest signs up, rendered with
+the car of the first reservation, the count and the details of all of them
+'''
+CONVERSION_MESSAGE = (
+    "Your soft reservations are now firm reservations \n \n"
+    "Reservation Details:\n"
+    "{details}"
+    "Thank you for choosing Drive Easy!"
+)
+CONVERSION_EMAILS = {
+    'one': EmailTemplate(
+        subject='Your reservation for {car.year} {car.name} {car.model} is now a firm reservation',
+        message=CONVERSION_MESSAGE,
+    ),
+    'many': EmailTemplate(
+        subject='Your {count} reservations are now firm reservations',
+        message=CONVERSION_MESSAGE,
+    ),
+}
+CONVERTED_RESERVATION_DETAILS = compile_template("{car.year} {car.name} {car.model}\n" + RESERVATION_FIELDS)
+
+'''
+Queues one email listing all the converted reservations of a user
+'''
+def send_reservation_conversion_digest(user, reservations):
+    details = "".join(
+        render_template(CONVERTED_RESERVATION_DETAILS, {'car': reservation.car, 'reservation': reservation})
+        for reservation in reservations
+    )
+    template = CONVERSION_EMAILS['one' if len(reservations) == 1 else 'many']
+    subject, message = template.render(car=reservations[0].car, count=len(reservations), details=details)
+
+    enqueue_email(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email])
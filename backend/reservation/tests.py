@@ -1,3 +1,665 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import uuid
+from asgiref.sync import sync_to_async
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from account.models import CustomUser
+from car.models import Car
+from notification.models import OutboxEmail
+from .models import Reservation, BookedInterval, CarTypeUtilization, CarUtilization, status_changed
+from .serializers import ReservationSerializer
+from .views import ReservationExportAPIView
+from .services import override_soft_reservations
+from .availability import rebuild_booked_intervals
+from .utilization import rebuild_utilization
+from .lifecycle import run_lifecycle_tick
 
-# Create your tests here.
+
+def create_car(plate_number, **fields):
+    data = {
+        'name': 'Corolla', 'model': 'LE', 'year': '2022', 'colour': 'white', 'car_type': 'sedan',
+        'price_per_day': 100.0, 'pickup_location': 'Lagos', 'status': 'available', 'rules': 'No smoking',
+        'seating_capacity': 5, 'luggage_capacity': 2, 'wheel_drive': '2-wheel', 'fuel_type': 'petrol',
+        'transmission': 'automatic', 'photo': 'car_photos/corolla.jpg', 'plate_number': plate_number,
+    }
+    data.update(fields)
+    return Car.objects.create(**data)
+
+def booking(car, start_date, end_date, **fields):
+    return dict({
+        'car': str(car.pk),
+        'pickup_location': 'Lagos',
+        'dropoff_location': 'Abuja',
+        'start_date': str(start_date),
+        'end_date': str(end_date),
+    }, **fields)
+
+
+class ReservationBookingTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.car = create_car('LAG-001')
+        self.first = CustomUser.objects.create_user(username='first', email='first@example.com', password='password')
+        self.second = CustomUser.objects.create_user(username='second', email='second@example.com', password='password')
+        self.client = APIClient()
+
+    def test_overlapping_firm_booking_is_rejected(self):
+        self.client.force_authenticate(self.first)
+        response = self.client.post('/api/v1/reservation/new/', booking(self.car, self.today, self.today + timedelta(days=2)), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        self.client.force_authenticate(self.second)
+        response = self.client.post('/api/v1/reservation/new/', booking(self.car, self.today + timedelta(days=2), self.today + timedelta(days=4)), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date error', response.json())
+        self.assertEqual(Reservation.objects.filter(car=self.car).count(), 1)
+
+    def test_booking_after_the_end_date_is_accepted(self):
+        self.client.force_authenticate(self.first)
+        self.client.post('/api/v1/reservation/new/', booking(self.car, self.today, self.today + timedelta(days=2)), format='json')
+
+        self.client.force_authenticate(self.second)
+        response = self.client.post('/api/v1/reservation/new/', booking(self.car, self.today + timedelta(days=3), self.today + timedelta(days=4)), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_guest_cannot_book_over_a_firm_booking(self):
+        self.client.force_authenticate(self.first)
+        self.client.post('/api/v1/reservation/new/', booking(self.car, self.today, self.today + timedelta(days=2)), format='json')
+
+        self.client.force_authenticate(None)
+        response = self.client.post('/api/v1/reservation/new/', booking(self.car, self.today + timedelta(days=1), self.today + timedelta(days=1), guest_email='guest@example.com'), format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_cannot_move_onto_another_firm_booking(self):
+        self.client.force_authenticate(self.second)
+        self.client.post('/api/v1/reservation/new/', booking(self.car, self.today + timedelta(days=3), self.today + timedelta(days=4)), format='json')
+        self.client.force_authenticate(self.first)
+        reservation_id = self.client.post('/api/v1/reservation/new/', booking(self.car, self.today, self.today + timedelta(days=1)), format='json').json()['id']
+
+        # the reservation does not conflict with itself
+        response = self.client.put(f'/api/v1/reservation/{reservation_id}/update/', booking(self.car, self.today, self.today + timedelta(days=2)), format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.put(f'/api/v1/reservation/{reservation_id}/update/', booking(self.car, self.today, self.today + timedelta(days=3)), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date error', response.json())
+
+
+
+class GuestOverrideTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.car = create_car('LAG-001')
+        self.user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.client = APIClient()
+
+    def soft_reservation(self, email, start_date, end_date):
+        return Reservation.objects.create(
+            car=self.car, guest_email=email, reservation_type='soft', pickup_location='Lagos',
+            dropoff_location='Abuja', start_date=start_date, end_date=end_date,
+        )
+
+    def test_firm_booking_overrides_every_overlapping_soft_reservation(self):
+        overlapping = [self.soft_reservation(f'guest{i}@example.com', self.today, self.today + timedelta(days=3)) for i in range(3)]
+        later = self.soft_reservation('later@example.com', self.today + timedelta(days=5), self.today + timedelta(days=6))
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/v1/reservation/new/', booking(self.car, self.today, self.today + timedelta(days=1)), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        statuses = dict(Reservation.objects.values_list('pk', 'status'))
+        self.assertEqual({statuses[reservation.pk] for reservation in overlapping}, {'overridden'})
+        self.assertEqual(statuses[later.pk], 'pending')
+        # the overridden reservations no longer hold the car
+        self.assertEqual(
+            set(BookedInterval.objects.values_list('reservation_id', flat=True)),
+            {later.pk, Reservation.objects.get(user=self.user).pk},
+        )
+
+    def test_overridden_reservations_are_updated_and_notified_in_one_statement_each(self):
+        for i in range(5):
+            self.soft_reservation(f'guest{i}@example.com', self.today, self.today + timedelta(days=3))
+        with CaptureQueriesContext(connection) as queries:
+            overridden = override_soft_reservations(self.car, self.today, self.today + timedelta(days=1))
+        self.assertEqual(len(overridden), 5)
+
+        statements = [query['sql'] for query in queries]
+        update = f'UPDATE {connection.ops.quote_name(Reservation._meta.db_table)}'
+        insert = f'INSERT INTO {connection.ops.quote_name(OutboxEmail._meta.db_table)}'
+        self.assertEqual(sum(sql.startswith(update) for sql in statements), 1)
+        self.assertEqual(sum(sql.startswith(insert) for sql in statements), 1)
+
+    def test_updated_firm_reservation_overrides_soft_reservations_on_its_new_dates(self):
+        reservation = Reservation.objects.create(
+            car=self.car, user=self.user, reservation_type='firm', pickup_location='Lagos', dropoff_location='Abuja',
+            start_date=self.today, end_date=self.today + timedelta(days=1),
+        )
+        guest = self.soft_reservation('guest@example.com', self.today + timedelta(days=4), self.today + timedelta(days=6))
+
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(
+            f'/api/v1/reservation/{reservation.pk}/update/',
+            booking(self.car, self.today + timedelta(days=3), self.today + timedelta(days=5)), format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        guest.refresh_from_db()
+        self.assertEqual(guest.status, 'overridden')
+
+
+class StatusTransitionTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        self.reservation = Reservation.objects.create(
+            car=create_car('LAG-001'), user=self.user, reservation_type='firm', pickup_location='Lagos',
+            dropoff_location='Abuja', start_date=self.today + timedelta(days=1), end_date=self.today + timedelta(days=3),
+        )
+        self.client = APIClient()
+        self.changes = []
+        status_changed.connect(self.record_change, sender=Reservation)
+        self.addCleanup(status_changed.disconnect, self.record_change, sender=Reservation)
+
+    def record_change(self, sender, instance, old_status, new_status, **kwargs):
+        self.changes.append((old_status, new_status))
+
+    def cancelled(self):
+        Reservation.objects.filter(pk=self.reservation.pk).update(status='cancelled')
+        return Reservation.objects.get(pk=self.reservation.pk)
+
+    def test_status_changes_are_announced_once(self):
+        self.client.force_authenticate(self.admin)
+        self.client.post(f'/api/v1/reservation/{self.reservation.pk}/confirm/')
+        self.client.post(f'/api/v1/reservation/{self.reservation.pk}/cancel/')
+        self.assertEqual(self.changes, [('pending', 'confirmed'), ('confirmed', 'cancelled')])
+
+    def test_saving_without_a_status_change_announces_nothing(self):
+        self.reservation.pickup_location = 'Ibadan'
+        self.reservation.save()
+        self.assertEqual(self.changes, [])
+
+    def test_transition_check_needs_no_query(self):
+        reservation = self.cancelled()
+        with self.assertNumQueries(0):
+            self.assertFalse(reservation.can_transition_to('confirmed'))
+
+    def test_forbidden_transition_is_refused_by_the_model(self):
+        reservation = self.cancelled()
+        reservation.status = 'confirmed'
+        with self.assertRaises(ValidationError):
+            reservation.save()
+
+    def test_forbidden_transition_is_a_400_through_the_api(self):
+        self.cancelled()
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(f'/api/v1/reservation/{self.reservation.pk}/confirm/')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.user)
+        data = booking(self.reservation.car, self.reservation.start_date, self.reservation.end_date, pickup_location='Ibadan')
+        response = self.client.put(f'/api/v1/reservation/{self.reservation.pk}/update/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status error', response.json())
+
+    def test_serializer_turns_a_refused_save_into_an_api_error(self):
+        serializer = ReservationSerializer(self.cancelled(), data={'pickup_location': 'Ibadan'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertRaises(serializers.ValidationError) as raised:
+            serializer.save(status='confirmed')
+        self.assertIn('status error', raised.exception.detail)
+
+
+class ReservationPricingTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        for i in range(10):
+            Reservation.objects.create(
+                car=create_car(f'LAG-{i:03}', price_per_day=10.0 + i), user=self.admin, reservation_type='firm',
+                pickup_location='Lagos', dropoff_location='Abuja', start_date=self.today, end_date=self.today + timedelta(days=i),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_list_prices_match_the_model_without_extra_queries(self):
+        # one COUNT and one page query, whatever the number of reservations
+        with self.assertNumQueries(2):
+            results = self.client.get('/api/v1/reservation/').json()['results']
+        self.assertEqual(len(results), 10)
+        for row in results:
+            reservation = Reservation.objects.get(pk=row['id'])
+            self.assertEqual(row['duration'], reservation.duration)
+            self.assertEqual(row['price_per_day'], reservation.price_per_day)
+            self.assertEqual(row['total_price'], reservation.total_price)
+
+    def test_list_can_be_ordered_and_filtered_by_total_price(self):
+        response = self.client.get('/api/v1/reservation/', {'ordering': '-total_price', 'min_total_price': 50})
+        prices = [row['total_price'] for row in response.json()['results']]
+        self.assertEqual(prices[0], 19.0 * 10)
+        self.assertEqual(prices, sorted(prices, reverse=True))
+        self.assertTrue(all(price >= 50 for price in prices))
+
+    def test_booked_price_wins_over_the_car_price(self):
+        reservation = Reservation.objects.order_by('end_date').last()
+        Reservation.objects.filter(pk=reservation.pk).update(booked_price=123.0)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/v1/reservation/{reservation.pk}/')
+        self.assertEqual(response.json()['total_price'], 123.0)
+
+
+class ReservationExportTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        car = create_car('LAG-001', price_per_day=5.0)
+        for i in range(25):
+            Reservation.objects.create(
+                car=car, user=self.admin if i % 2 else None, guest_email=None if i % 2 else 'guest@example.com',
+                reservation_type='firm', pickup_location='Ikeja, "Gate 2"', dropoff_location='Abuja',
+                start_date=self.today + timedelta(days=i), end_date=self.today + timedelta(days=i + 1),
+                status='cancelled' if i < 5 else 'pending',
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        response = self.client.get('/api/v1/reservation/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_streams_every_reservation_across_chunks(self):
+        with mock.patch.object(ReservationExportAPIView, 'chunk_size', 7):
+            rows = list(csv.DictReader(io.StringIO(self.export())))
+        self.assertEqual(len({row['id'] for row in rows}), 25)
+        self.assertEqual(rows[0]['total_price'], '10.0')
+        self.assertEqual(rows[0]['pickup_location'], 'Ikeja, "Gate 2"')
+
+    def test_ndjson_export_is_filtered(self):
+        lines = self.export(file_format='ndjson', status='cancelled', date_from=str(self.today + timedelta(days=2))).splitlines()
+        rows = [json.loads(line) for line in lines]
+        # the cancelled ones still running on or after date_from
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row['status'] for row in rows}, {'cancelled'})
+
+    def test_invalid_parameters_are_rejected(self):
+        response = self.client.get('/api/v1/reservation/export/', {'file_format': 'xml'})
+        self.assertEqual((response.status_code, response.json()), (400, {'detail': 'Unsupported format, use one of: csv, ndjson.'}))
+        self.assertEqual(self.client.get('/api/v1/reservation/export/', {'status': 'lost'}).status_code, 400)
+        response = self.client.get('/api/v1/reservation/export/', {'date_from': 'yesterday'})
+        self.assertEqual((response.status_code, response.json()), (400, {'date_from': 'Enter a valid date in the format YYYY-MM-DD.'}))
+        response = self.client.get('/api/v1/reservation/', {'min_total_price': 'cheap'})
+        self.assertEqual((response.status_code, response.json()), (400, {'min_total_price': 'Enter a valid number.'}))
+
+    def test_export_is_for_admins_only(self):
+        self.client.force_authenticate(CustomUser.objects.create_user(username='user', email='user@example.com', password='password'))
+        self.assertEqual(self.client.get('/api/v1/reservation/export/').status_code, 403)
+
+
+class GuestConversionTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        for i in range(4):
+            Reservation.objects.create(
+                car=create_car(f'LAG-{i:03}'), guest_email=' Guest@Example.com' if i < 3 else 'other@example.com',
+                reservation_type='soft', pickup_location='Lagos', dropoff_location='Abuja',
+                start_date=self.today, end_date=self.today + timedelta(days=2),
+            )
+
+    def test_signing_up_converts_the_guest_reservations_of_the_email(self):
+        user = CustomUser.objects.create_user(username='guest', email='guest@example.com', password='password')
+
+        self.assertEqual(Reservation.objects.filter(user=user, reservation_type='firm').count(), 3)
+        self.assertEqual(BookedInterval.objects.filter(reservation_type='firm').count(), 3)
+        self.assertEqual(Reservation.objects.get(guest_email='other@example.com').reservation_type, 'soft')
+
+    def test_converted_reservations_are_announced_in_one_email(self):
+        CustomUser.objects.create_user(username='guest', email='guest@example.com', password='password')
+        email = OutboxEmail.objects.get()
+        self.assertIn('3 reservations', email.subject)
+        self.assertEqual(email.recipients, ['guest@example.com'])
+
+    def test_command_backfills_normalized_emails(self):
+        Reservation.objects.update(guest_email_normalized=None)
+        call_command('normalize_guest_emails', stdout=io.StringIO())
+        self.assertEqual(Reservation.objects.filter(guest_email_normalized='guest@example.com').count(), 3)
+
+    def test_normalized_email_is_not_exposed(self):
+        user = CustomUser.objects.create_user(username='guest', email='guest@example.com', password='password')
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertNotIn('guest_email_normalized', client.get('/api/v1/reservation/').json()['results'][0])
+
+
+class UtilizationRollupTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.suv = create_car('LAG-001', car_type='suv', price_per_day=100.0)
+        self.sedan = create_car('LAG-002', car_type='sedan', price_per_day=50.0)
+        self.user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+
+    def reserve(self, car, start, end, **fields):
+        fields.setdefault('user', self.user)
+        fields.setdefault('reservation_type', 'firm')
+        with self.captureOnCommitCallbacks(execute=True):
+            return Reservation.objects.create(
+                car=car, pickup_location='Lagos', dropoff_location='Abuja',
+                start_date=self.today + timedelta(days=start), end_date=self.today + timedelta(days=end), **fields,
+            )
+
+    def snapshot(self):
+        return (
+            sorted(CarUtilization.objects.exclude(reservations=0).values_list('car_id', 'day', 'reservations', 'revenue')),
+            sorted(CarTypeUtilization.objects.exclude(booked_cars=0).values_list('car_type', 'day', 'booked_cars', 'revenue')),
+        )
+
+    def test_booked_price_is_split_over_the_days(self):
+        self.reserve(self.suv, 0, 2, booked_price=100.0)
+        revenue = dict(CarUtilization.objects.values_list('day', 'revenue'))
+        # the rounding leftover goes to the last day
+        self.assertEqual(revenue, {
+            self.today: Decimal('33.33'),
+            self.today + timedelta(days=1): Decimal('33.33'),
+            self.today + timedelta(days=2): Decimal('33.34'),
+        })
+        self.assertEqual(sum(CarTypeUtilization.objects.values_list('revenue', flat=True)), Decimal('100'))
+
+    def test_soft_reservations_bring_no_revenue_until_firm(self):
+        self.reserve(self.sedan, 5, 5, user=None, guest_email='guest@example.com', reservation_type='soft')
+        self.assertEqual(self.snapshot()[1], [('sedan', self.today + timedelta(days=5), 1, Decimal('0'))])
+        CustomUser.objects.create_user(username='guest', email='guest@example.com', password='password')
+        self.assertEqual(self.snapshot()[1], [('sedan', self.today + timedelta(days=5), 1, Decimal('50'))])
+
+    def test_cancelled_reservations_leave_the_rollups(self):
+        reservation = self.reserve(self.suv, 0, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.status = 'cancelled'
+            reservation.save()
+        self.assertEqual(self.snapshot(), ([], []))
+
+    def test_rollups_match_a_rebuild(self):
+        reservation = self.reserve(self.suv, 0, 2)
+        self.reserve(self.suv, 2, 3, user=None, guest_email='guest@example.com', reservation_type='soft')
+        self.reserve(self.sedan, 0, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.end_date = self.today + timedelta(days=1)
+            reservation.save()
+        override_soft_reservations(self.suv, self.today, self.today + timedelta(days=5))
+        before = self.snapshot()
+
+        call_command('rebuild_utilization', stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_rebuild_keeps_the_booked_price_after_a_price_change(self):
+        # bookings made through the API carry the price they were quoted
+        self.reserve(self.suv, 0, 2, booked_price=300.0)
+        before = self.snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.suv.price_per_day = 1000.0
+            self.suv.save()
+        rebuild_booked_intervals()
+        rebuild_utilization()
+        self.assertEqual(self.snapshot(), before)
+
+    def test_analytics_endpoint_reports_per_car_type(self):
+        self.reserve(self.sedan, 0, 0)
+        admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        client = APIClient()
+        client.force_authenticate(admin)
+        params = {'date_from': str(self.today), 'date_to': str(self.today + timedelta(days=9))}
+        response = client.get('/api/v1/reservation/analytics/utilization/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'car_type': 'sedan', 'cars': 1, 'booked_days': 1, 'revenue': 50.0, 'occupancy': 0.1},
+        ])
+        response = client.get('/api/v1/reservation/analytics/utilization/', dict(params, group_by='car'))
+        self.assertEqual([row['car'] for row in response.json()['results']], [str(self.sedan.pk)])
+        self.assertEqual(client.get('/api/v1/reservation/analytics/utilization/', {'group_by': 'colour'}).status_code, 400)
+
+    def test_analytics_are_for_admins_only(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/v1/reservation/analytics/utilization/').status_code, 403)
+
+
+class LifecycleTickTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.cars = 0
+
+    def reservation(self, status, start, end):
+        # every reservation on its own car, so none of them overlap
+        self.cars += 1
+        reservation = Reservation.objects.create(
+            car=create_car(f'LAG-{self.cars:03}'), user=self.user, reservation_type='firm', pickup_location='Lagos',
+            dropoff_location='Abuja', start_date=self.today + timedelta(days=start), end_date=self.today + timedelta(days=end),
+        )
+        Reservation.objects.filter(pk=reservation.pk).update(status=status)
+        return reservation
+
+    def statuses(self, *reservations):
+        statuses = dict(Reservation.objects.values_list('pk', 'status'))
+        return [statuses[reservation.pk] for reservation in reservations]
+
+    def test_confirmed_reservations_start_on_their_start_date(self):
+        starting, later = self.reservation('confirmed', 0, 2), self.reservation('confirmed', 1, 2)
+        self.assertEqual(run_lifecycle_tick(self.today), {'active': 1, 'completed': 0, 'no-show': 0})
+        self.assertEqual(self.statuses(starting, later), ['active', 'confirmed'])
+
+    def test_reservations_are_completed_after_their_end_date(self):
+        ended, ending = self.reservation('active', -5, -1), self.reservation('active', -5, 0)
+        # a confirmed one that was missed is activated and completed in the same tick
+        missed = self.reservation('confirmed', -10, -8)
+        self.assertEqual(run_lifecycle_tick(self.today), {'active': 1, 'completed': 2, 'no-show': 0})
+        self.assertEqual(self.statuses(ended, ending, missed), ['completed', 'active', 'completed'])
+        self.assertTrue(BookedInterval.objects.filter(pk=missed.pk).exists())
+
+    def test_unconfirmed_reservations_become_no_shows_after_the_grace(self):
+        pending, modified = self.reservation('pending', -1, 1), self.reservation('modified', -3, -2)
+        within_grace = self.reservation('pending', 0, 1)
+        self.assertEqual(run_lifecycle_tick(self.today), {'active': 0, 'completed': 0, 'no-show': 2})
+        self.assertEqual(self.statuses(pending, modified, within_grace), ['no-show', 'no-show', 'pending'])
+        # the car is free again
+        self.assertFalse(BookedInterval.objects.filter(pk=pending.pk).exists())
+
+    def test_moved_reservations_are_announced(self):
+        self.reservation('confirmed', 0, 2)
+        self.reservation('pending', -2, -1)
+        OutboxEmail.objects.all().delete()
+        run_lifecycle_tick(self.today)
+        subjects = sorted(OutboxEmail.objects.values_list('subject', flat=True))
+        self.assertEqual(len(subjects), 2)
+        self.assertTrue(subjects[0].endswith('has been marked as a no-show'))
+        self.assertTrue(subjects[1].endswith('has started'))
+
+    def test_ticks_only_move_due_reservations_once(self):
+        self.reservation('confirmed', 0, 2)
+        run_lifecycle_tick(self.today)
+        self.assertEqual(run_lifecycle_tick(self.today), {'active': 0, 'completed': 0, 'no-show': 0})
+
+    def test_command_reports_the_moved_reservations(self):
+        self.reservation('confirmed', 0, 2)
+        out = io.StringIO()
+        call_command('advance_reservations', stdout=out)
+        self.assertIn('1 active', out.getvalue())
+
+
+class ReservationBulkCancelTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.car = create_car('LAG-001')
+        self.owner = CustomUser.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.other = CustomUser.objects.create_user(username='other', email='other@example.com', password='password')
+        self.reservation = Reservation.objects.create(
+            car=self.car, user=self.owner, reservation_type='firm', pickup_location='Lagos', dropoff_location='Abuja',
+            start_date=self.today + timedelta(days=1), end_date=self.today + timedelta(days=3),
+        )
+        self.client = APIClient()
+
+    def test_non_owner_cannot_cancel_by_id(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.post('/api/v1/reservation/bulk/cancel/', {'ids': [str(self.reservation.pk)]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 0)
+        self.assertEqual(response.json()['results'][0]['outcome'], 'not_found')
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'pending')
+
+    def test_non_owner_filter_does_not_reach_other_reservations(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.post('/api/v1/reservation/bulk/cancel/', {'filter': {'car': str(self.car.pk)}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'updated': 0, 'results': []})
+
+    def test_owner_can_cancel_by_id(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.post('/api/v1/reservation/bulk/cancel/', {'ids': [str(self.reservation.pk)]}, format='json')
+        self.assertEqual(response.json()['results'][0]['outcome'], 'cancelled')
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'cancelled')
+        # the car is free again
+        self.assertFalse(BookedInterval.objects.filter(pk=self.reservation.pk).exists())
+
+    def test_owner_can_cancel_by_filter(self):
+        Reservation.objects.create(
+            car=create_car('LAG-002'), user=self.owner, reservation_type='firm', pickup_location='Lagos', dropoff_location='Abuja',
+            start_date=self.today + timedelta(days=5), end_date=self.today + timedelta(days=6), status='confirmed',
+        )
+        self.client.force_authenticate(self.owner)
+        response = self.client.post('/api/v1/reservation/bulk/cancel/', {'filter': {'status': ['pending']}}, format='json')
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(sorted(Reservation.objects.values_list('status', flat=True)), ['cancelled', 'confirmed'])
+
+    def test_ids_or_a_filter_are_required(self):
+        self.client.force_authenticate(self.owner)
+        body = {'ids': [str(self.reservation.pk)], 'filter': {'car': str(self.car.pk)}}
+        self.assertEqual(self.client.post('/api/v1/reservation/bulk/cancel/', body, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/reservation/bulk/cancel/', {'filter': {}}, format='json').status_code, 400)
+
+
+class ReservationBulkConfirmTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        self.user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def reservation(self, plate_number, status='pending'):
+        reservation = Reservation.objects.create(
+            car=create_car(plate_number), user=self.user, reservation_type='firm', pickup_location='Lagos', dropoff_location='Abuja',
+            start_date=self.today + timedelta(days=1), end_date=self.today + timedelta(days=2),
+        )
+        Reservation.objects.filter(pk=reservation.pk).update(status=status)
+        return reservation
+
+    def confirm(self, *ids):
+        return self.client.post('/api/v1/reservation/bulk/confirm/', {'ids': [str(pk) for pk in ids]}, format='json')
+
+    def test_every_reservation_gets_an_outcome(self):
+        pending, cancelled = self.reservation('LAG-001'), self.reservation('LAG-002', 'cancelled')
+        confirmed, missing = self.reservation('LAG-003', 'confirmed'), uuid.uuid4()
+        OutboxEmail.objects.all().delete()
+
+        # a repeated id is only reported once
+        response = self.confirm(pending.pk, cancelled.pk, confirmed.pk, missing, pending.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual([result['outcome'] for result in response.json()['results']], ['confirmed', 'rejected', 'confirmed', 'not_found'])
+        self.assertEqual(Reservation.objects.get(pk=pending.pk).status, 'confirmed')
+        self.assertEqual(Reservation.objects.get(pk=cancelled.pk).status, 'cancelled')
+        # only the reservation that changed is announced
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_confirming_takes_constant_queries(self):
+        reservations = [self.reservation(f'LAG-{i:03}') for i in range(3)]
+        with CaptureQueriesContext(connection) as few:
+            self.confirm(reservations[0].pk)
+        more = [self.reservation(f'LAG-{i:03}') for i in range(3, 8)]
+        with CaptureQueriesContext(connection) as many:
+            self.confirm(*[reservation.pk for reservation in reservations[1:] + more])
+        self.assertEqual(len(many), len(few))
+
+    def test_confirming_is_for_admins_only(self):
+        pending = self.reservation('LAG-001')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.confirm(pending.pk).status_code, 403)
+
+
+class ReservationSparseFieldTests(TestCase):
+    def setUp(self):
+        today = date.today()
+        self.user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.reservation = Reservation.objects.create(
+            car=create_car('LAG-001'), user=self.user, reservation_type='firm', pickup_location='Lagos',
+            dropoff_location='Abuja', start_date=today, end_date=today + timedelta(days=1),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_loads_only_the_requested_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/reservation/', {'fields': 'id,status,total_price'})
+        self.assertEqual(response.json()['results'], [{'id': str(self.reservation.pk), 'status': 'pending', 'total_price': 200.0}])
+        self.assertNotIn(connection.ops.quote_name('dropoff_location'), ' '.join(query['sql'] for query in queries))
+
+    def test_detail_leaves_out_omitted_fields(self):
+        response = self.client.get(f'/api/v1/reservation/{self.reservation.pk}/', {'omit': 'pickup_location,dropoff_location'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('pickup_location', response.json())
+        self.assertIn('duration', response.json())
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get('/api/v1/reservation/', {'fields': 'status,price'}).status_code, 400)
+
+    def test_sparse_fields_do_not_bypass_permissions(self):
+        other = CustomUser.objects.create_user(username='other', email='other@example.com', password='password')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/api/v1/reservation/{self.reservation.pk}/', {'fields': 'status'}).status_code, 403)
+
+    def test_writes_return_every_field(self):
+        response = self.client.post('/api/v1/reservation/new/?fields=id', booking(create_car('LAG-002'), date.today(), date.today()), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('pickup_location', response.json())
+
+
+class AsyncReservationRetrieveTests(TestCase):
+    def setUp(self):
+        today = date.today()
+        self.owner = CustomUser.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.other = CustomUser.objects.create_user(username='other', email='other@example.com', password='password')
+        self.reservation = Reservation.objects.create(
+            car=create_car('LAG-001'), user=self.owner, pickup_location='Lagos', dropoff_location='Abuja',
+            start_date=today, end_date=today + timedelta(days=2),
+        )
+        self.url = f'/api/v1/reservation/async/{self.reservation.pk}/'
+        self.client = AsyncClient()
+
+    def authorization(self, user):
+        return {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+    async def test_anonymous_requests_are_rejected(self):
+        self.assertEqual((await self.client.get(self.url)).status_code, 401)
+
+    async def test_owner_gets_the_reservation(self):
+        response = await self.client.get(self.url, headers=self.authorization(self.owner))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_price'], 300.0)
+        sync_client = APIClient()
+        sync_client.force_authenticate(self.owner)
+        sync_response = await sync_to_async(sync_client.get)(f'/api/v1/reservation/{self.reservation.pk}/')
+        self.assertEqual(response.json(), sync_response.json())
+
+    async def test_other_users_are_forbidden(self):
+        response = await self.client.get(self.url, headers=self.authorization(self.other))
+        self.assertEqual(response.status_code, 403)
@@ -1,9 +1,14 @@
 from django.urls import path
-from .views import ReservationCreateAPIView, ReservationListAPIView, ReservationRetrieveAPIView, ReservationUpdateAPIView, ReservationConfirmAPIView, ReservationCancelAPIView, ReservationDestroyAPIView
+from .views import ReservationCreateAPIView, ReservationListAPIView, ReservationRetrieveAPIView, ReservationUpdateAPIView, ReservationConfirmAPIView, ReservationCancelAPIView, ReservationDestroyAPIView, ReservationExportAPIView, AsyncReservationRetrieveAPIView, UtilizationAnalyticsAPIView, ReservationBulkConfirmAPIView, ReservationBulkCancelAPIView
 
 urlpatterns = [
     path('new/', ReservationCreateAPIView.as_view(), name='create-reservation'),
     path('', ReservationListAPIView.as_view(), name='list-reservations'),
+    path('export/', ReservationExportAPIView.as_view(), name='export-reservations'),
+    path('analytics/utilization/', UtilizationAnalyticsAPIView.as_view(), name='utilization-analytics'),
+    path('bulk/confirm/', ReservationBulkConfirmAPIView.as_view(), name='bulk-confirm-reservations'),
+    path('bulk/cancel/', ReservationBulkCancelAPIView.as_view(), name='bulk-cancel-reservations'),
+    path('async/<str:pk>/', AsyncReservationRetrieveAPIView.as_view(), name='async-retrieve-reservation'),
     path('<str:pk>/', ReservationRetrieveAPIView.as_view(), name='retrieve-reservation'),
     path('<str:pk>/update/', ReservationUpdateAPIView.as_view(), name='create-reservation'),
     path('<str:pk>/confirm/', ReservationConfirmAPIView.as_view(), name='create-reservation'),
@@ -0,0 +1,170 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+from decimal import Decimal, ROUND_DOWN
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from car.models import Car
+from .models import BookedInterval, CarUtilization, CarTypeUtilization
+
+'''
+Incremental maintenance of the daily utilization rollups.
+Every booked interval adds one reservation to each of its days and, when it is
+firm, the price it was booked at as revenue, spread evenly over its days with
+the leftover cents on the last one. Releasing it takes them back. Soft bookings
+occupy the car but can still be overridden, so they bring no revenue, and firm
+bookings never overlap, so no day's revenue is counted twice. A car type's booked_cars only moves when a
+car's day goes from free to booked or back, which the car rows tell us.
+Changing a car's type leaves its past days on the old type until
+`manage.py rebuild_utilization` is run.
+'''
+def days_between(start_date, end_date):
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+CENT = Decimal('0.01')
+
+def interval_revenue(reservation_type, booked_price):
+    return Decimal(str(booked_price)).quantize(CENT) if reservation_type == 'firm' else Decimal('0')
+
+'''
+Splits an interval's revenue over its days, returns the share of every day but
+the last and the share of the last day
+'''
+def daily_revenue(revenue, day_count):
+    share = (revenue / day_count).quantize(CENT, rounding=ROUND_DOWN)
+    return share, revenue - share * (day_count - 1)
+
+def revenue_change(start_date, end_date, revenue, sign):
+    share, last = daily_revenue(revenue, (end_date - start_date).days + 1)
+    return F('revenue') + Case(
+        When(day=end_date, then=Value(last * sign)),
+        default=Value(share * sign),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+def apply_interval(car_id, car_type, start_date, end_date, revenue, sign):
+    days = days_between(start_date, end_date)
+    with transaction.atomic():
+        CarUtilization.objects.bulk_create([CarUtilization(car_id=car_id, day=day) for day in days], ignore_conflicts=True)
+        car_days = CarUtilization.objects.filter(car_id=car_id, day__range=(start_date, end_date))
+        car_days.update(reservations=F('reservations') + sign, revenue=revenue_change(start_date, end_date, revenue, sign))
+        flipped = list(
+            car_days.select_for_update().filter(reservations=1 if sign > 0 else 0).values_list('day', flat=True)
+        )
+
+        CarTypeUtilization.objects.bulk_create([CarTypeUtilization(car_type=car_type, day=day) for day in days], ignore_conflicts=True)
+        type_days = CarTypeUtilization.objects.filter(car_type=car_type, day__range=(start_date, end_date))
+        if revenue:
+            type_days.update(revenue=revenue_change(start_date, end_date, revenue, sign))
+        if flipped:
+            type_days.filter(day__in=flipped).update(booked_cars=F('booked_cars') + sign)
+
+def add_booked_interval(interval, car_type):
+    revenue = interval_revenue(interval.reservation_type, interval.booked_price)
+    apply_interval(interval.car_id, car_type, interval.start_date, interval.end_date, revenue, 1)
+
+def remove_booked_interval(interval, car_type):
+    revenue = interval_revenue(interval.reservation_type, interval.booked_price)
+    apply_interval(interval.car_id, car_type, interval.start_date, interval.end_date, revenue, -1)
+
+'''
+Moves the revenue of an interval whose reservation type changed from old_type,
+its days stay booked
+'''
+def retype_booked_interval(interval, car_type, old_type):
+    gained = interval_revenue(interval.reservation_type, interval.booked_price)
+    lost = interval_revenue(old_type, interval.booked_price)
+    if gained == lost:
+        return
+    revenue, sign = (gained, 1) if gained else (lost, -1)
+    days = (interval.start_date, interval.end_date)
+    change = revenue_change(interval.start_date, interval.end_date, revenue, sign)
+    with transaction.atomic():
+        CarUtilization.objects.filter(car_id=interval.car_id, day__range=days).update(revenue=change)
+        CarTypeUtilization.objects.filter(car_type=car_type, day__range=days).update(revenue=change)
+
+'''
+Rebuilds both rollups from the booked intervals, one car at a time so memory
+only grows with the number of car types and days
+'''
+def rebuild_utilization(batch_size=1000):
+    CarUtilization.objects.all().delete()
+    CarTypeUtilization.objects.all().delete()
+
+    type_days = defaultdict(lambda: [0, Decimal('0')])
+    batch = []
+    car_days = 0
+    intervals = BookedInterval.objects.order_by('car_id').values_list(
+        'car_id', 'car__car_type', 'reservation_type', 'start_date', 'end_date', 'booked_price'
+    )
+    for (car_id, car_type), rows in groupby(intervals.iterator(chunk_size=batch_size), key=itemgetter(0, 1)):
+        days = defaultdict(lambda: [0, Decimal('0')])
+        for _, _, reservation_type, start_date, end_date, booked_price in rows:
+            booked_days = days_between(start_date, end_date)
+            share, last = daily_revenue(interval_revenue(reservation_type, booked_price), len(booked_days))
+            for day in booked_days:
+                days[day][0] += 1
+                days[day][1] += last if day == end_date else share
+
+        for day, (reservations, revenue) in days.items():
+            batch.append(CarUtilization(car_id=car_id, day=day, reservations=reservations, revenue=revenue))
+            type_days[(car_type, day)][0] += 1
+            type_days[(car_type, day)][1] += revenue
+        if len(batch) >= batch_size:
+            CarUtilization.objects.bulk_create(batch)
+            car_days += len(batch)
+            batch = []
+    if batch:
+        CarUtilization.objects.bulk_create(batch)
+        car_days += len(batch)
+
+    CarTypeUtilization.objects.bulk_create(
+        (CarTypeUtilization(car_type=car_type, day=day, booked_cars=booked_cars, revenue=revenue)
+         for (car_type, day), (booked_cars, revenue) in type_days.items()),
+        batch_size=batch_size,
+    )
+    return car_days, len(type_days)
+
+'''
+Occupancy and revenue between two dates (both inclusive) per car or per car type,
+read from the rollups only. Occupancy is the share of the cars' days that were booked
+(soft bookings included), revenue only counts firm reservations.
+'''
+def utilization_by_car(date_from, date_to):
+    days = (date_to - date_from).days + 1
+    rows = (
+        CarUtilization.objects.filter(day__range=(date_from, date_to))
+        .values('car')
+        .annotate(booked_days=Count('day', filter=Q(reservations__gt=0)), revenue=Sum('revenue'))
+        .order_by('car')
+    )
+    return [
+        {
+            'car': row['car'],
+            'booked_days': row['booked_days'],
+            'revenue': float(row['revenue']),
+            'occupancy': round(row['booked_days'] / days, 4),
+        }
+        for row in rows
+    ]
+
+def utilization_by_car_type(date_from, date_to):
+    days = (date_to - date_from).days + 1
+    fleet = dict(Car.objects.values('car_type').annotate(cars=Count('pk')).values_list('car_type', 'cars'))
+    rows = (
+        CarTypeUtilization.objects.filter(day__range=(date_from, date_to))
+        .values('car_type')
+        .annotate(booked_days=Sum('booked_cars'), revenue=Sum('revenue'))
+        .order_by('car_type')
+    )
+    return [
+        {
+            'car_type': row['car_type'],
+            'cars': fleet.get(row['car_type'], 0),
+            'booked_days': row['booked_days'],
+            'revenue': float(row['revenue']),
+            'occupancy': round(row['booked_days'] / (fleet[row['car_type']] * days), 4) if fleet.get(row['car_type']) else None,
+        }
+        for row in rows
+    ]
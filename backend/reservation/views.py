@@ -1,38 +1,47 @@
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework import filters
-from .serializers import ReservationSerializer
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from datetime import date, timedelta
+from .serializers import ReservationSerializer, BulkReservationActionSerializer
 from .models import Reservation
+from .filters import TotalPriceFilter
+from .exports import EXPORT_FORMATS, export_queryset, iter_in_chunks, stream_csv, stream_ndjson
+from .services import lock_car_for_booking, override_soft_reservations, set_status_in_bulk
+from .utilization import utilization_by_car, utilization_by_car_type
+from car.pricing import price_booking
 from utils.permissions import IsAdminOrSelf
+from utils.pagination import KeysetPagination
+from utils.async_views import AsyncRetrieveAPIView
+from utils.sparse_fields import SparseFieldsFilter
+from utils.query_params import parse_date_param, unsupported_choice_response
 
 # to create a reservation
 class ReservationCreateAPIView(generics.CreateAPIView):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
 
+    # the reservation and its outbox emails are written in one transaction
+    @transaction.atomic
     def perform_create(self, serializer):
         user = self.request.user
-        car = self.request.data.get('car')
-        start_date = self.request.data.get('start_date')
-        end_date = self.request.data.get('end_date')
+        car = serializer.validated_data['car']
+        start_date = serializer.validated_data['start_date']
+        end_date = serializer.validated_data['end_date']
+        lock_car_for_booking(car, start_date, end_date)
+        # priced like the quotes, so the customer pays what they were quoted
+        booked_price = price_booking(car, start_date, end_date)
 
         if user.is_authenticated:
-            # Check for overlapping guest reservation
-            overlaps = Reservation.objects.filter(
-                car_id=car,
-                reservation_type='soft',
-                start_date__lt=end_date,
-                end_date__gt=start_date
-            ).exclude(status__in=['cancelled', 'active'])
-            for guest_res in overlaps:
-                # mark overridden and notify guest
-                guest_res.status = 'overridden'
-                guest_res.save()
-            serializer.save(user=user, reservation_type='firm', status='pending')
+            # override overlapping guest reservations and notify the guests
+            override_soft_reservations(car, start_date, end_date)
+            serializer.save(user=user, reservation_type='firm', status='pending', booked_price=booked_price)
         else:
-            serializer.save(reservation_type='soft', status='pending')
+            serializer.save(reservation_type='soft', status='pending', booked_price=booked_price)
 
 # to update a reservation
 class ReservationUpdateAPIView(generics.UpdateAPIView):
@@ -40,68 +49,79 @@ class ReservationUpdateAPIView(generics.UpdateAPIView):
     serializer_class = ReservationSerializer
     permission_classes = [IsAdminOrSelf]
 
+    @transaction.atomic
     def perform_update(self, serializer):
         user = self.request.user
-        instance = self.get_object()
-        car = self.request.data.get('car')
-        start_date = self.request.data.get('start_date')
-        end_date = self.request.data.get('end_date')
+        instance = serializer.instance
+        car = serializer.validated_data.get('car', instance.car)
+        start_date = serializer.validated_data.get('start_date', instance.start_date)
+        end_date = serializer.validated_data.get('end_date', instance.end_date)
+        lock_car_for_booking(car, start_date, end_date, exclude=instance.pk)
+        booked_price = price_booking(car, start_date, end_date)
         if not user.is_staff and instance.user == user:
-            serializer.save(status='modified')
+            if not instance.can_transition_to('modified'):
+                raise ValidationError({'status error': f'A {instance.status} reservation cannot be modified'})
+            instance = serializer.save(status='modified', booked_price=booked_price)
         else:
-            serializer.save()
+            instance = serializer.save(booked_price=booked_price)
 
         if user.is_authenticated:
-            # Check for overlapping guest reservation
-            overlaps = Reservation.objects.filter(
-                car_id=car,
-                reservation_type='soft',
-                start_date__lt=end_date,
-                end_date__gt=start_date
-            ).exclude(status__in=['cancelled', 'active'])
-            for guest_res in overlaps:
-                # mark overridden and notify guest
-                guest_res.status = 'overridden'
-                guest_res.save()
+            # override overlapping guest reservations and notify the guests
+            override_soft_reservations(instance.car_id, instance.start_date, instance.end_date, exclude=instance.pk)
         else:
             serializer.save(reservation_type='soft', status='mofified')
 
 # to get a particular reservation
 class ReservationRetrieveAPIView(generics.RetrieveAPIView):
-    queryset = Reservation.objects.all()
+    queryset = Reservation.objects.with_pricing()
     serializer_class = ReservationSerializer
     permission_classes = [IsAdminOrSelf]
+    filter_backends = [SparseFieldsFilter]
+    # user for the permission check, car is joined by with_pricing()
+    sparse_required_fields = ['user', 'car']
+
+# async version of the reservation detail for ASGI deployments
+class AsyncReservationRetrieveAPIView(AsyncRetrieveAPIView):
+    view_class = ReservationRetrieveAPIView
 
 # to get the list of all reservations
 class ReservationListAPIView(generics.ListAPIView):
-    queryset = Reservation.objects.all()
+    queryset = Reservation.objects.with_pricing()
     serializer_class = ReservationSerializer
     permission_classes = [IsAdminOrSelf]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = KeysetPagination
+    filter_backends = [filters.SearchFilter, TotalPriceFilter, filters.OrderingFilter, SparseFieldsFilter]
     search_fields = ['id', 'user', 'car', 'status']
-    ordering_fields = ['created_at']
+    ordering_fields = ['created_at', 'start_date', 'duration', 'total_price']
+    # the keyset pagination cursor is built from created_at, car is joined by with_pricing()
+    sparse_required_fields = ['created_at', 'car']
 
     def get_queryset(self):
         user = self.request.user
 
         if user.is_superuser:
-            return Reservation.objects.all()
+            return Reservation.objects.with_pricing()
         else:
-            return Reservation.objects.filter(user=user)
+            return Reservation.objects.with_pricing().filter(user=user)
 
 # to cancel a reservation
 class ReservationCancelAPIView(APIView):
     permission_classes = [IsAdminOrSelf]
 
+    @transaction.atomic
     def post(self, request, pk):
         try:
-            reservation = Reservation.objects.get(pk=pk)
+            # locked so the transition checked below is still allowed when saved
+            reservation = Reservation.objects.select_for_update().get(pk=pk)
         except Reservation.DoesNotExist:
             return Response({'detail': 'Reservation not found.'}, status=status.HTTP_404_NOT_FOUND)
 
         # Check permission
         self.check_object_permissions(request, reservation)
 
+        if not reservation.can_transition_to('cancelled'):
+            return Response({'detail': f'A {reservation.status} reservation cannot be cancelled.'}, status=status.HTTP_400_BAD_REQUEST)
+
         reservation.status = 'cancelled'
         reservation.save()
         return Response({'detail': 'Reservation cancelled.'}, status=status.HTTP_200_OK)
@@ -110,20 +130,179 @@ class ReservationCancelAPIView(APIView):
 class ReservationConfirmAPIView(APIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
 
+    @transaction.atomic
     def post(self, request, pk):
         try:
-            reservation = Reservation.objects.get(pk=pk)
+            # locked so the transition checked below is still allowed when saved
+            reservation = Reservation.objects.select_for_update().get(pk=pk)
         except Reservation.DoesNotExist:
             return Response({'detail': 'Reservation not found.'}, status=status.HTTP_404_NOT_FOUND)
 
         # Check permission
         self.check_object_permissions(request, reservation)
 
+        if not reservation.can_transition_to('confirmed'):
+            return Response({'detail': f'A {reservation.status} reservation cannot be confirmed.'}, status=status.HTTP_400_BAD_REQUEST)
+
         reservation.status = 'confirmed'
         reservation.save()
         return Response({'detail': 'Reservation confirmed.'}, status=status.HTTP_200_OK)
 
+'''
+Base of the bulk status actions, for back office batches. The targeted
+reservations are locked and read with one query, each one is checked against
+the object permissions and its allowed transitions like the single endpoints
+do, and the accepted ones are moved with one UPDATE (see set_status_in_bulk),
+so their notifications are queued as one batch. The response has the outcome
+of every reservation. Unless `all_reservations` is set, users other than
+superusers only reach their own reservations, others are not_found.
+'''
+class ReservationBulkStatusAPIView(APIView):
+    target_status = None
+    done_detail = None
+    all_reservations = False
+
+    def get_queryset(self, data):
+        queryset = Reservation.objects.only('id', 'user_id', 'status').order_by('pk')
+        if not self.all_reservations and not self.request.user.is_superuser:
+            queryset = queryset.filter(user=self.request.user)
+        if 'ids' in data:
+            return queryset.filter(pk__in=data['ids'])
+
+        criteria = data['filter']
+        if 'status' in criteria:
+            queryset = queryset.filter(status__in=criteria['status'])
+        if 'car' in criteria:
+            queryset = queryset.filter(car_id=criteria['car'])
+        if 'start_date_from' in criteria:
+            queryset = queryset.filter(start_date__gte=criteria['start_date_from'])
+        if 'start_date_to' in criteria:
+            queryset = queryset.filter(start_date__lte=criteria['start_date_to'])
+        return queryset
+
+    def has_object_permission(self, request, reservation):
+        return all(permission.has_object_permission(request, self, reservation) for permission in self.get_permissions())
+
+    def get_outcome(self, request, reservation):
+        if not self.has_object_permission(request, reservation):
+            return 'forbidden', 'You do not have permission to perform this action.'
+        if not reservation.can_transition_to(self.target_status):
+            return 'rejected', f'A {reservation.status} reservation cannot be {self.target_status}.'
+        return self.target_status, self.done_detail
+
+    @transaction.atomic
+    def post(self, request):
+        serializer = BulkReservationActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        limit = BulkReservationActionSerializer.MAX_RESERVATIONS
+        reservations = list(self.get_queryset(data).select_for_update()[:limit + 1])
+        if len(reservations) > limit:
+            return Response({'detail': f'More than {limit} reservations match the filter, narrow it down.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        found = {reservation.pk: reservation for reservation in reservations}
+        reservation_ids = dict.fromkeys(data['ids']) if 'ids' in data else found
+        results = []
+        moved_ids = []
+        for reservation_id in reservation_ids:
+            reservation = found.get(reservation_id)
+            if reservation is None:
+                outcome, detail = 'not_found', 'Reservation not found.'
+            else:
+                outcome, detail = self.get_outcome(request, reservation)
+                if outcome == self.target_status and reservation.status != self.target_status:
+                    moved_ids.append(reservation.pk)
+            results.append({'id': reservation_id, 'outcome': outcome, 'detail': detail})
+
+        if moved_ids:
+            set_status_in_bulk(moved_ids, self.target_status)
+        return Response({'updated': len(moved_ids), 'results': results}, status=status.HTTP_200_OK)
+
+# to confirm many reservations, staff confirm anyone's
+class ReservationBulkConfirmAPIView(ReservationBulkStatusAPIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    all_reservations = True
+    target_status = 'confirmed'
+    done_detail = 'Reservation confirmed.'
+
+# to cancel many reservations, users can only cancel their own
+class ReservationBulkCancelAPIView(ReservationBulkStatusAPIView):
+    permission_classes = [IsAdminOrSelf]
+    target_status = 'cancelled'
+    done_detail = 'Reservation cancelled.'
+
 class ReservationDestroyAPIView(generics.DestroyAPIView):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
+
+
+'''
+Streams all reservations matching ?date_from=&date_to=&status= as CSV or NDJSON
+(?file_format=csv|ndjson), in constant memory whatever the number of rows
+'''
+class ReservationExportAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    chunk_size = 2000
+
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return unsupported_choice_response('Unsupported format', EXPORT_FORMATS)
+
+        statuses = [value for param in request.query_params.getlist('status') for value in param.split(',') if value]
+        valid_statuses = {choice for choice, label in Reservation.STATUS_CHOICES}
+        if not set(statuses) <= valid_statuses:
+            return Response({'detail': f'Unknown status, use any of: {", ".join(sorted(valid_statuses))}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = export_queryset(
+            date_from=parse_date_param(request, 'date_from'),
+            date_to=parse_date_param(request, 'date_to'),
+            statuses=statuses,
+        )
+        rows = iter_in_chunks(queryset, chunk_size=self.chunk_size)
+
+        if file_format == 'csv':
+            response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="reservations.{file_format}"'
+        return response
+
+'''
+Fleet occupancy and revenue per car or per car type between ?date_from= and
+?date_to= (both inclusive, the last 30 days by default), read from the daily
+utilization rollups only
+'''
+class UtilizationAnalyticsAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    default_days = 30
+    max_days = 366
+    group_by_choices = {
+        'car': utilization_by_car,
+        'car_type': utilization_by_car_type,
+    }
+
+    def get(self, request):
+        group_by = request.query_params.get('group_by', 'car_type')
+        if group_by not in self.group_by_choices:
+            return unsupported_choice_response('Unsupported grouping', self.group_by_choices)
+
+        date_to = parse_date_param(request, 'date_to') or date.today()
+        date_from = parse_date_param(request, 'date_from') or date_to - timedelta(days=self.default_days - 1)
+        if date_from > date_to:
+            raise ValidationError({
+                'date error': 'date_to cannot be before date_from'
+            })
+        if (date_to - date_from).days >= self.max_days:
+            raise ValidationError({
+                'date error': f'The date range cannot be longer than {self.max_days} days'
+            })
+
+        return Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'group_by': group_by,
+            'results': self.group_by_choices[group_by](date_from, date_to),
+        }, status=status.HTTP_200_OK)
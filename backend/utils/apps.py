@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+class UtilsConfig(AppConfig):
+    name = 'utils'
+
+    '''
+    Request metrics time every serializer.data and every SQL query of the
+    process, so they are installed once here rather than as a side effect of
+    building the middleware
+    '''
+    def ready(self):
+        from utils.metrics import install_instrumentation
+        install_instrumentation()
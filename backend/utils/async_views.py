@@ -0,0 +1,99 @@
+from abc import ABCMeta, abstractmethod
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.response import Response
+
+'''
+Async counterparts of the read-only DRF generic views, served natively under ASGI.
+The sync view in `view_class` is reused as is for content negotiation,
+authentication, permissions, throttling, filters, pagination, serialization and
+rendering, so both versions always behave the same. Only the queries run on the
+async ORM, so a slow query no longer holds a worker thread. Subclasses
+implement `handle`, which returns the Response of the request.
+'''
+class AsyncGenericAPIView(View, metaclass=ABCMeta):
+    view_class = None
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request, *args, **kwargs):
+        view = self.view_class()
+        view.args = args
+        view.kwargs = kwargs
+        request = view.initialize_request(request, *args, **kwargs)
+        view.request = request
+        view.headers = view.default_response_headers
+
+        try:
+            # authentication may have to load the user on a cache miss
+            await sync_to_async(view.initial)(request, *args, **kwargs)
+            response = await self.handle(view, request)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+
+        response = view.finalize_response(request, response, *args, **kwargs)
+        return self.render(response)
+
+    @abstractmethod
+    async def handle(self, view, request):
+        pass
+
+    # renders here rather than letting django call Response.render() in a thread
+    def render(self, response):
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        rendered.cookies.update(response.cookies)
+        return rendered
+
+'''
+The view's queryset after its filter backends. They are sync code and may
+query the database (e.g. to validate a parameter), so they run in a thread.
+'''
+async def filtered_queryset(view):
+    return await sync_to_async(lambda: view.filter_queryset(view.get_queryset()))()
+
+'''
+Async version of ListAPIView.
+Paginators with an `apaginate_queryset` (see KeysetPagination) page with the
+async ORM, other lists are fetched with `async for`.
+'''
+class AsyncListAPIView(AsyncGenericAPIView):
+    async def handle(self, view, request):
+        queryset = await filtered_queryset(view)
+
+        paginator = view.paginator
+        if paginator is not None and hasattr(paginator, 'apaginate_queryset'):
+            page = await paginator.apaginate_queryset(queryset, request, view=view)
+            serializer = view.get_serializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        if paginator is not None:
+            page = await sync_to_async(paginator.paginate_queryset)(queryset, request, view=view)
+            if page is not None:
+                serializer = view.get_serializer(page, many=True)
+                return paginator.get_paginated_response(serializer.data)
+
+        instances = [instance async for instance in queryset]
+        return Response(view.get_serializer(instances, many=True).data)
+
+'''
+Async version of RetrieveAPIView, the object is fetched with `aget`.
+Object permissions must not touch unloaded relations (compare `user_id`, not `user`).
+'''
+class AsyncRetrieveAPIView(AsyncGenericAPIView):
+    async def aget_object(self, view):
+        queryset = await filtered_queryset(view)
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        try:
+            instance = await queryset.aget(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        view.check_object_permissions(view.request, instance)
+        return instance
+
+    async def handle(self, view, request):
+        instance = await self.aget_object(view)
+        return Response(view.get_serializer(instance).data, status=status.HTTP_200_OK)
@@ -0,0 +1,89 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# the user fields kept in the cache, the others are loaded on first access
+AUTH_USER_FIELDS = ('id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser')
+
+'''
+The cache users are kept in (AUTH_USER_CACHE), or None when the user cache is off
+'''
+def get_user_cache():
+    if not settings.AUTH_USER_CACHE:
+        return None
+    return caches[settings.AUTH_USER_CACHE]
+
+'''
+Every user has an auth version in the cache, bumped whenever the user is saved
+or deleted. A cached user carries the version it was read under and is only
+used while that is still the current one, so a bump makes the old entry
+useless, even if a request still holding the old user writes it back
+afterwards. Versions start from the current time so an evicted version is
+never reused. The cache has to be shared by the worker processes or the
+others never see the bump.
+'''
+def auth_version_key(user_id):
+    return f'auth-user-version:{user_id}'
+
+def auth_user_key(user_id):
+    return f'auth-user:{user_id}'
+
+def get_auth_version(cache, user_id):
+    key = auth_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+def invalidate_cached_user(user_id):
+    cache = get_user_cache()
+    if cache is None:
+        return
+    key = auth_version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), timeout=None)
+
+'''
+JWTAuthentication that resolves the user from the cache for
+AUTH_USER_CACHE_TIMEOUT seconds instead of querying it on every request.
+Only AUTH_USER_FIELDS and a hash of the password hash are cached, a hit is
+one cache round trip for the version and the entry together.
+'''
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        cache = get_user_cache()
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if cache is None or user_id is None:
+            return super().get_user(validated_token)
+
+        cached = cache.get_many([auth_version_key(user_id), auth_user_key(user_id)])
+        version = cached.get(auth_version_key(user_id))
+        entry = cached.get(auth_user_key(user_id))
+        if version is None or entry is None or entry['version'] != version:
+            version = version or get_auth_version(cache, user_id)
+            user = super().get_user(validated_token)
+            cache.set(auth_user_key(user_id), {
+                'version': version,
+                'fields': [getattr(user, field) for field in AUTH_USER_FIELDS],
+                'password': get_md5_hash_password(user.password),
+            }, settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+
+        # the same checks JWTAuthentication runs after loading the user
+        user = self.user_model.from_db(router.db_for_read(self.user_model), AUTH_USER_FIELDS, entry['fields'])
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != entry['password']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
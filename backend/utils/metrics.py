@@ -0,0 +1,230 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.serializers import BaseSerializer
+from rest_framework.views import APIView
+
+logger = logging.getLogger('utils.metrics')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+'''
+Cumulative histogram per label set, rendered in the Prometheus text format
+'''
+class Histogram:
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.setdefault(labels, [[0] * len(self.buckets), 0, 0])
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][index] += 1
+        series[1] += 1
+        series[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, (counts, count, total) in sorted(self.series.items()):
+            named = list(zip(self.label_names, labels))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{format_labels(named + [("le", bound)])} {bucket_count}')
+            lines.append(f'{self.name}_bucket{format_labels(named + [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_sum{format_labels(named)} {total}')
+            lines.append(f'{self.name}_count{format_labels(named)} {count}')
+        return lines
+
+class Counter:
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.series = {}
+
+    def inc(self, labels):
+        self.series[labels] = self.series.get(labels, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{format_labels(zip(self.label_names, labels))} {value}')
+        return lines
+
+'''
+Request metrics of this process, labelled by URL route. Every worker
+process keeps its own, so each one has to be scraped (or run a single worker).
+'''
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter('http_requests_total', 'Requests by URL route, method and status.', ('route', 'method', 'status'))
+        self.histograms = {
+            'duration': Histogram('http_request_duration_seconds', 'Time spent handling the request.', ('route', 'method'), DURATION_BUCKETS),
+            'queries': Histogram('http_request_db_queries', 'SQL queries run by the request.', ('route', 'method'), QUERY_BUCKETS),
+            'db_time': Histogram('http_request_db_duration_seconds', 'Time spent in SQL queries.', ('route', 'method'), DURATION_BUCKETS),
+            'serializer_time': Histogram('http_request_serializer_duration_seconds', 'Time spent building serializer data.', ('route', 'method'), DURATION_BUCKETS),
+            'response_size': Histogram('http_response_size_bytes', 'Size of the response body.', ('route', 'method'), SIZE_BUCKETS),
+        }
+
+    def record(self, route, method, status, values):
+        with self.lock:
+            self.requests.inc((route, method, str(status)))
+            for name, value in values.items():
+                self.histograms[name].observe((route, method), value)
+
+    def render(self):
+        with self.lock:
+            lines = self.requests.render()
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+'''
+What the current request has spent so far. It lives in a context variable so
+queries run through sync_to_async by the async views are still counted on the
+request that made them.
+'''
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+current_request_metrics = ContextVar('current_request_metrics', default=None)
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+def install_query_wrapper(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+'''
+Times `serializer.data`, where DRF serializes. Nested serializers go through
+to_representation, only the outermost `.data` of a request is timed.
+'''
+serializer_data = BaseSerializer.data
+
+def timed_serializer_data(self):
+    metrics = current_request_metrics.get()
+    if metrics is None or metrics.serializing:
+        return serializer_data.fget(self)
+    metrics.serializing = True
+    start = time.perf_counter()
+    try:
+        return serializer_data.fget(self)
+    finally:
+        metrics.serializer_time += time.perf_counter() - start
+        metrics.serializing = False
+
+'''
+Counts the SQL queries of every connection and times serializer.data, called
+once from UtilsConfig.ready
+'''
+def install_instrumentation():
+    connection_created.connect(install_query_wrapper, dispatch_uid='utils.metrics.install_query_wrapper')
+    for connection in connections.all(initialized_only=True):
+        install_query_wrapper(connection)
+    if BaseSerializer.data is serializer_data:
+        BaseSerializer.data = property(timed_serializer_data)
+
+'''
+Records query count, SQL time, serializer time, response size and status of
+every request against its URL route, and logs a warning when a request runs
+more than REQUEST_QUERY_BUDGET queries. Works under WSGI and ASGI.
+'''
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, metrics, duration):
+        match = request.resolver_match
+        # several URLs share a name (the reservation update, confirm and cancel
+        # are all 'create-reservation'), their route patterns are distinct
+        route = match.route if match else 'unresolved'
+        values = {
+            'duration': duration,
+            'queries': metrics.queries,
+            'db_time': metrics.db_time,
+            'serializer_time': metrics.serializer_time,
+        }
+        # streamed bodies are never held in memory, so their size is not known
+        if not response.streaming:
+            values['response_size'] = len(response.content)
+        registry.record(route, request.method, response.status_code, values)
+
+        budget = settings.REQUEST_QUERY_BUDGET
+        if budget is not None and metrics.queries > budget:
+            logger.warning(
+                '%s %s (%s) ran %d queries, over the budget of %d (%.1f ms in SQL)',
+                request.method, request.path, route, metrics.queries, budget, metrics.db_time * 1000,
+            )
+
+'''
+Request metrics of this process in the Prometheus text exposition format
+'''
+class MetricsAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
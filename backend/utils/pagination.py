@@ -0,0 +1,197 @@
+import json
+import uuid
+from asgiref.sync import sync_to_async
+from base64 import b64decode, b64encode
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+'''
+Page number pagination by default, keyset (cursor) pagination on
+(created_at, id) when the client asks for it with ?pagination=cursor (or
+sends a ?cursor=). With cursors every page is a range scan on the
+(created_at, id) index, so page N costs the same as page 1, and no COUNT(*)
+is run unless the client asks with ?count=true. Cursors only follow the
+created_at ordering, asking for them on any other ordering (e.g.
+?ordering=name or a search ranked by relevance) is a 400.
+'''
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    pagination_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+    unsupported_ordering_message = 'Cursor pagination only supports ordering by created_at or -created_at'
+    page_number_class = PageNumberPagination
+
+    def use_cursor(self, request):
+        mode = request.query_params.get(self.pagination_query_param)
+        if mode not in (None, '', 'page', 'cursor'):
+            raise ValidationError({self.pagination_query_param: 'Unsupported pagination, use one of: page, cursor.'})
+        return mode == 'cursor' or bool(request.query_params.get(self.cursor_query_param))
+
+    def get_keyset_ordering(self, queryset):
+        ordering = list(queryset.query.order_by)
+        if not ordering or ordering == ['-created_at']:
+            return ('-created_at', '-id')
+        if ordering == ['created_at']:
+            return ('created_at', 'id')
+        return None
+
+    def start(self, queryset, request):
+        self.request = request
+        if not self.use_cursor(request):
+            self.page_number = self.page_number_class()
+            return False
+        self.page_number = None
+
+        self.ordering = self.get_keyset_ordering(queryset)
+        if self.ordering is None:
+            raise ValidationError({'pagination error': self.unsupported_ordering_message})
+        return True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.start(queryset, request):
+            return self.page_number.paginate_queryset(queryset, request, view)
+
+        self.count = queryset.count() if self.wants_count(request) else None
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        if not self.start(queryset, request):
+            return await sync_to_async(self.page_number.paginate_queryset)(queryset, request, view)
+
+        self.count = await queryset.acount() if self.wants_count(request) else None
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.set_page([instance async for instance in page_queryset])
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param) in ('1', 'true')
+
+    def get_page_queryset(self, queryset, request):
+        self.cursor = self.decode_cursor(request)
+        self.reverse = self.cursor is not None and self.cursor['reverse']
+        descending = self.ordering[0].startswith('-')
+        if self.reverse:
+            descending = not descending
+
+        ordering = ('-created_at', '-id') if descending else ('created_at', 'id')
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            if descending:
+                queryset = queryset.filter(
+                    Q(created_at__lt=self.cursor['created_at']) |
+                    Q(created_at=self.cursor['created_at'], id__lt=self.cursor['id'])
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__gt=self.cursor['created_at']) |
+                    Q(created_at=self.cursor['created_at'], id__gt=self.cursor['id'])
+                )
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = results
+        return results
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            created_at = parse_datetime(data['c'])
+            if created_at is None:
+                raise ValueError
+            # a tampered id would otherwise only fail in the query
+            pk = uuid.UUID(data['i'])
+            return {'created_at': created_at, 'id': pk, 'reverse': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse=False):
+        data = {'c': instance.created_at.isoformat(), 'i': str(instance.pk), 'r': int(reverse)}
+        encoded = b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.get_cursor_url(), self.cursor_query_param, encoded)
+
+    # links keep asking for cursors, even when the first page was asked with ?cursor= only
+    def get_cursor_url(self):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.pagination_query_param, 'cursor')
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.get_cursor_url(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.page_number is not None:
+            return self.page_number.get_paginated_response(data)
+
+        response = {}
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'description': 'Always returned with page numbers, with cursors only with ?count=true'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return self.page_number_class().get_schema_operation_parameters(view) + [
+            {
+                'name': self.pagination_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to cursor to page with cursors instead of page numbers.',
+                'schema': {'type': 'string', 'enum': ['page', 'cursor']},
+            },
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to true to include the total number of results when paging with cursors.',
+                'schema': {'type': 'boolean'},
+            },
+        ]
@@ -20,6 +20,7 @@ class IsAdminOrSelf(permissions.BasePermission):
             if obj == request.user:
                 return True
             # If obj has a user attribute (e.g., Reservation), check ownership
-            if hasattr(obj, 'user') and obj.user == request.user:
+            # on the user_id column so the user row is never fetched
+            if hasattr(obj, 'user_id') and obj.user_id == request.user.pk:
                 return True
         return False
\ No newline at end of file
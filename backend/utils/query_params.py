@@ -0,0 +1,34 @@
+from datetime import date
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+'''
+Reads an optional YYYY-MM-DD query parameter, None when it is missing or empty
+'''
+def parse_date_param(request, param):
+    value = request.query_params.get(param)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({param: 'Enter a valid date in the format YYYY-MM-DD.'})
+
+'''
+Reads an optional number query parameter, None when it is missing or empty
+'''
+def parse_number_param(request, param):
+    value = request.query_params.get(param)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValidationError({param: 'Enter a valid number.'})
+
+'''
+400 response for a parameter outside its choices, e.g. ('Unsupported format', ['csv', 'ndjson'])
+'''
+def unsupported_choice_response(message, choices):
+    return Response({'detail': f'{message}, use one of: {", ".join(choices)}.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,97 @@
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+def parse_field_list(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+'''
+Names of the fields picked with ?fields=a,b (only these) and ?omit=a,b (all but
+these) among `available`, or None when the whole representation is wanted.
+Only reads are trimmed, writes always see every field.
+'''
+def requested_fields(request, available):
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    fields = parse_field_list(request, FIELDS_PARAM)
+    omit = parse_field_list(request, OMIT_PARAM)
+    if fields is None and omit is None:
+        return None
+
+    unknown = [name for name in (fields or []) + (omit or []) if name not in available]
+    if unknown:
+        raise ValidationError({'fields error': f'Unknown fields: {", ".join(unknown)}. Use any of: {", ".join(available)}.'})
+    selected = set(fields) if fields is not None else set(available)
+    return selected - set(omit or [])
+
+'''
+Sparse fieldsets for a ModelSerializer, used with SparseFieldsFilter.
+`sparse_field_sources` lists the model fields read by serializer fields that
+are not model fields themselves (e.g. a SerializerMethodField).
+'''
+class SparseFieldsSerializerMixin:
+    sparse_field_sources = {}
+    sparse_selection = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        self.sparse_selection = requested_fields(self.context.get('request'), list(fields))
+        if self.sparse_selection is not None:
+            for name in [name for name in fields if name not in self.sparse_selection]:
+                del fields[name]
+        return fields
+
+    '''
+    The model fields the trimmed representation reads, or None when it is not trimmed
+    '''
+    def sparse_model_fields(self):
+        fields = self.fields
+        if self.sparse_selection is None:
+            return None
+        model_fields = {field.name for field in self.Meta.model._meta.concrete_fields}
+        columns = set()
+        for name, field in fields.items():
+            if field.write_only:
+                continue
+            if name in self.sparse_field_sources:
+                columns.update(self.sparse_field_sources[name])
+            elif field.source in model_fields:
+                columns.add(field.source)
+        return columns
+
+'''
+Pushes the sparse fieldset of the view's serializer down to the queryset with
+only(), so the columns left out are never read from the database. Views list
+the model fields they always need (pagination cursor, permission checks,
+select_related) in `sparse_required_fields`.
+'''
+class SparseFieldsFilter(filters.BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        columns = view.get_serializer().sparse_model_fields()
+        if columns is None:
+            return queryset
+        return queryset.only(*columns, *getattr(view, 'sparse_required_fields', ()))
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': FIELDS_PARAM,
+                'required': False,
+                'in': 'query',
+                'description': 'Comma separated fields to return, all by default',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': OMIT_PARAM,
+                'required': False,
+                'in': 'query',
+                'description': 'Comma separated fields to leave out',
+                'schema': {'type': 'string'},
+            },
+        ]
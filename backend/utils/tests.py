@@ -0,0 +1,65 @@
+import uuid
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from account.models import CustomUser
+from car.tests import create_car
+from .metrics import MetricsRegistry
+
+METRICS_URL = '/api/v1/metrics/'
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # every test starts from empty metrics, as a new process would
+        patcher = mock.patch('utils.metrics.registry', MetricsRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        self.client = APIClient()
+
+    def metrics(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(METRICS_URL)
+        self.client.force_authenticate(None)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_over_the_query_budget_are_logged(self):
+        create_car('LAG-001')
+        with self.assertLogs('utils.metrics', 'WARNING') as logs, override_settings(REQUEST_QUERY_BUDGET=0):
+            self.assertEqual(self.client.get('/api/v1/car/').status_code, 200)
+        self.assertIn('over the budget of 0', logs.output[0])
+
+    def test_requests_within_the_budget_are_not_logged(self):
+        with self.assertNoLogs('utils.metrics', 'WARNING'), override_settings(REQUEST_QUERY_BUDGET=1000):
+            self.client.get('/api/v1/car/')
+
+    def test_metrics_are_for_admins_only(self):
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 401)
+        user = CustomUser.objects.create_user(username='user', email='user@example.com', password='password')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+
+    def test_requests_are_recorded_by_route(self):
+        create_car('LAG-001')
+        self.client.get('/api/v1/car/')
+        body = self.metrics()
+        self.assertIn('http_requests_total{route="api/v1/car/",method="GET",status="200"} 1', body)
+        self.assertIn('http_request_db_queries_count{route="api/v1/car/",method="GET"} 1', body)
+        serializer_time = next(
+            line for line in body.splitlines()
+            if line.startswith('http_request_serializer_duration_seconds_sum{route="api/v1/car/"')
+        )
+        self.assertGreater(float(serializer_time.split()[-1]), 0)
+
+    def test_urls_sharing_a_name_are_recorded_apart(self):
+        self.client.force_authenticate(self.admin)
+        pk = uuid.uuid4()
+        self.client.put(f'/api/v1/reservation/{pk}/cancel/')
+        self.client.put(f'/api/v1/reservation/{pk}/confirm/')
+        body = self.metrics()
+        self.assertIn('route="api/v1/reservation/<str:pk>/cancel/"', body)
+        self.assertIn('route="api/v1/reservation/<str:pk>/confirm/"', body)